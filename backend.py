@@ -1,164 +1,2300 @@
+import hashlib
 import sqlite3
 import os
-from math import sqrt
-import pandas as pd
-import numpy as np
-from sklearn.linear_model import LinearRegression
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from math import exp, isfinite, isnan, lgamma, log, log1p, log10, pi, sqrt, tan
+
+from instrumentation import Metrics, TimedConnection, instrumented, log_error, logger
+
+
+# pandas, NumPy and the fitting engine are imported inside the functions that
+# need them, so opening the app and predicting from stored coefficients only
+# loads sqlite3 and math. preload_modules() warms them up in the background.
+def preload_modules():
+    """Import the heavy analysis libraries ahead of their first use"""
+    import numpy
+    import pandas
+    import blast
+    import design
+    import fitting
+    import spatial
+
+
+REQUIRED_COLUMNS = ['distancia', 'carga_espera', 'vibracao', 'litologia']
+PREDICTION_COLUMNS = ['distancia', 'carga_espera', 'litologia']
+STAT_COLUMNS = ['n', 'sum_x', 'sum_y', 'sum_xx', 'sum_xy', 'sum_yy']
+
+# Attenuation laws V = K · (D^gamma / Q^beta)^-alpha as {name: (gamma, beta)}
+LAWS = {
+    'usbm': (1.0, 0.5),                   # square-root scaled distance D/√Q
+    'ambraseys_hendron': (1.0, 1 / 3),    # cube-root scaled distance D/∛Q
+    'langefors_kihlstrom': (0.75, 0.5),   # D^(3/4)/√Q
+}
+DEFAULT_LAW = 'usbm'
+
+# Model variants: 'all' fits every sample, 'window' only the recent ones (see
+# fit_window), 'decayed' weights every sample by 2^(-age / half-life) and
+# 'robust' is a Huber fit (see fit_robust)
+MODEL_VARIANTS = ('all', 'window', 'decayed', 'robust')
+DEFAULT_VARIANT = 'all'
+DEFAULT_HALF_LIFE_DAYS = 365
+
+# Samples whose |log10 residual| exceeds this many residual standard deviations
+# of a model fitted on at least MIN_SCREENING_SAMPLES samples are flagged as outliers
+OUTLIER_THRESHOLD = 4.0
+MIN_SCREENING_SAMPLES = 10
+
+# Optional file column with the date/time of the blast (exact names, case insensitive)
+EVENT_TIME_COLUMNS = ['event_time', 'timestamp', 'data_hora', 'datahora', 'datetime', 'data', 'date', 'horario']
+EVENT_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Accepted besides ISO 8601
+EVENT_TIME_INPUT_FORMATS = ['%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y']
+# save_data status of a sample that was already stored and so was not saved again
+DUPLICATE = 'duplicate'
+
+# Receptors are monitoring stations (seismographs) or protected structures with
+# coordinates in metres in one projected system (e.g. UTM)
+RECEPTOR_KINDS = ('station', 'structure')
+# Optional file columns (exact names, case insensitive) naming the receptor of a
+# sample and the blast position; with them a missing distancia is computed
+RECEPTOR_COLUMNS = ['estacao', 'estação', 'station', 'receptor', 'estrutura', 'structure', 'sismografo']
+BLAST_COORDINATE_COLUMNS = {axis: [f'{axis}_fogo', f'{axis}_detonacao', f'{axis}_blast', f'blast_{axis}']
+                            for axis in ('x', 'y', 'z')}
+
+
+def map_columns(columns, required_columns=REQUIRED_COLUMNS):
+    """Map required database columns to file columns (case insensitive)"""
+    columns = list(columns)
+    columns_lower = [str(col).lower().strip() for col in columns]
+    column_mapping = {}
+    missing_columns = []
+
+    for req_col in required_columns:
+        found = False
+        for i, col in enumerate(columns_lower):
+            # Check for exact match or common variations
+            if (req_col in col or
+                col in req_col or
+                (req_col == 'distancia' and ('dist' in col or 'distance' in col)) or
+                (req_col == 'carga_espera' and ('carga' in col or 'charge' in col or 'peso' in col)) or
+                (req_col == 'vibracao' and ('vibr' in col or 'vibration' in col)) or
+                (req_col == 'litologia' and ('lito' in col or 'lithology' in col or 'rock' in col))):
+                column_mapping[req_col] = columns[i]
+                found = True
+                break
+
+        if not found:
+            missing_columns.append(req_col)
+
+    return column_mapping, missing_columns
+
+
+def read_table(file_path):
+    """Read a CSV or Excel file into a DataFrame"""
+    import pandas as pd
+
+    file_extension = file_path.lower().split('.')[-1]
+
+    if file_extension == 'csv':
+        # Try different encodings for CSV files
+        for encoding in ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']:
+            try:
+                return pd.read_csv(file_path, encoding=encoding)
+            except UnicodeDecodeError:
+                continue
+        raise Exception("Não foi possível ler o arquivo CSV. Verifique a codificação.")
+
+    if file_extension in ['xlsx', 'xls']:
+        return pd.read_excel(file_path)
+
+    raise Exception("Formato de arquivo não suportado. Use CSV ou Excel.")
+
+
+def detect_encoding(file_path, block_size=1 << 20):
+    """First of UTF-8, cp1252 and latin-1 that decodes the whole file, checked in one streaming pass"""
+    import codecs
+
+    with open(file_path, 'rb') as f:
+        block = f.read(block_size)
+        candidates = ['utf-8-sig'] if block.startswith(codecs.BOM_UTF8) else ['utf-8', 'cp1252']
+        decoders = {encoding: codecs.getincrementaldecoder(encoding)('strict') for encoding in candidates}
+        while decoders:
+            final = len(block) < block_size
+            for encoding in list(decoders):
+                try:
+                    decoders[encoding].decode(block, final=final)
+                except UnicodeDecodeError:
+                    del decoders[encoding]
+            if final:
+                break
+            block = f.read(block_size)
+    # latin-1 maps every byte, so it is the last resort
+    return next(iter(decoders), 'latin-1')
+
+
+def iter_table_chunks(file_path, chunksize):
+    """Yield (DataFrame chunk, fraction of the file read) without loading the whole file"""
+    import pandas as pd
+
+    file_extension = file_path.lower().split('.')[-1]
+
+    if file_extension == 'csv':
+        encoding = detect_encoding(file_path)
+        total_size = os.path.getsize(file_path) or 1
+        with open(file_path, 'rb') as f:
+            reader = pd.read_csv(f, encoding=encoding, chunksize=chunksize)
+            for chunk in reader:
+                yield chunk, min(f.tell() / total_size, 1.0)
+
+    elif file_extension == 'xlsx':
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            sheet = workbook.active
+            total_rows = max((sheet.max_row or 1) - 1, 1)
+            rows = sheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                raise pd.errors.EmptyDataError("No columns to parse from file")
+            buffer = []
+            start = 0
+            for row in rows:
+                buffer.append(row)
+                if len(buffer) == chunksize:
+                    yield (pd.DataFrame(buffer, columns=header, index=range(start, start + len(buffer))),
+                           min((start + len(buffer)) / total_rows, 1.0))
+                    start += len(buffer)
+                    buffer = []
+            if buffer or start == 0:
+                yield pd.DataFrame(buffer, columns=header, index=range(start, start + len(buffer))), 1.0
+        finally:
+            workbook.close()
+
+    elif file_extension == 'xls':
+        # The legacy binary format cannot be streamed; read it once and insert in chunks
+        df = pd.read_excel(file_path)
+        for start in range(0, max(len(df), 1), chunksize):
+            yield df.iloc[start:start + chunksize], min((start + chunksize) / max(len(df), 1), 1.0)
+
+    else:
+        raise Exception("Formato de arquivo não suportado. Use CSV ou Excel.")
+
+
+def sample_statistics(df, processes=None, weights=None):
+    """Per-lithology and per-law sums of log10(D^gamma/Q^beta) and log10(PPV), optionally weighted"""
+    # Samples with zero vibration cannot be log-transformed and are left out; with weights, n is the sum of
+    # the weights
+    import numpy as np
+    import pandas as pd
+    from design import log_scaled_distance
+    from fitting import grouped_sums
+
+    fitted = (df['vibracao'] > 0).to_numpy()
+    df = df[fitted]
+    if weights is not None:
+        weights = np.asarray(weights, dtype=float)[fitted]
+    codes, lithologies = pd.factorize(df['litologia'], sort=True)
+    distances = df['distancia'].to_numpy(dtype=float)
+    charges = df['carga_espera'].to_numpy(dtype=float)
+    y = np.log10(df['vibracao'].to_numpy(dtype=float))
+    sums = np.stack([grouped_sums(codes, log_scaled_distance(distances, charges, *LAWS[law]), y,
+                                  len(lithologies), processes, weights)
+                     for law in LAWS], axis=1)
+    index = pd.MultiIndex.from_product([lithologies, list(LAWS)], names=['litologia', 'law'])
+    stats = pd.DataFrame(sums.reshape(-1, len(STAT_COLUMNS)), index=index, columns=STAT_COLUMNS)
+    if weights is None:
+        stats['n'] = stats['n'].astype(int)
+    return stats
+
+
+def statistics_rows(stats):
+    """(lithology, law, sums) tuples of a sample_statistics frame, for add_statistics"""
+    return [(lithology, law, tuple(values))
+            for (lithology, law), values in zip(stats.index, stats.to_numpy().tolist())]
+
+
+def nullable(value):
+    """float(value), or None for NaN/None (SQL NULL)"""
+    return None if value is None or value != value else float(value)
+
+
+def sample_terms(distance, charge, vibration, law=DEFAULT_LAW):
+    """Contribution of a single sample to the sums of a law, or None if it cannot be fitted"""
+    if vibration <= 0:
+        return None
+    gamma, beta = LAWS[law]
+    x = gamma * log10(distance) - beta * log10(charge)
+    y = log10(vibration)
+    return (1, x, y, x * x, x * y, y * y)
+
+
+def find_event_time_column(columns):
+    """File column holding the event time, or None"""
+    for col in columns:
+        if str(col).lower().strip() in EVENT_TIME_COLUMNS:
+            return col
+    return None
+
+
+def find_location_columns(columns):
+    """(receptor column, {axis: blast coordinate column}) of a file; missing ones are left out"""
+    names = {str(col).lower().strip(): col for col in columns}
+    receptor = next((names[name] for name in RECEPTOR_COLUMNS if name in names), None)
+    coordinates = {axis: next(names[name] for name in candidates if name in names)
+                   for axis, candidates in BLAST_COORDINATE_COLUMNS.items()
+                   if any(name in names for name in candidates)}
+    return receptor, coordinates
+
+
+def normalize_event_time(value):
+    """Event time as 'YYYY-MM-DD HH:MM:SS' text (None when missing); raises ValueError if unparseable"""
+    # Accepts datetime objects, ISO 8601 text and dd/mm/yyyy [HH:MM[:SS]]; any time zone is dropped
+    if value is None or value != value:  # None, NaN or NaT
+        return None
+    if hasattr(value, 'strftime'):
+        return value.strftime(EVENT_TIME_FORMAT)
+    text = str(value).strip()
+    if not text or text.lower() in ('nan', 'nat', 'none', 'null'):
+        return None
+    try:
+        return datetime.fromisoformat(text).strftime(EVENT_TIME_FORMAT)
+    except ValueError:
+        pass
+    for input_format in EVENT_TIME_INPUT_FORMATS:
+        try:
+            return datetime.strptime(text, input_format).strftime(EVENT_TIME_FORMAT)
+        except ValueError:
+            continue
+    raise ValueError(f"Data/hora inválida: {text}")
+
+
+def content_key(distance, charge, vibration, lithology, event_time=None):
+    """Hash identifying a sample by its content (12 significant digits, lithology case-insensitive)"""
+    # Lithology names also ignore repeated spaces; event_time is normalize_event_time text or None
+    text = '|'.join((f"{float(distance):.12g}", f"{float(charge):.12g}", f"{float(vibration):.12g}",
+                     ' '.join(str(lithology).split()).casefold(), event_time or ''))
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def centered_fit(n, sum_x, sum_y, sum_xx, sum_xy, sum_yy):
+    """(Sxx, Sxy, Syy, slope) of the least-squares line through the summed samples"""
+    sxx = sum_xx - sum_x * sum_x / n
+    sxy = sum_xy - sum_x * sum_y / n
+    syy = sum_yy - sum_y * sum_y / n
+    # A single distinct scaled distance gives a flat line, as LinearRegression does
+    return sxx, sxy, syy, sxy / sxx if sxx > 1e-12 else 0.0
+
+
+def fit_from_sums(n, sum_x, sum_y, sum_xx, sum_xy, sum_yy):
+    """NumPy-free fitting.fit_sums for one lithology: (k, alpha, r2), r2 None when undefined"""
+    if n <= 0:
+        return None
+    sxx, sxy, syy, slope = centered_fit(n, sum_x, sum_y, sum_xx, sum_xy, sum_yy)
+    intercept = (sum_y - slope * sum_x) / n
+    r2 = 1 - (syy - slope * sxy) / syy if n > 1 and syy > 1e-12 else None
+    return 10 ** intercept, -slope, r2
+
+
+def residual_statistics(n, sum_x, sum_y, sum_xx, sum_xy, sum_yy):
+    """NumPy-free fitting.fit_statistics for one lithology: (mean_x, Sxx, sigma2)"""
+    if n <= 0:
+        return None, None, None
+    sxx, sxy, syy, slope = centered_fit(n, sum_x, sum_y, sum_xx, sum_xy, sum_yy)
+    dof = residual_dof(n, sxx)
+    sigma2 = max(syy - slope * sxy, 0.0) / dof if dof > 0 else None
+    return sum_x / n, sxx, sigma2
+
+
+def residual_dof(n, sxx):
+    """Degrees of freedom of the residual variance"""
+    return n - 2 if sxx > 1e-12 else n - 1
+
+
+def regularized_beta(x, a, b):
+    """Regularized incomplete beta function I_x(a, b), by its continued fraction"""
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    if x > (a + 1) / (a + b + 2):
+        # The continued fraction converges fast only below the mean
+        return 1.0 - regularized_beta(1 - x, b, a)
+    front = exp(lgamma(a + b) - lgamma(a) - lgamma(b) + a * log(x) + b * log(1 - x)) / a
+    tiny = 1e-300
+    c, d = 1.0, 1.0 - (a + b) * x / (a + 1)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    fraction = d
+    for m in range(1, 500):
+        for numerator in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                          -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+            d = 1.0 + numerator * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            fraction *= c * d
+        if abs(c * d - 1.0) < 1e-15:
+            break
+    return front * fraction
+
+
+def t_cdf(t, dof):
+    """Cumulative distribution of Student's t with dof (possibly fractional) degrees of freedom"""
+    tail = regularized_beta(dof / (dof + t * t), dof / 2, 0.5) / 2
+    return 1.0 - tail if t > 0 else tail
+
+
+def t_quantile(p, dof):
+    """Quantile p of Student's t with dof degrees of freedom, in pure Python"""
+    # Exact formulas for 1 and 2 degrees of freedom; otherwise the Cornish-Fisher expansion around the normal
+    # quantile, refined by Newton steps on t_cdf
+    from statistics import NormalDist
+    if dof == 1:
+        return tan(pi * (p - 0.5))
+    if dof == 2:
+        return (2 * p - 1) / sqrt(2 * p * (1 - p))
+    z = NormalDist().inv_cdf(p)
+    t = (z
+         + (z ** 3 + z) / (4 * dof)
+         + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * dof ** 2)
+         + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * dof ** 3)
+         + (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 945 * z) / (92160 * dof ** 4))
+    log_density = lgamma((dof + 1) / 2) - lgamma(dof / 2) - 0.5 * log(dof * pi)
+    for _ in range(50):
+        step = (t_cdf(t, dof) - p) / exp(log_density - (dof + 1) / 2 * log1p(t * t / dof))
+        t -= step
+        if abs(step) < 1e-12 * max(1.0, abs(t)):
+            break
+    return t
+
+
+class ConnectionManager:
+    """Long-lived SQLite connections, one per thread"""
+
+    def __init__(self, db_name, busy_timeout=5000, cached_statements=256, timed=True):
+        self.db_name = db_name
+        self.factory = TimedConnection if timed else sqlite3.Connection
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def connection(self):
+        """Return the connection owned by the calling thread, opening it if needed"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit mode: transactions are opened explicitly by transaction()
+            conn = sqlite3.connect(self.db_name,
+                                   timeout=self.busy_timeout / 1000,
+                                   isolation_level=None,
+                                   check_same_thread=False,
+                                   cached_statements=self.cached_statements,
+                                   factory=self.factory)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout)}")
+            self._local.conn = conn
+            self._local.depth = 0
+            self._local.on_commit = []
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Run the enclosed operations in one transaction; nested blocks join the outer one"""
+        conn = self.connection()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+            for callback in self._local.on_commit:
+                callback()
+        finally:
+            self._local.depth = 0
+            self._local.on_commit = []
+
+    def after_commit(self, callback):
+        """Run callback once the current transaction of the calling thread commits"""
+        self._local.on_commit.append(callback)
+
+    def close(self):
+        """Close every connection opened by this manager"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+class CoefficientCache:
+    """LRU cache of per-lithology coefficients, invalidated by a data-version counter"""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (found, value); value is None for lithologies known to have no model"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value, version):
+        """Store a value loaded at the given version; stale loads are dropped"""
+        with self._lock:
+            if version != self.version:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """Drop every entry and bump the version"""
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    def info(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'version': self.version,
+            }
+
 
 class VibrationBackend:
-    def __init__(self, db_name='vibration_data.db'):
+    def __init__(self, db_name='vibration_data.db', cache_size=1024, log_level=None, metrics_log=None,
+                 sqlite_timing=True, snapshot_dir=None, half_life_days=None, cache_check_interval=0.05):
+        """Open the database; snapshot_dir enables the columnar snapshot, half_life_days sets the decayed models"""
+        # sqlite_timing=False skips the per-statement SQLite timing (a few µs per statement). The coefficient
+        # cache rereads the stored data version at most every cache_check_interval seconds, so writes by other
+        # processes are seen within that delay. Changing half_life_days rebuilds the decayed sums once
+        if log_level is not None:
+            logger.setLevel(log_level)
+        self.metrics = Metrics(metrics_log)
         self.db_name = db_name
+        self.db = ConnectionManager(db_name, timed=sqlite_timing)
+        self.coefficient_cache = CoefficientCache(cache_size)
+        self.cache_check_interval = cache_check_interval
+        self._cached_data_version = None
+        self._cache_checked_at = float('-inf')
+        self._version_checks = 0
+        self._external_invalidations = 0
+        self.snapshot_dir = snapshot_dir
+        self._snapshot = None
+        self._snapshot_lock = threading.Lock()
+        self.half_life_days = half_life_days
+        self._receptor_index = None
+        self._receptor_lock = threading.Lock()
         self.init_database()
+
+    def transaction(self):
+        """Group several backend operations into a single transaction"""
+        return self.db.transaction()
+
+    def close(self):
+        """Close the database connections and the metrics log"""
+        self.db.close()
+        self.metrics.close()
+
+    def get_metrics(self):
+        """Per-operation latency histograms, SQLite/Python time split, rows and errors"""
+        return self.metrics.snapshot()
     
+    @instrumented
     def init_database(self):
-        """Initialize the SQLite database"""
-        try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS vibration_data (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    distancia REAL NOT NULL,
-                    carga_espera REAL NOT NULL,
-                    vibracao REAL NOT NULL  ,
-                    litologia TEXT NOT NULL,
-                    k REAL,
-                    alpha REAL,                           
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            conn.commit()
-            conn.close()
-            print("✅ Database initialized successfully")
+        """Initialize the SQLite database, upgrading its schema in place if needed"""
+        try:
+            with self.db.transaction() as conn:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                for target, migration in enumerate(self.MIGRATIONS[version:], start=version + 1):
+                    migration(self, conn)
+                    conn.execute(f"PRAGMA user_version = {target}")
+                    logger.info(f"✅ Database migrated to schema version {target}")
+                # Also rebuilds after an upgrade adds an attenuation law
+                has_samples = conn.execute("SELECT 1 FROM vibration_data LIMIT 1").fetchone() is not None
+                needs_statistics = has_samples and (
+                    conn.execute("SELECT COUNT(DISTINCT law) FROM lithology_stats").fetchone()[0] < len(LAWS))
+                needs_decayed = has_samples and not conn.execute(
+                    "SELECT 1 FROM lithology_decayed_stats LIMIT 1").fetchone()
+                if self.half_life_days is not None and self.half_life_days != self.decay_half_life(conn):
+                    conn.execute("UPDATE backend_metadata SET value = ? WHERE key = 'decay_half_life_days'",
+                                 (self.half_life_days,))
+                    needs_decayed = has_samples
+            if needs_statistics:
+                self.rebuild_statistics()
+            if needs_decayed:
+                self.rebuild_decayed_statistics()
+            logger.info("✅ Database initialized successfully")
             return True
         except Exception as e:
-            print(f"❌ Error initializing database: {e}")
+            log_error(f"❌ Error initializing database: {e}")
             return False
+
+    # Schema migrations, applied in order; PRAGMA user_version records how many ran.
+    # Never edit a released step, append a new one instead.
+
+    def migration_001_initial_schema(self, conn):
+        """Sample, metadata, model and statistics tables"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS vibration_data (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                distancia REAL NOT NULL,
+                carga_espera REAL NOT NULL,
+                vibracao REAL NOT NULL  ,
+                litologia TEXT NOT NULL,
+                k REAL,
+                alpha REAL,                           
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS backend_metadata (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        ''')
+        conn.execute("INSERT OR IGNORE INTO backend_metadata (key, value) VALUES ('data_version', 0)")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS lithology_models (
+                litologia TEXT PRIMARY KEY,
+                k REAL NOT NULL,
+                alpha REAL NOT NULL,
+                n INTEGER NOT NULL,
+                r2 REAL,
+                fitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                data_version INTEGER NOT NULL
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS lithology_stats (
+                litologia TEXT PRIMARY KEY,
+                n INTEGER NOT NULL,
+                sum_x REAL NOT NULL,
+                sum_y REAL NOT NULL,
+                sum_xx REAL NOT NULL,
+                sum_xy REAL NOT NULL,
+                sum_yy REAL NOT NULL
+            )
+        ''')
+        self.migrate_lithology_models(conn)
+
+    def migration_002_query_indexes(self, conn):
+        """Indexes for the per-lithology and time-based queries"""
+        # (litologia, created_at) also serves every lookup, DISTINCT and GROUP BY on litologia alone, so no
+        # separate single-column index is kept
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_vibration_data_litologia_created_at "
+                     "ON vibration_data (litologia, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_vibration_data_created_at "
+                     "ON vibration_data (created_at)")
+
+    def migration_003_fit_statistics(self, conn):
+        """Mean of x, Sxx and residual variance of every model, for prediction intervals"""
+        for column in ('mean_x', 'sxx', 'sigma2'):
+            conn.execute(f"ALTER TABLE lithology_models ADD COLUMN {column} REAL")
+        # Self-contained backfill: later versions of refresh_models expect later schemas
+        rows = conn.execute(f"SELECT litologia, {', '.join(STAT_COLUMNS)} FROM lithology_stats").fetchall()
+        conn.executemany("UPDATE lithology_models SET mean_x = ?, sxx = ?, sigma2 = ? WHERE litologia = ?",
+                         [residual_statistics(*row[1:]) + (row[0],) for row in rows])
+
+    def migration_004_attenuation_laws(self, conn):
+        """Sums per attenuation law, the selected law of every model and the law comparison"""
+        # Existing sums are for the square-root law; the others are rebuilt by init_database once the
+        # migrations have run
+        conn.execute('''
+            CREATE TABLE lithology_law_stats (
+                litologia TEXT NOT NULL,
+                law TEXT NOT NULL,
+                n INTEGER NOT NULL,
+                sum_x REAL NOT NULL,
+                sum_y REAL NOT NULL,
+                sum_xx REAL NOT NULL,
+                sum_xy REAL NOT NULL,
+                sum_yy REAL NOT NULL,
+                PRIMARY KEY (litologia, law)
+            )
+        ''')
+        conn.execute(f'''
+            INSERT INTO lithology_law_stats (litologia, law, {', '.join(STAT_COLUMNS)})
+            SELECT litologia, ?, {', '.join(STAT_COLUMNS)} FROM lithology_stats
+        ''', (DEFAULT_LAW,))
+        conn.execute("DROP TABLE lithology_stats")
+        conn.execute("ALTER TABLE lithology_law_stats RENAME TO lithology_stats")
+        conn.execute(f"ALTER TABLE lithology_models ADD COLUMN law TEXT NOT NULL DEFAULT '{DEFAULT_LAW}'")
+        conn.execute("ALTER TABLE lithology_models ADD COLUMN cv_rmse REAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS law_scores (
+                litologia TEXT NOT NULL,
+                law TEXT NOT NULL,
+                k REAL,
+                alpha REAL,
+                r2 REAL,
+                n INTEGER NOT NULL,
+                cv_rmse REAL,
+                data_version INTEGER NOT NULL,
+                PRIMARY KEY (litologia, law)
+            )
+        ''')
+
+    def migration_005_content_keys(self, conn):
+        """Event time and content key of every sample, under a unique index"""
+        # Samples stored before this version have no key until compact_duplicates runs, which also removes the
+        # duplicates among them
+        conn.execute("ALTER TABLE vibration_data ADD COLUMN event_time TEXT")
+        conn.execute("ALTER TABLE vibration_data ADD COLUMN content_key TEXT")
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_vibration_data_content_key "
+                     "ON vibration_data (content_key)")
+        if conn.execute("SELECT 1 FROM vibration_data LIMIT 1").fetchone():
+            logger.warning("⚠️ Existing samples have no content key; run compact_duplicates "
+                           "(python cli.py compact) to key them and remove duplicates")
+
+    def migration_006_model_variants(self, conn):
+        """Exponentially decayed sums and the models of the window and decayed variants"""
+        # The decayed sums are built by init_database once the migrations have run; created_at is already
+        # indexed by migration 002
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS lithology_decayed_stats (
+                litologia TEXT NOT NULL,
+                law TEXT NOT NULL,
+                anchor REAL NOT NULL,
+                n REAL NOT NULL,
+                sum_x REAL NOT NULL,
+                sum_y REAL NOT NULL,
+                sum_xx REAL NOT NULL,
+                sum_xy REAL NOT NULL,
+                sum_yy REAL NOT NULL,
+                PRIMARY KEY (litologia, law)
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS lithology_variant_models (
+                litologia TEXT NOT NULL,
+                variant TEXT NOT NULL,
+                law TEXT NOT NULL,
+                k REAL NOT NULL,
+                alpha REAL NOT NULL,
+                n REAL NOT NULL,
+                r2 REAL,
+                mean_x REAL,
+                sxx REAL,
+                sigma2 REAL,
+                settings TEXT,
+                fitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                data_version INTEGER NOT NULL,
+                PRIMARY KEY (litologia, variant)
+            )
+        ''')
+        conn.execute("INSERT OR IGNORE INTO backend_metadata (key, value) VALUES ('decay_half_life_days', ?)",
+                     (DEFAULT_HALF_LIFE_DAYS,))
+
+    def migration_007_excluded_samples(self, conn):
+        """Exclusion flag for outliers kept in the table but left out of every fit"""
+        # The partial index covers only the flagged rows, so listing and counting them does not scan the table
+        conn.execute("ALTER TABLE vibration_data ADD COLUMN excluded INTEGER NOT NULL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_vibration_data_excluded "
+                     "ON vibration_data (id) WHERE excluded = 1")
+
+    def migration_008_receptors(self, conn):
+        """Monitoring stations and protected structures with coordinates"""
+        # receptors_version is bumped on every change so that each process rebuilds its in-memory spatial
+        # index only when the table changed
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS receptors (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nome TEXT NOT NULL UNIQUE COLLATE NOCASE,
+                kind TEXT NOT NULL DEFAULT 'station' CHECK (kind IN ('station', 'structure')),
+                x REAL NOT NULL,
+                y REAL NOT NULL,
+                z REAL NOT NULL DEFAULT 0,
+                litologia TEXT,
+                ppv_limit REAL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.execute("INSERT OR IGNORE INTO backend_metadata (key, value) VALUES ('receptors_version', 0)")
+
+    MIGRATIONS = [
+        migration_001_initial_schema,
+        migration_002_query_indexes,
+        migration_003_fit_statistics,
+        migration_004_attenuation_laws,
+        migration_005_content_keys,
+        migration_006_model_variants,
+        migration_007_excluded_samples,
+        migration_008_receptors,
+    ]
     
-    def save_data(self, distance, charge, vibration, lithology):
-        """Save vibration data to the database"""
-        try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO vibration_data (distancia, carga_espera, vibracao, litologia)
-                VALUES (?, ?, ?, ?)
-            ''', (distance, charge, vibration, lithology))
-            conn.commit()
-            conn.close()
-            print(f"✅ Data saved: D={distance}m, C={charge}kg, V={vibration}mm/s, L={lithology}")
+    def migrate_lithology_models(self, conn):
+        """Copy coefficients stored on sample rows by older versions into lithology_models"""
+        if conn.execute("SELECT 1 FROM lithology_models LIMIT 1").fetchone():
+            return
+        cursor = conn.execute('''
+            INSERT INTO lithology_models (litologia, k, alpha, n, data_version)
+            SELECT litologia, MAX(k), MAX(alpha), COUNT(k), 0
+            FROM vibration_data
+            WHERE k IS NOT NULL AND alpha IS NOT NULL
+            GROUP BY litologia
+        ''')
+        if cursor.rowcount > 0:
+            logger.info(f"✅ Migrated coefficients of {cursor.rowcount} lithologies to lithology_models")
+
+    def bump_data_version(self, conn):
+        """Increment and return the data version; call inside a write transaction"""
+        # The coefficient cache is invalidated once the transaction commits
+        conn.execute("UPDATE backend_metadata SET value = value + 1 WHERE key = 'data_version'")
+        data_version = self.get_data_version(conn)
+        self.db.after_commit(lambda: self.committed_data_version(data_version))
+        return data_version
+
+    def committed_data_version(self, data_version):
+        """Invalidate the coefficient cache after our own commit; the version checks need not do it again"""
+        self.coefficient_cache.invalidate()
+        self._cached_data_version = max(self._cached_data_version or 0, data_version)
+
+    def get_data_version(self, conn=None):
+        """Return the current data version counter"""
+        conn = conn or self.db.connection()
+        row = conn.execute("SELECT value FROM backend_metadata WHERE key = 'data_version'").fetchone()
+        return row[0] if row else 0
+
+    def add_statistics(self, conn, stats, sign=1):
+        """Add (sign=1) or remove (sign=-1) (lithology, law, sums) rows and refit the touched models"""
+        rows = [(lithology, law) + tuple(sign * value for value in values)
+                for lithology, law, values in stats]
+        conn.executemany('''
+            INSERT INTO lithology_stats (litologia, law, n, sum_x, sum_y, sum_xx, sum_xy, sum_yy)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(litologia, law) DO UPDATE SET
+                n = n + excluded.n,
+                sum_x = sum_x + excluded.sum_x,
+                sum_y = sum_y + excluded.sum_y,
+                sum_xx = sum_xx + excluded.sum_xx,
+                sum_xy = sum_xy + excluded.sum_xy,
+                sum_yy = sum_yy + excluded.sum_yy
+        ''', rows)
+        self.refresh_models(conn, list(dict.fromkeys(row[0] for row in rows)))
+
+    def decay_half_life(self, conn=None):
+        """Age in days at which a sample counts half in the decayed models"""
+        conn = conn or self.db.connection()
+        row = conn.execute("SELECT value FROM backend_metadata WHERE key = 'decay_half_life_days'").fetchone()
+        return row[0] if row else DEFAULT_HALF_LIFE_DAYS
+
+    def add_decayed_statistics(self, conn, stats, time, sign=1):
+        """Add (sign=1) or remove (sign=-1) sums weighted as of time (a Julian day) to the decayed sums"""
+        # Stored sums are weighted as of their anchor, the latest time added, so every weight stays at most 1
+        # and old sums are only scaled down, never rescanned. Scaling every weight by the same factor leaves
+        # the fitted line unchanged, so the anchor does not affect K and alpha. Call before add_statistics,
+        # which refits the decayed models
+        half_life = self.decay_half_life(conn)
+        for lithology, law, values in stats:
+            row = conn.execute(f'''
+                SELECT anchor, {', '.join(STAT_COLUMNS)} FROM lithology_decayed_stats
+                WHERE litologia = ? AND law = ?
+            ''', (lithology, law)).fetchone()
+            anchor = time if row is None else max(row[0], time)
+            sums = [sign * value * 2 ** ((time - anchor) / half_life) for value in values]
+            if row is not None:
+                decay = 2 ** ((row[0] - anchor) / half_life)
+                sums = [total + old * decay for total, old in zip(sums, row[1:])]
+            conn.execute(f'''
+                INSERT OR REPLACE INTO lithology_decayed_stats (litologia, law, anchor, {', '.join(STAT_COLUMNS)})
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (lithology, law, anchor, *sums))
+
+    @instrumented
+    def rebuild_decayed_statistics(self):
+        """Recompute the decayed sums from every sample and refit the decayed models"""
+        # Only needed when the decayed sums are first built or the half-life changes; writes keep them up to
+        # date incrementally
+        import pandas as pd
+
+        try:
+            with self.db.transaction() as conn:
+                df = pd.read_sql_query('''
+                    SELECT distancia, carga_espera, vibracao, litologia, julianday(created_at) AS time
+                    FROM vibration_data WHERE excluded = 0
+                ''', conn)
+                anchor = float(df['time'].max()) if df['time'].notna().any() else 0.0
+                weights = 2 ** ((df['time'].fillna(anchor) - anchor) / self.decay_half_life(conn))
+                stats = sample_statistics(df, weights=weights)
+                conn.execute("DELETE FROM lithology_decayed_stats")
+                conn.executemany(f'''
+                    INSERT INTO lithology_decayed_stats (litologia, law, anchor, {', '.join(STAT_COLUMNS)})
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', [(lithology, law, anchor, *values) for lithology, law, values in statistics_rows(stats)])
+                self.bump_data_version(conn)
+                self.refresh_models(conn, list(stats.index.get_level_values('litologia').unique()))
+            logger.info(f"✅ Decayed statistics rebuilt (half-life {self.decay_half_life():g} days)")
+            return True
+        except Exception as e:
+            log_error(f"❌ Error rebuilding decayed statistics: {e}")
+            return False
+
+    def refresh_models(self, conn, lithologies):
+        """Refit the models and decayed variants of the given lithologies from the stored sums"""
+        data_version = self.get_data_version(conn)
+        half_life = self.decay_half_life(conn)
+        for lithology in lithologies:
+            selected = conn.execute("SELECT law, cv_rmse FROM lithology_models WHERE litologia = ?",
+                                    (lithology,)).fetchone()
+            law, cv_rmse = selected if selected else (DEFAULT_LAW, None)
+            row = conn.execute(f'''
+                SELECT {', '.join(STAT_COLUMNS)} FROM lithology_stats WHERE litologia = ? AND law = ?
+            ''', (lithology, law)).fetchone()
+            fit = fit_from_sums(*row) if row else None
+            if fit is None:
+                for table in ('lithology_stats', 'lithology_decayed_stats', 'lithology_models',
+                              'lithology_variant_models'):
+                    conn.execute(f"DELETE FROM {table} WHERE litologia = ?", (lithology,))
+                continue
+            k, alpha, r2 = fit
+            conn.execute('''
+                INSERT OR REPLACE INTO lithology_models
+                    (litologia, k, alpha, n, r2, mean_x, sxx, sigma2, law, cv_rmse, data_version)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (lithology, k, alpha, row[0], r2) + residual_statistics(*row) + (law, cv_rmse, data_version))
+
+            decayed = conn.execute(f'''
+                SELECT {', '.join(STAT_COLUMNS)} FROM lithology_decayed_stats WHERE litologia = ? AND law = ?
+            ''', (lithology, law)).fetchone()
+            fit = fit_from_sums(*decayed) if decayed else None
+            if fit is None:
+                conn.execute("DELETE FROM lithology_variant_models WHERE litologia = ? AND variant = 'decayed'",
+                             (lithology,))
+                continue
+            k, alpha, r2 = fit
+            conn.execute('''
+                INSERT OR REPLACE INTO lithology_variant_models
+                    (litologia, variant, law, k, alpha, n, r2, mean_x, sxx, sigma2, settings, data_version)
+                VALUES (?, 'decayed', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (lithology, law, k, alpha, decayed[0], r2) + residual_statistics(*decayed) +
+                 (f"half_life_days={half_life:g}", data_version))
+
+    def load_samples(self):
+        """Samples not excluded as a DataFrame (from the snapshot if configured), with attrs['data_version']"""
+        import pandas as pd
+
+        if self.snapshot_dir is not None:
+            snapshot = self.refresh_snapshot()
+            if snapshot is not None:
+                df = snapshot.frame()
+                df.attrs['data_version'] = snapshot.meta['data_version']
+                return df
+        return self.read_samples(self.db.connection())
+
+    def read_samples(self, conn):
+        """Samples not excluded read from SQLite, with attrs['data_version'] read before them"""
+        import pandas as pd
+
+        data_version = self.get_data_version(conn)
+        df = pd.read_sql_query("SELECT distancia, carga_espera, vibracao, litologia FROM vibration_data "
+                               "WHERE excluded = 0", conn)
+        df.attrs['data_version'] = data_version
+        return df
+
+    def iter_sample_columns(self, conn, after_id=0, until_id=None, chunksize=200000):
+        """Yield the samples not excluded with after_id < id <= until_id as {column: array} chunks"""
+        import numpy as np
+
+        cursor = conn.execute('''
+            SELECT id, distancia, carga_espera, vibracao, litologia
+            FROM vibration_data WHERE id > ? AND id <= ? AND excluded = 0 ORDER BY id
+        ''', (after_id, until_id if until_id is not None else 2 ** 63 - 1))
+        while True:
+            rows = cursor.fetchmany(chunksize)
+            if not rows:
+                break
+            ids, distances, charges, vibrations, lithologies = zip(*rows)
+            yield {
+                'id': np.array(ids, dtype=np.int64),
+                'distancia': np.array(distances, dtype=float),
+                'carga_espera': np.array(charges, dtype=float),
+                'vibracao': np.array(vibrations, dtype=float),
+                'litologia': np.array(lithologies, dtype=object),
+            }
+
+    @instrumented
+    def refresh_snapshot(self, chunksize=200000):
+        """Bring the columnar snapshot up to date with SQLite and return it"""
+        # Nothing is read when the data version is unchanged. Inserted rows are appended; deleted rows or
+        # changed exclusion flags rebuild the snapshot
+        from snapshot import ColumnarSnapshot
+
+        if self.snapshot_dir is None:
+            return None
+        try:
+            with self._snapshot_lock:
+                if self._snapshot is None:
+                    self._snapshot = ColumnarSnapshot(self.snapshot_dir)
+                snapshot = self._snapshot
+                conn = self.db.connection()
+                # Read the version first: rows written meanwhile are picked up by the next refresh
+                data_version = self.get_data_version(conn)
+                if snapshot.meta['data_version'] == data_version:
+                    return snapshot
+                last_id = snapshot.meta['last_id']
+                until_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM vibration_data").fetchone()[0]
+                # Any deletion or exclusion change bumps the samples version, read before the rows themselves
+                samples_version = self.get_samples_version(conn)
+                kept = conn.execute("SELECT COUNT(*) FROM vibration_data WHERE id <= ? AND excluded = 0",
+                                    (last_id,)).fetchone()[0]
+                if kept == snapshot.rows and snapshot.meta.get('fingerprint') == samples_version:
+                    before = snapshot.rows
+                    for columns in self.iter_sample_columns(conn, last_id, until_id, chunksize):
+                        snapshot.append(columns, snapshot.meta['data_version'])
+                    snapshot.append({'id': []}, data_version, samples_version, until_id)
+                    logger.info(f"✅ Snapshot updated: {snapshot.rows - before} rows appended")
+                else:
+                    snapshot.rebuild(self.iter_sample_columns(conn, 0, until_id, chunksize), data_version,
+                                     samples_version, until_id)
+                    logger.info(f"✅ Snapshot rebuilt: {snapshot.rows} rows")
+                return snapshot
+        except Exception as e:
+            log_error(f"❌ Error refreshing snapshot: {e}")
+            return None
+
+    def bump_samples_version(self, conn):
+        """Increment the samples version; call inside a write transaction that deletes or (un)excludes samples"""
+        conn.execute('''
+            INSERT INTO backend_metadata (key, value) VALUES ('samples_version', 1)
+            ON CONFLICT(key) DO UPDATE SET value = value + 1
+        ''')
+
+    def get_samples_version(self, conn):
+        """Return the counter of changes to stored samples other than inserts"""
+        row = conn.execute("SELECT value FROM backend_metadata WHERE key = 'samples_version'").fetchone()
+        return row[0] if row else 0
+
+    @instrumented
+    def score_samples(self, refresh=True):
+        """Predicted PPV of every sample in the snapshot with the current models"""
+        # Reads only the memory-mapped columns and the coefficient cache; refresh=False does not synchronise
+        # the snapshot first
+        import design
+        from snapshot import ColumnarSnapshot
+
+        try:
+            if refresh:
+                snapshot = self.refresh_snapshot()
+            elif self.snapshot_dir is not None:
+                snapshot = self._snapshot or ColumnarSnapshot(self.snapshot_dir)
+            else:
+                snapshot = None
+            if snapshot is None:
+                return None
+            columns = snapshot.columns()
+            # Models per dictionary code, then gathered by the encoded column
+            _, models, inverse = self.model_arrays(snapshot.lithologies)
+            K, alpha, gamma, beta = models[inverse][columns['litologia']][:, [0, 1, 6, 7]].T
+            return {
+                'id': columns['id'],
+                'vibracao': columns['vibracao'],
+                'predicted': design.ppv(K, alpha, columns['distancia'], columns['carga_espera'], gamma, beta),
+            }
+        except Exception as e:
+            log_error(f"❌ Error scoring samples: {e}")
+            return None
+
+    @instrumented
+    def rebuild_statistics(self, df=None, processes=None, attempts=3):
+        """Recompute and repair the stored sums, refit every model and return the drift report"""
+        # The drift report maps every lithology whose stored sums were wrong to {'n': (stored, rebuilt),
+        # 'drift': max relative difference}
+        try:
+            for attempt in range(attempts):
+                if attempt == attempts - 1:
+                    # Last attempt: read and write under one write lock so no sample can slip in between
+                    with self.db.transaction() as conn:
+                        return self.replace_statistics(conn, self.read_samples(conn), processes)
+                if df is None:
+                    df = self.load_samples()
+                version = df.attrs.get('data_version')
+                prepared = self.prepare_statistics(self.db.connection(), df, processes)
+                with self.db.transaction() as conn:
+                    # A write committed since df was read would be lost by replacing the sums
+                    if version is not None and version == self.get_data_version(conn):
+                        return self.write_statistics(conn, *prepared)
+                logger.info("🔁 Samples changed while rebuilding statistics; reading them again")
+                df = None
+        except Exception as e:
+            log_error(f"❌ Error rebuilding statistics: {e}")
+            return None
+
+    def replace_statistics(self, conn, df, processes=None):
+        """prepare_statistics and write_statistics in one call, inside a write transaction"""
+        return self.write_statistics(conn, *self.prepare_statistics(conn, df, processes))
+
+    def prepare_statistics(self, conn, df, processes=None):
+        """(rebuilt sums, fitted model rows, drift report) of the samples in df"""
+        import numpy as np
+        import pandas as pd
+        from fitting import fit_statistics, fit_sums
+
+        rebuilt = sample_statistics(df, processes)
+        stored = pd.read_sql_query(
+            f"SELECT litologia, law, {', '.join(STAT_COLUMNS)} FROM lithology_stats", conn
+        ).set_index(['litologia', 'law'])
+        selected = pd.read_sql_query(
+            "SELECT litologia, law, cv_rmse FROM lithology_models", conn).set_index('litologia')
+
+        # Nothing to compare against when the sums are built for the first time
+        report = {}
+        stored_lithologies = stored.index.get_level_values('litologia').unique()
+        rebuilt_lithologies = rebuilt.index.get_level_values('litologia').unique()
+        compared = rebuilt_lithologies.union(stored_lithologies) if not stored.empty else []
+        for lithology in compared:
+            if lithology not in stored_lithologies or lithology not in rebuilt_lithologies:
+                present = stored if lithology in stored_lithologies else rebuilt
+                n = int(present.loc[lithology, 'n'].iloc[0])
+                report[lithology] = {
+                    'n': (n, 0) if present is stored else (0, n),
+                    'drift': float('inf'),
+                }
+                continue
+            # Only laws that already had sums are compared
+            old = stored.loc[lithology, STAT_COLUMNS]
+            new = rebuilt.loc[lithology, STAT_COLUMNS].loc[old.index]
+            old = old.to_numpy(dtype=float)
+            new = new.to_numpy(dtype=float)
+            drift = float(np.max(np.abs(old - new) / np.maximum(np.abs(new), 1e-12)))
+            if drift > 1e-9:
+                report[lithology] = {'n': (int(old[0, 0]), int(new[0, 0])), 'drift': drift}
+
+        # Every lithology is fitted with its selected law in one vectorized pass
+        laws = selected['law'].reindex(rebuilt_lithologies).fillna(DEFAULT_LAW)
+        cv_rmse = selected['cv_rmse'].reindex(rebuilt_lithologies).astype(float)
+        sums = rebuilt.loc[list(zip(rebuilt_lithologies, laws))].to_numpy(dtype=float)
+        k, alpha, r2 = fit_sums(sums)
+        mean_x, sxx, sigma2 = fit_statistics(sums)
+        models = [(lithology, float(k[i]), float(alpha[i]), int(sums[i, 0]), nullable(r2[i]), float(mean_x[i]),
+                   float(sxx[i]), nullable(sigma2[i]), laws.iloc[i], nullable(cv_rmse.iloc[i]))
+                  for i, lithology in enumerate(rebuilt_lithologies)]
+        return rebuilt, models, report
+
+    def write_statistics(self, conn, rebuilt, models, report):
+        """Replace the stored sums and models inside a write transaction; returns report"""
+        data_version = self.bump_data_version(conn)
+        conn.execute("DELETE FROM lithology_stats")
+        conn.executemany(f'''
+            INSERT INTO lithology_stats (litologia, law, {', '.join(STAT_COLUMNS)})
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rebuilt.reset_index().itertuples(index=False, name=None))
+        conn.execute("DELETE FROM lithology_models")
+        conn.executemany('''
+            INSERT INTO lithology_models
+                (litologia, k, alpha, n, r2, mean_x, sxx, sigma2, law, cv_rmse, data_version)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [model + (data_version,) for model in models])
+
+        for lithology, details in report.items():
+            logger.warning(f"⚠️ Statistics drift for {lithology}: n={details['n']}, drift={details['drift']:.3g}")
+        return report
+
+    @instrumented
+    def save_data(self, distance, charge, vibration, lithology, event_time=None):
+        """Save vibration data to the database; returns True, False on error or DUPLICATE if already stored"""
+        try:
+            if not all(isfinite(float(value)) for value in (distance, charge, vibration)):
+                raise ValueError("Valores infinitos ou não numéricos")
+            event_time = normalize_event_time(event_time)
+            with self.db.transaction() as conn:
+                created_at, time = conn.execute("SELECT CURRENT_TIMESTAMP, julianday(CURRENT_TIMESTAMP)").fetchone()
+                cursor = conn.execute('''
+                    INSERT OR IGNORE INTO vibration_data
+                        (distancia, carga_espera, vibracao, litologia, event_time, content_key, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (distance, charge, vibration, lithology, event_time,
+                      content_key(distance, charge, vibration, lithology, event_time), created_at))
+                if cursor.rowcount == 0:
+                    logger.info(f"⚠️ Duplicate sample skipped: D={distance}m, C={charge}kg, "
+                                f"V={vibration}mm/s, L={lithology}")
+                    return DUPLICATE
+                self.bump_data_version(conn)
+                if vibration > 0:
+                    stats = [(lithology, law, sample_terms(distance, charge, vibration, law)) for law in LAWS]
+                    self.add_decayed_statistics(conn, stats, time)
+                    self.add_statistics(conn, stats)
+            logger.info(f"✅ Data saved: D={distance}m, C={charge}kg, V={vibration}mm/s, L={lithology}")
             return True
         except Exception as e:
-            print(f"❌ Error saving data: {e}")
+            log_error(f"❌ Error saving data: {e}")
             return False
     
+    @instrumented
+    def import_dataframe(self, df, outlier_threshold=OUTLIER_THRESHOLD):
+        """Validate a DataFrame of samples and insert it in a single transaction"""
+        # The summary holds the imported count, the rejected rows as (line, reason) tuples, the number and
+        # lines of the duplicates skipped and of the outliers flagged, and any missing required column. Lines
+        # follow the spreadsheet convention (header is line 1). New rows are screened against the current
+        # models (see outlier_mask); outliers are stored excluded, and outlier_threshold=None imports every
+        # row as included
+        import numpy as np
+        import pandas as pd
+
+        result = {'imported': 0, 'rejected': [], 'rejected_count': 0, 'duplicates': 0, 'duplicate_lines': [],
+                  'excluded': 0, 'excluded_lines': [], 'missing_columns': []}
+
+        df = self.complete_distances(df)
+        column_mapping, missing_columns = map_columns(df.columns)
+        if missing_columns:
+            result['missing_columns'] = missing_columns
+            result['columns'] = [str(col) for col in df.columns]
+            return result
+
+        try:
+            # Validate every row in one vectorized pass
+            numeric = pd.DataFrame({
+                col: pd.to_numeric(df[column_mapping[col]], errors='coerce')
+                for col in ('distancia', 'carga_espera', 'vibracao')
+            })
+            lithology = df[column_mapping['litologia']].astype(str).str.strip()
+
+            non_numeric = numeric.isna().any(axis=1)
+            invalid = ((numeric['distancia'] <= 0) |
+                       (numeric['carga_espera'] <= 0) |
+                       (numeric['vibracao'] < 0) |
+                       ~np.isfinite(numeric).all(axis=1))
+            empty_lithology = (df[column_mapping['litologia']].isna() |
+                               lithology.str.lower().isin(['nan', 'null', '']))
+
+            event_times = [None] * len(df)
+            invalid_time = pd.Series(False, index=df.index)
+            time_column = find_event_time_column(df.columns)
+            if time_column is not None:
+                unparsed = []
+                for position, value in enumerate(df[time_column].tolist()):
+                    try:
+                        event_times[position] = normalize_event_time(value)
+                    except ValueError:
+                        unparsed.append(position)
+                invalid_time.iloc[unparsed] = True
+
+            lines = df.index + 2
+            for mask, reason in ((non_numeric, "Valores não numéricos"),
+                                 (invalid & ~non_numeric, "Valores inválidos (negativos, zero ou infinitos)"),
+                                 (empty_lithology & ~non_numeric & ~invalid, "Litologia vazia"),
+                                 (invalid_time & ~non_numeric & ~invalid & ~empty_lithology, "Data/hora inválida")):
+                result['rejected'].extend((int(line), reason) for line in lines[mask.to_numpy()])
+            result['rejected'].sort()
+            result['rejected_count'] = len(result['rejected'])
+
+            valid = ~(non_numeric | invalid | empty_lithology | invalid_time)
+            rows = pd.DataFrame({
+                'distancia': numeric['distancia'],
+                'carga_espera': numeric['carga_espera'],
+                'vibracao': numeric['vibracao'],
+                'litologia': lithology,
+                'event_time': pd.Series(event_times, index=df.index, dtype=object),
+            })[valid.to_numpy()]
+            rows = rows.assign(content_key=[content_key(*values) for values in rows.itertuples(index=False, name=None)])
+
+            with self.db.transaction() as conn:
+                repeated = rows['content_key'].duplicated()
+                stored = self.stored_content_keys(conn, rows.loc[~repeated, 'content_key'])
+                duplicate = (repeated | rows['content_key'].isin(stored)).to_numpy()
+                # Every row of the batch shares one creation time, so its decayed weights are all 1
+                created_at, time = conn.execute("SELECT CURRENT_TIMESTAMP, julianday(CURRENT_TIMESTAMP)").fetchone()
+                new_rows = rows[~duplicate].assign(created_at=created_at)
+                outliers = np.zeros(len(new_rows), dtype=bool)
+                if outlier_threshold is not None and len(new_rows):
+                    outliers = self.outlier_mask(new_rows['distancia'], new_rows['carga_espera'],
+                                                 new_rows['vibracao'], new_rows['litologia'], outlier_threshold)
+                new_rows = new_rows.assign(excluded=outliers.astype(int))
+                conn.executemany('''
+                    INSERT OR IGNORE INTO vibration_data
+                        (distancia, carga_espera, vibracao, litologia, event_time, content_key, created_at, excluded)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', new_rows.itertuples(index=False, name=None))
+                if len(new_rows):
+                    self.bump_data_version(conn)
+                    stats = statistics_rows(sample_statistics(new_rows[~outliers]))
+                    self.add_decayed_statistics(conn, stats, time)
+                    self.add_statistics(conn, stats)
+
+            result['imported'] = len(new_rows)
+            result['duplicates'] = int(duplicate.sum())
+            result['duplicate_lines'] = [int(line) for line in rows.index[duplicate] + 2]
+            result['excluded'] = int(outliers.sum())
+            result['excluded_lines'] = [int(line) for line in new_rows.index[outliers] + 2]
+            logger.info(f"✅ Imported {result['imported']} rows ({len(result['rejected'])} rejected, "
+                        f"{result['duplicates']} duplicates skipped, {result['excluded']} flagged as outliers)")
+        except Exception as e:
+            log_error(f"❌ Error importing data: {e}")
+            result['error'] = str(e)
+
+        return result
+
+    @instrumented
+    def import_file(self, file_path, chunksize=50000, progress=None, cancel=None,
+                    max_rejected_details=1000, outlier_threshold=OUTLIER_THRESHOLD):
+        """Stream a CSV/Excel file into the database in fixed-size chunks"""
+        # Each chunk is validated and inserted in its own transaction, so memory stays bounded by the chunk
+        # size and a cancelled import keeps the chunks already saved
+        result = {'imported': 0, 'rejected': [], 'rejected_count': 0, 'duplicates': 0, 'duplicate_lines': [],
+                  'excluded': 0, 'excluded_lines': [], 'missing_columns': []}
+        rows_read = 0
+
+        for chunk, fraction in iter_table_chunks(file_path, chunksize):
+            if cancel is not None and cancel.is_set():
+                result['cancelled'] = True
+                break
+            chunk_result = self.import_dataframe(chunk, outlier_threshold)
+            if chunk_result['missing_columns']:
+                return chunk_result
+
+            result['imported'] += chunk_result['imported']
+            result['rejected_count'] += chunk_result['rejected_count']
+            room = max_rejected_details - len(result['rejected'])
+            result['rejected'].extend(chunk_result['rejected'][:room])
+            result['duplicates'] += chunk_result['duplicates']
+            room = max_rejected_details - len(result['duplicate_lines'])
+            result['duplicate_lines'].extend(chunk_result['duplicate_lines'][:room])
+            result['excluded'] += chunk_result['excluded']
+            room = max_rejected_details - len(result['excluded_lines'])
+            result['excluded_lines'].extend(chunk_result['excluded_lines'][:room])
+            if 'error' in chunk_result:
+                result['error'] = chunk_result['error']
+                break
+
+            rows_read += len(chunk)
+            if progress is not None:
+                progress(rows_read, fraction)
+
+        return result
+
+    @instrumented
+    def delete_data(self, sample_ids):
+        """Delete samples by id and remove them from the per-lithology sums"""
+        try:
+            with self.db.transaction() as conn:
+                deleted = self.remove_samples(conn, sample_ids)
+            logger.info(f"✅ Deleted {deleted} rows")
+            return deleted
+        except Exception as e:
+            log_error(f"❌ Error deleting data: {e}")
+            return 0
+
+    def remove_samples(self, conn, sample_ids):
+        """Delete samples by id inside a write transaction, updating the sums; returns the count"""
+        sample_ids = list(sample_ids)
+        deleted = []
+        for start in range(0, len(sample_ids), 500):
+            chunk = sample_ids[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            deleted.extend(conn.execute(f'''
+                SELECT distancia, carga_espera, vibracao, litologia, julianday(created_at), excluded
+                FROM vibration_data WHERE id IN ({placeholders})
+            ''', chunk).fetchall())
+            conn.execute(f"DELETE FROM vibration_data WHERE id IN ({placeholders})", chunk)
+        if deleted:
+            self.bump_data_version(conn)
+            self.bump_samples_version(conn)
+            # Excluded samples never entered the sums
+            self.update_sample_statistics(conn, [row[:5] for row in deleted if not row[5]], sign=-1)
+        return len(deleted)
+
+    def update_sample_statistics(self, conn, rows, sign=1):
+        """Add (sign=1) or remove (sign=-1) stored sample rows to the regular and decayed sums"""
+        import pandas as pd
+
+        if not rows:
+            return
+        df = pd.DataFrame(rows, columns=REQUIRED_COLUMNS + ['time'])
+        time = df['time'].max()
+        weights = 2 ** ((df['time'] - time) / self.decay_half_life(conn))
+        self.add_decayed_statistics(conn, statistics_rows(sample_statistics(df, weights=weights)), time, sign)
+        self.add_statistics(conn, statistics_rows(sample_statistics(df)), sign)
+
+    @instrumented
+    def set_excluded(self, sample_ids, excluded=True):
+        """Exclude samples from the fits (or include them again) without deleting them"""
+        # Only samples whose flag changes are touched; their contribution is removed from (or added back to)
+        # the incremental sums
+        try:
+            sample_ids = list(sample_ids)
+            flag = int(bool(excluded))
+            with self.db.transaction() as conn:
+                changed = []
+                for start in range(0, len(sample_ids), 500):
+                    chunk = sample_ids[start:start + 500]
+                    placeholders = ', '.join('?' * len(chunk))
+                    changed.extend(conn.execute(f'''
+                        SELECT distancia, carga_espera, vibracao, litologia, julianday(created_at)
+                        FROM vibration_data WHERE id IN ({placeholders}) AND excluded != ?
+                    ''', chunk + [flag]).fetchall())
+                    conn.execute(f"UPDATE vibration_data SET excluded = ? WHERE id IN ({placeholders})",
+                                 [flag] + chunk)
+                if changed:
+                    self.bump_data_version(conn)
+                    self.bump_samples_version(conn)
+                    self.update_sample_statistics(conn, changed, sign=-1 if flag else 1)
+            logger.info(f"✅ {len(changed)} samples {'excluded' if flag else 'included'}")
+            return len(changed)
+        except Exception as e:
+            log_error(f"❌ Error updating excluded samples: {e}")
+            return None
+
+    @instrumented
+    def get_excluded_samples(self):
+        """Samples flagged as excluded from the fits, newest first"""
+        try:
+            cursor = self.db.connection().execute('''
+                SELECT id, distancia, carga_espera, vibracao, litologia
+                FROM vibration_data
+                WHERE excluded = 1
+                ORDER BY id DESC
+            ''')
+            return cursor.fetchall()
+        except Exception as e:
+            log_error(f"❌ Error retrieving excluded samples: {e}")
+            return []
+
+    def outlier_mask(self, distances, charges, vibrations, lithologies, threshold=OUTLIER_THRESHOLD):
+        """Flag samples whose log residual exceeds threshold standard deviations of their model"""
+        # The robust model of each lithology is used when one is fitted, since its scale is not inflated by
+        # the outliers themselves. Lithologies whose model has fewer than MIN_SCREENING_SAMPLES samples, and
+        # samples with zero vibration, are never flagged
+        import numpy as np
+        import design
+
+        vibrations = np.asarray(vibrations, dtype=float)
+        _, robust, inverse = self.model_arrays(lithologies, 'robust')
+        _, fitted, _ = self.model_arrays(lithologies)
+        models = np.where(np.isnan(robust[:, :1]), fitted, robust)[inverse]
+        K, alpha, n, _, _, sigma2, gamma, beta = np.moveaxis(models, -1, 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            predicted = design.ppv(K, alpha, distances, charges, gamma, beta)
+            z = np.abs(np.log10(vibrations) - np.log10(predicted)) / np.sqrt(sigma2)
+        return (n >= MIN_SCREENING_SAMPLES) & (vibrations > 0) & (z > threshold)
+
+    def stored_content_keys(self, conn, keys):
+        """The subset of keys already present in vibration_data"""
+        keys = list(keys)
+        stored = set()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            stored.update(row[0] for row in conn.execute(
+                f"SELECT content_key FROM vibration_data WHERE content_key IN ({', '.join('?' * len(chunk))})",
+                chunk))
+        return stored
+
+    @instrumented
+    def compact_duplicates(self, chunksize=200000):
+        """Give a content key to the samples stored without one and delete their duplicates"""
+        # One-off repair for databases created before content keys existed; the oldest copy (lowest id) of
+        # every sample is kept and the sums are updated for the removed ones
+        try:
+            with self.db.transaction() as conn:
+                cursor = conn.execute('''
+                    SELECT id, distancia, carga_espera, vibracao, litologia, event_time
+                    FROM vibration_data WHERE content_key IS NULL ORDER BY id
+                ''')
+                kept = {}
+                duplicates = []
+                while True:
+                    rows = cursor.fetchmany(chunksize)
+                    if not rows:
+                        break
+                    for sample_id, *values in rows:
+                        key = content_key(*values)
+                        if key in kept:
+                            duplicates.append(sample_id)
+                        else:
+                            kept[key] = sample_id
+                # Copies of samples that already have a key are duplicates as well
+                for key in self.stored_content_keys(conn, kept):
+                    duplicates.append(kept.pop(key))
+
+                removed = self.remove_samples(conn, duplicates)
+                conn.executemany("UPDATE vibration_data SET content_key = ? WHERE id = ?", kept.items())
+            logger.info(f"✅ Compacted samples: {len(kept)} keyed, {removed} duplicates removed")
+            return {'keyed': len(kept), 'removed': removed}
+        except Exception as e:
+            log_error(f"❌ Error compacting duplicates: {e}")
+            return None
+
+    @instrumented
     def get_all_data(self):
         """Retrieve all data from the database"""
         try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            cursor.execute('''
+            cursor = self.db.connection().execute('''
                 SELECT id, distancia, carga_espera, vibracao, litologia 
                 FROM vibration_data 
                 ORDER BY id DESC
             ''')
-            data = cursor.fetchall()
-            conn.close()
-            return data
+            return cursor.fetchall()
         except Exception as e:
-            print(f"❌ Error retrieving data: {e}")
+            log_error(f"❌ Error retrieving data: {e}")
             return []
     
+    @instrumented
+    def export_data(self, output_path, lithology=None, chunksize=50000):
+        """Write the samples (optionally of one lithology) to CSV or Excel"""
+        # CSV is streamed from SQLite in chunks; event_time is exported so that importing the file again skips
+        # every sample
+        import pandas as pd
+
+        try:
+            query = "SELECT id, distancia, carga_espera, vibracao, litologia, event_time FROM vibration_data"
+            params = ()
+            if lithology is not None:
+                query += " WHERE litologia = ?"
+                params = (lithology,)
+            query += " ORDER BY id"
+            conn = self.db.connection()
+
+            if output_path.lower().endswith(('.xlsx', '.xls')):
+                df = pd.read_sql_query(query, conn, params=params)
+                df.to_excel(output_path, index=False)
+                written = len(df)
+            else:
+                written = 0
+                for chunk in pd.read_sql_query(query, conn, params=params, chunksize=chunksize):
+                    chunk.to_csv(output_path, mode='w' if written == 0 else 'a',
+                                 header=written == 0, index=False)
+                    written += len(chunk)
+                if written == 0:
+                    pd.DataFrame(columns=['id'] + REQUIRED_COLUMNS + ['event_time']).to_csv(output_path, index=False)
+
+            logger.info(f"✅ Exported {written} rows: {output_path}")
+            return written
+        except Exception as e:
+            log_error(f"❌ Error exporting data to {output_path}: {e}")
+            return None
+
+    @instrumented
+    def count_samples(self):
+        """Number of stored samples per lithology"""
+        try:
+            cursor = self.db.connection().execute(
+                "SELECT litologia, COUNT(*) FROM vibration_data GROUP BY litologia ORDER BY litologia")
+            return dict(cursor.fetchall())
+        except Exception as e:
+            log_error(f"❌ Error counting samples: {e}")
+            return {}
+
+    @instrumented
+    def get_data_page(self, after_id=None, limit=200, filters=None):
+        """Retrieve one page of samples, newest first, using keyset pagination on id"""
+        # after_id is the smallest id of the previous page; filters are 'litologia' (exact match) and 'min_id'
+        try:
+            conditions = []
+            params = []
+            if after_id is not None:
+                conditions.append("id < ?")
+                params.append(after_id)
+            filters = filters or {}
+            if filters.get('litologia') is not None:
+                conditions.append("litologia = ?")
+                params.append(filters['litologia'])
+            if filters.get('min_id') is not None:
+                conditions.append("id > ?")
+                params.append(filters['min_id'])
+
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            cursor = self.db.connection().execute(f'''
+                SELECT id, distancia, carga_espera, vibracao, litologia 
+                FROM vibration_data 
+                {where}
+                ORDER BY id DESC
+                LIMIT ?
+            ''', params + [limit])
+            return cursor.fetchall()
+        except Exception as e:
+            log_error(f"❌ Error retrieving data page: {e}")
+            return []
+
+    @instrumented
     def get_lithologies(self):
         """Get unique lithologies from the database"""
         try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            cursor.execute("SELECT DISTINCT litologia FROM vibration_data ORDER BY litologia")
-            lithologies = [row[0] for row in cursor.fetchall()]
-            conn.close()
-            return lithologies
+            cursor = self.db.connection().execute(
+                "SELECT DISTINCT litologia FROM vibration_data ORDER BY litologia")
+            return [row[0] for row in cursor.fetchall()]
         except Exception as e:
-            print(f"❌ Error getting lithologies: {e}")
+            log_error(f"❌ Error getting lithologies: {e}")
             return []
     
+    @instrumented
     def get_data_by_lithology(self, lithology):
         """Get all data for a specific lithology"""
         try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            cursor.execute('''
+            cursor = self.db.connection().execute('''
                 SELECT distancia, carga_espera, vibracao 
                 FROM vibration_data 
                 WHERE litologia = ?
             ''', (lithology,))
-            data = cursor.fetchall()
-            conn.close()
-            return data
+            return cursor.fetchall()
         except Exception as e:
-            print(f"❌ Error getting data for lithology {lithology}: {e}")
+            log_error(f"❌ Error getting data for lithology {lithology}: {e}")
             return []
     
-    def calculate_k_factor(self):
-        """Calculate K-factor for vibration prediction"""
+    @instrumented
+    def calculate_k_factor(self, processes=None, folds=5, window_days=None, window_samples=None, robust=False):
+        """Full refit of the K-factor models from every sample"""
+        # folds=None keeps the current laws; window_days or window_samples also refits the 'window' variant
+        # and robust=True the 'robust' one
         try:
             #calcular as constantes
-            conn = sqlite3.connect(self.db_name)
-            query = "SELECT distancia, carga_espera, vibracao, litologia FROM vibration_data"
-            df = pd.read_sql_query(query,conn)
-            
-            for litologia, grupo in df.groupby('litologia'):
-                
-                grupo['X'] = np.log10(grupo['distancia'] / np.sqrt(grupo['carga_espera']))
-                grupo['Y'] = np.log10(grupo['vibracao'])
-                
-                X = grupo[['X']]
-                y = grupo['Y']
-                
-                modelo = LinearRegression().fit(X,y)
-
-                m = -modelo.coef_[0]
-                log_k = modelo.intercept_
-                k = 10 ** log_k
-                
-                cursor = conn.cursor()
-                cursor.execute("""
-                    UPDATE vibration_data
-                    SET k = ?, alpha = ?
-                    WHERE litologia = ?
-                """, (k, m, litologia))
-
-                conn.commit()
-
-            conn.close()
+            df = self.load_samples()
+            report = self.rebuild_statistics(df, processes)
+            if report is not None and folds:
+                self.select_laws(df, folds, processes=processes)
+            if report is not None and (window_days is not None or window_samples is not None):
+                self.fit_window(window_days, window_samples)
+            if report is not None and robust:
+                self.fit_robust(df)
+            return report
 
         except Exception as e:
-            print(f"❌ Error calculating K-factor: {e}")
+            log_error(f"❌ Error calculating K-factor: {e}")
             return None
     
-    def predict_vibration(self, distance, charge, lithology):
+    @instrumented
+    def select_laws(self, df=None, folds=5, seed=0, processes=None):
+        """Keep the attenuation law with the lowest cross-validated RMSE for every lithology"""
+        # Lithologies too small to cross-validate keep the square-root law
+        import numpy as np
+        import pandas as pd
+        from design import log_scaled_distance
+        from fitting import cross_validated_rmse, fit_sums, fold_ids, grouped_sums
+
         try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            cursor.execute("SELECT k, alpha FROM vibration_data WHERE litologia = ? LIMIT 1", (lithology,))
-            resultado = cursor.fetchone()
-            K, alpha = resultado
-            
-            # Predict vibration using the K-factor method
-            # V = K / (D/√Q)^B
-            scaled_distance = float(distance) / sqrt(float(charge))
-            predicted_vibration = K / (scaled_distance ** alpha)
-            
-            print(f"📊 Prediction details:")
-            print(f"   - Lithology: {lithology}")
-            print(f"   - Predicted vibration: {predicted_vibration:.2f} mm/s")
+            if df is None:
+                df = self.load_samples()
+            df = df[df['vibracao'] > 0]
+            codes, lithologies = pd.factorize(df['litologia'], sort=True)
+            distances = df['distancia'].to_numpy(dtype=float)
+            charges = df['carga_espera'].to_numpy(dtype=float)
+            y = np.log10(df['vibracao'].to_numpy(dtype=float))
+            fold = fold_ids(codes, folds, seed)
 
-            conn.close()
+            scores = {}
+            for law in LAWS:
+                x = log_scaled_distance(distances, charges, *LAWS[law])
+                sums = grouped_sums(codes, x, y, len(lithologies), processes)
+                k, alpha, r2 = fit_sums(sums)
+                rmse = cross_validated_rmse(codes, x, y, len(lithologies), fold, folds, processes)
+                scores[law] = (k, alpha, r2, rmse, sums[:, 0])
+
+            # Lowest RMSE wins; lithologies that could not be scored keep the default law
+            laws = list(LAWS)
+            rmse = np.column_stack([scores[law][3] for law in laws])
+            best = np.where(np.isnan(rmse).all(axis=1), laws.index(DEFAULT_LAW),
+                            np.argmin(np.where(np.isnan(rmse), np.inf, rmse), axis=1))
+
+            result = {}
+            with self.db.transaction() as conn:
+                data_version = self.bump_data_version(conn)
+                conn.execute("DELETE FROM law_scores")
+                for i, lithology in enumerate(lithologies):
+                    law_scores = {}
+                    for law, (k, alpha, r2, law_rmse, n) in scores.items():
+                        law_scores[law] = {'k': nullable(k[i]), 'alpha': nullable(alpha[i]), 'r2': nullable(r2[i]),
+                                           'cv_rmse': nullable(law_rmse[i]), 'n': int(n[i])}
+                        conn.execute('''
+                            INSERT INTO law_scores (litologia, law, k, alpha, r2, n, cv_rmse, data_version)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        ''', (lithology, law, law_scores[law]['k'], law_scores[law]['alpha'],
+                              law_scores[law]['r2'], int(n[i]), law_scores[law]['cv_rmse'], data_version))
+                    selected = laws[best[i]]
+                    conn.execute("UPDATE lithology_models SET law = ?, cv_rmse = ? WHERE litologia = ?",
+                                 (selected, law_scores[selected]['cv_rmse'], lithology))
+                    result[lithology] = {'law': selected, 'scores': law_scores}
+                self.refresh_models(conn, list(lithologies))
+
+            for lithology, selection in result.items():
+                logger.info(f"✅ {lithology}: {selection['law']} law selected")
+            return result
+        except Exception as e:
+            log_error(f"❌ Error selecting attenuation laws: {e}")
+            return None
+
+    @instrumented
+    def fit_window(self, days=None, samples=None):
+        """Fit the 'window' model variant of every lithology from its recent samples only"""
+        # Only the recent rows are read, through the created_at indexes; each lithology keeps its selected law
+        import pandas as pd
+        from fitting import fit_statistics, fit_sums
+
+        try:
+            if (days is None) == (samples is None):
+                raise ValueError("Informe days ou samples")
+            conn = self.db.connection()
+            selected = dict(conn.execute("SELECT litologia, law FROM lithology_models").fetchall())
+            if days is not None:
+                rows = conn.execute('''
+                    SELECT distancia, carga_espera, vibracao, litologia FROM vibration_data
+                    WHERE created_at >= datetime('now', ?) AND excluded = 0
+                ''', (f"-{float(days)} days",)).fetchall()
+                settings = f"days={float(days):g}"
+            else:
+                rows = []
+                for lithology in selected:
+                    rows.extend(conn.execute('''
+                        SELECT distancia, carga_espera, vibracao, litologia FROM vibration_data
+                        WHERE litologia = ? AND excluded = 0 ORDER BY created_at DESC, id DESC LIMIT ?
+                    ''', (lithology, int(samples))).fetchall())
+                settings = f"samples={int(samples)}"
+
+            stats = sample_statistics(pd.DataFrame(rows, columns=REQUIRED_COLUMNS))
+            lithologies = stats.index.get_level_values('litologia').unique()
+            laws = [selected.get(lithology, DEFAULT_LAW) for lithology in lithologies]
+            sums = stats.loc[list(zip(lithologies, laws))].to_numpy(dtype=float).reshape(-1, len(STAT_COLUMNS))
+            k, alpha, r2 = fit_sums(sums)
+            mean_x, sxx, sigma2 = fit_statistics(sums)
+
+            self.replace_variant_models('window', lithologies, laws, k, alpha, sums[:, 0], r2, mean_x, sxx, sigma2,
+                                        settings)
+            result = {lithology: {'law': laws[i], 'k': float(k[i]), 'alpha': float(alpha[i]),
+                                  'n': int(sums[i, 0]), 'r2': nullable(r2[i])}
+                      for i, lithology in enumerate(lithologies)}
+
+            logger.info(f"✅ Window models fitted ({settings}): {len(result)} lithologies")
+            return result
+        except Exception as e:
+            log_error(f"❌ Error fitting window models: {e}")
+            return None
+
+    def replace_variant_models(self, variant, lithologies, laws, k, alpha, n, r2, mean_x, sxx, sigma2, settings):
+        """Replace every stored model of a variant with per-lithology fit arrays (NaN stored as NULL)"""
+        with self.db.transaction() as conn:
+            data_version = self.bump_data_version(conn)
+            conn.execute("DELETE FROM lithology_variant_models WHERE variant = ?", (variant,))
+            conn.executemany('''
+                INSERT INTO lithology_variant_models
+                    (litologia, variant, law, k, alpha, n, r2, mean_x, sxx, sigma2, settings, data_version)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(lithology, variant, laws[i], float(k[i]), float(alpha[i]), float(n[i]), nullable(r2[i]),
+                   nullable(mean_x[i]), nullable(sxx[i]), nullable(sigma2[i]), settings, data_version)
+                  for i, lithology in enumerate(lithologies)])
+
+    @instrumented
+    def fit_robust(self, df=None, c=1.345):
+        """Fit the 'robust' model variant of every lithology by Huber IRLS"""
+        # The stored sigma2 is the square of the robust residual scale (median absolute residual / 0.6745)
+        import numpy as np
+        import pandas as pd
+        from fitting import fit_statistics, fit_sums, grouped_sums, huber_fit
+
+        try:
+            if df is None:
+                df = self.load_samples()
+            df = df[df['vibracao'] > 0]
+            codes, lithologies = pd.factorize(df['litologia'], sort=True)
+            conn = self.db.connection()
+            selected = dict(conn.execute("SELECT litologia, law FROM lithology_models").fetchall())
+            laws = [selected.get(lithology, DEFAULT_LAW) for lithology in lithologies]
+            gamma, beta = np.array([LAWS[law] for law in laws], dtype=float).reshape(-1, 2).T
+            x = (gamma[codes] * np.log10(df['distancia'].to_numpy(dtype=float)) -
+                 beta[codes] * np.log10(df['carga_espera'].to_numpy(dtype=float)))
+            y = np.log10(df['vibracao'].to_numpy(dtype=float))
+
+            k, alpha, scale, weights = huber_fit(codes, x, y, len(lithologies), c)
+            sums = grouped_sums(codes, x, y, len(lithologies), weights=weights)
+            _, _, r2 = fit_sums(sums)
+            mean_x, sxx, _ = fit_statistics(sums)
+            n = np.bincount(codes, minlength=len(lithologies))
+            downweighted = np.bincount(codes, weights=weights < 1, minlength=len(lithologies))
+
+            self.replace_variant_models('robust', lithologies, laws, k, alpha, n, r2, mean_x, sxx, scale ** 2,
+                                        f"huber_c={c:g}")
+            result = {lithology: {'law': laws[i], 'k': float(k[i]), 'alpha': float(alpha[i]), 'n': int(n[i]),
+                                  'scale': nullable(scale[i]), 'downweighted': int(downweighted[i])}
+                      for i, lithology in enumerate(lithologies)}
+
+            logger.info(f"✅ Robust models fitted: {len(result)} lithologies")
+            return result
+        except Exception as e:
+            log_error(f"❌ Error fitting robust models: {e}")
+            return None
+
+    @instrumented
+    def screen_outliers(self, threshold=OUTLIER_THRESHOLD):
+        """Refit the robust models and exclude every stored outlier"""
+        # Flagged samples stay in the table; set_excluded(ids, False) includes them again
+        import numpy as np
+        import pandas as pd
+
+        try:
+            if self.fit_robust() is None:
+                return None
+            df = pd.read_sql_query('''
+                SELECT id, distancia, carga_espera, vibracao, litologia FROM vibration_data
+                WHERE excluded = 0 AND vibracao > 0
+            ''', self.db.connection())
+            outliers = self.outlier_mask(df['distancia'], df['carga_espera'], df['vibracao'],
+                                         df['litologia'], threshold)
+            if self.set_excluded(df['id'][outliers].tolist()) is None:
+                return None
+            flagged = df['litologia'][outliers].value_counts()
+            logger.info(f"✅ Screened {len(df)} samples: {int(np.sum(outliers))} outliers excluded")
+            return {str(lithology): int(count) for lithology, count in flagged.items()}
+        except Exception as e:
+            log_error(f"❌ Error screening outliers: {e}")
+            return None
+
+    @instrumented
+    def get_law_scores(self):
+        """Cross-validation scores of every law per lithology from the last select_laws"""
+        try:
+            cursor = self.db.connection().execute('''
+                SELECT s.litologia, s.law, s.k, s.alpha, s.r2, s.n, s.cv_rmse,
+                       s.law = m.law AS selected, s.data_version
+                FROM law_scores s LEFT JOIN lithology_models m ON m.litologia = s.litologia
+                ORDER BY s.litologia, s.cv_rmse
+            ''')
+            columns = [description[0] for description in cursor.description]
+            return [dict(zip(columns, row), selected=bool(row[7])) for row in cursor.fetchall()]
+        except Exception as e:
+            log_error(f"❌ Error getting law scores: {e}")
+            return []
+
+    @instrumented
+    def get_coefficients(self, lithologies, variant=DEFAULT_VARIANT):
+        """Return {lithology: (k, alpha)} for the fitted lithologies among the given ones"""
+        # Served from the coefficient cache; only cache misses query SQLite
+        return {lithology: model[:2] for lithology, model in self.cached_models(lithologies, variant).items()}
+
+    @instrumented
+    def get_fit_statistics(self, lithologies, variant=DEFAULT_VARIANT):
+        """Return {lithology: (k, alpha, n, mean_x, sxx, sigma2, law)} for the fitted lithologies"""
+        # n is the sum of the weights for the decayed variant, an effective sample size
+        return self.cached_models(lithologies, variant)
+
+    def check_data_version(self):
+        """Invalidate the coefficient cache when another process changed the data"""
+        now = time.monotonic()
+        if now - self._cache_checked_at < self.cache_check_interval:
+            return
+        self._cache_checked_at = now
+        self._version_checks += 1
+        data_version = self.get_data_version()
+        if data_version != self._cached_data_version:
+            if self._cached_data_version is not None:
+                self.coefficient_cache.invalidate()
+                self._external_invalidations += 1
+            self._cached_data_version = data_version
+
+    def cached_models(self, lithologies, variant=DEFAULT_VARIANT):
+        """Model rows of the given lithologies, loading cache misses from SQLite"""
+        if variant not in MODEL_VARIANTS:
+            raise ValueError(f"Variante de modelo desconhecida: {variant}")
+        self.check_data_version()
+        models = {}
+        missing = []
+        for lithology in lithologies:
+            found, value = self.coefficient_cache.get(lithology if variant == DEFAULT_VARIANT
+                                                      else (variant, lithology))
+            if not found:
+                missing.append(lithology)
+            elif value is not None:
+                models[lithology] = value
+        if not missing:
+            return models
+
+        version = self.coefficient_cache.version
+        loaded = {}
+        conn = self.db.connection()
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            if variant == DEFAULT_VARIANT:
+                cursor = conn.execute(f'''
+                    SELECT litologia, k, alpha, n, mean_x, sxx, sigma2, law FROM lithology_models
+                    WHERE litologia IN ({', '.join('?' * len(chunk))})
+                ''', chunk)
+            else:
+                cursor = conn.execute(f'''
+                    SELECT litologia, k, alpha, n, mean_x, sxx, sigma2, law FROM lithology_variant_models
+                    WHERE variant = ? AND litologia IN ({', '.join('?' * len(chunk))})
+                ''', [variant] + chunk)
+            loaded.update((row[0], tuple(row[1:])) for row in cursor)
+        for lithology in missing:
+            # Lithologies without a model are cached too, as None
+            self.coefficient_cache.put(lithology if variant == DEFAULT_VARIANT else (variant, lithology),
+                                       loaded.get(lithology), version)
+        models.update(loaded)
+        return models
+
+    def cache_info(self):
+        """Hit/miss counters and size of the coefficient cache, and its data version checks"""
+        return dict(self.coefficient_cache.info(), version_checks=self._version_checks,
+                    external_invalidations=self._external_invalidations)
+
+    @instrumented
+    def predict_vibration_batch(self, distances, charges=None, lithologies=None, variant=DEFAULT_VARIANT):
+        """Predicted PPV for many blasts at once; NaN where there is no model"""
+        # Accepts arrays (a single lithology string is broadcast) or a DataFrame with distance, charge and
+        # lithology columns
+        import numpy as np
+        import pandas as pd
+        import design
+
+        try:
+            if isinstance(distances, pd.DataFrame):
+                column_mapping, missing_columns = map_columns(distances.columns, PREDICTION_COLUMNS)
+                if missing_columns:
+                    raise ValueError(f"Colunas obrigatórias não encontradas: {', '.join(missing_columns)}")
+                df = distances
+                distances = df[column_mapping['distancia']]
+                charges = df[column_mapping['carga_espera']]
+                lithologies = df[column_mapping['litologia']]
+
+            # Text that is not a number becomes NaN instead of failing the whole batch
+            distances, charges = (pd.to_numeric(pd.Series(np.ravel(values), dtype=object), errors='coerce')
+                                  .to_numpy(dtype=float).reshape(np.shape(values))
+                                  for values in (distances, charges))
+            lithologies = np.broadcast_to(np.asarray(lithologies, dtype=str), distances.shape)
+
+            # One coefficient lookup per distinct lithology
+            _, models, inverse = self.model_arrays(lithologies, variant)
+            K, alpha, gamma, beta = models[:, [0, 1, 6, 7]].T
+            return design.ppv(K[inverse], alpha[inverse], distances, charges, gamma[inverse], beta[inverse])
+
+        except Exception as e:
+            log_error(f"❌ Error in batch vibration prediction: {e}")
+            return None
+
+    @instrumented
+    def predict_file(self, input_path, output_path=None, column='vibracao_prevista'):
+        """Score a CSV/Excel file of planned blasts and write it back with the predictions"""
+        import numpy as np
+
+        try:
+            df = self.complete_distances(read_table(input_path))
+            predicted = self.predict_vibration_batch(df)
+            if predicted is None:
+                return None
+            df[column] = predicted
+
+            if output_path is None:
+                root, extension = os.path.splitext(input_path)
+                output_path = f"{root}_previsao{extension}"
+            if output_path.lower().endswith(('.xlsx', '.xls')):
+                df.to_excel(output_path, index=False)
+            else:
+                df.to_csv(output_path, index=False)
+
+            logger.info(f"✅ Predicted {int(np.isfinite(predicted).sum())} of {len(df)} blasts: {output_path}")
+            return output_path
+
+        except Exception as e:
+            log_error(f"❌ Error scoring file {input_path}: {e}")
+            return None
+
+    @instrumented
+    def get_models(self, variant=DEFAULT_VARIANT):
+        """Fitted model of every lithology (of the given variant) as a list of dicts"""
+        try:
+            if variant == DEFAULT_VARIANT:
+                cursor = self.db.connection().execute('''
+                    SELECT litologia, law, k, alpha, n, r2, cv_rmse, mean_x, sxx, sigma2, fitted_at, data_version
+                    FROM lithology_models
+                    ORDER BY litologia
+                ''')
+            else:
+                cursor = self.db.connection().execute('''
+                    SELECT litologia, law, k, alpha, n, r2, mean_x, sxx, sigma2, settings, fitted_at, data_version
+                    FROM lithology_variant_models
+                    WHERE variant = ?
+                    ORDER BY litologia
+                ''', (variant,))
+            columns = [description[0] for description in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        except Exception as e:
+            log_error(f"❌ Error getting lithology models: {e}")
+            return []
+
+    def predict_ppv(self, distance, charge, lithology, variant=DEFAULT_VARIANT):
+        """Predicted PPV in mm/s, or None when the lithology has no model"""
+        distance = float(distance)
+        charge = float(charge)
+        if distance <= 0 or charge <= 0:
+            raise ValueError("Distância e carga devem ser valores positivos")
+        resultado = self.get_fit_statistics([lithology], variant).get(lithology)
+        if resultado is None:
+            return None
+        K, alpha = resultado[:2]
+        gamma, beta = LAWS[resultado[-1]]
+        
+        # Predict vibration using the K-factor method
+        # V = K / (D^gamma/Q^beta)^B, D/√Q for the square-root law
+        scaled_distance = distance ** gamma / charge ** beta
+        return K / (scaled_distance ** alpha)
+
+    def max_charge(self, distance, ppv_limit, lithology, confidence=None):
+        """Largest charge per delay (kg) keeping the predicted PPV at or below ppv_limit"""
+        # Inverse of predict_ppv: Q = (D^gamma / (K/V)^(1/alpha))^(1/beta). With confidence the charge is
+        # designed against the one-sided upper prediction bound
+        distance = float(distance)
+        ppv_limit = float(ppv_limit)
+        if distance <= 0 or ppv_limit <= 0:
+            raise ValueError("Distância e limite de vibração devem ser valores positivos")
+        if confidence is not None:
+            charge = self.max_charge_batch([distance], ppv_limit, lithology, confidence)
+            return None if charge is None or isnan(charge[0]) else float(charge[0])
+        resultado = self.get_fit_statistics([lithology]).get(lithology)
+        if resultado is None:
+            return None
+        K, alpha = resultado[:2]
+        gamma, beta = LAWS[resultado[-1]]
+        if K <= 0 or alpha <= 0:
+            return None
+        return (distance ** gamma / (K / ppv_limit) ** (1 / alpha)) ** (1 / beta)
+
+    def model_arrays(self, lithologies, variant=DEFAULT_VARIANT):
+        """Model rows aligned with np.unique(lithologies), plus the inverse index"""
+        import numpy as np
+        from design import MODEL_COLUMNS
+
+        unique, inverse = np.unique(np.asarray(lithologies, dtype=str), return_inverse=True)
+        statistics = self.get_fit_statistics(unique.tolist(), variant)
+        missing = (np.nan,) * len(MODEL_COLUMNS)
+        models = np.array([statistics[l][:-1] + LAWS[statistics[l][-1]] if l in statistics else missing
+                           for l in unique], dtype=float).reshape(-1, len(MODEL_COLUMNS))
+        return unique, models, inverse.reshape(np.shape(lithologies))
+
+    @staticmethod
+    def t_values(models, p):
+        """Student t quantile p for the residual degrees of freedom of every model row"""
+        import numpy as np
+
+        t = np.full(len(models), np.nan)
+        for i, (n, sxx) in enumerate(models[:, [2, 4]]):
+            if not isnan(n) and residual_dof(n, sxx) > 0:
+                t[i] = t_quantile(p, residual_dof(n, sxx))
+        return t
+
+    @instrumented
+    def predict_interval_batch(self, distances, charges, lithologies, confidence=0.95, variant=DEFAULT_VARIANT):
+        """Mean prediction with confidence and prediction intervals for many blasts"""
+        # Closed form from the stored fit statistics, with x = log10(D^gamma/Q^beta) of the lithology's law.
+        # In log10 space the mean response is ŷ ± t·σ·√(1/n + (x - x̄)²/Sxx) and a new blast
+        # ŷ ± t·σ·√(1 + 1/n + (x - x̄)²/Sxx). 'upper_bound' is the one-sided upper prediction bound, the value
+        # to check against a regulatory limit
+        import numpy as np
+        import design
+
+        try:
+            distances, charges = np.broadcast_arrays(np.asarray(distances, dtype=float),
+                                                     np.asarray(charges, dtype=float))
+            lithologies = np.broadcast_to(np.asarray(lithologies, dtype=str), distances.shape)
+            _, models, inverse = self.model_arrays(lithologies, variant)
+            K, alpha, n, mean_x, sxx, sigma2, gamma, beta = np.moveaxis(models[inverse], -1, 0)
+            two_sided = self.t_values(models, (1 + confidence) / 2)[inverse]
+            one_sided = self.t_values(models, confidence)[inverse]
+
+            predicted = design.ppv(K, alpha, distances, charges, gamma, beta)
+            x = design.log_scaled_distance(distances, charges, gamma, beta)
+            mean_width = 10 ** design.log_half_width(n, mean_x, sxx, sigma2, two_sided, x, prediction=False)
+            new_width = 10 ** design.log_half_width(n, mean_x, sxx, sigma2, two_sided, x)
+            return {
+                'ppv': predicted,
+                'confidence_lower': predicted / mean_width,
+                'confidence_upper': predicted * mean_width,
+                'prediction_lower': predicted / new_width,
+                'prediction_upper': predicted * new_width,
+                'upper_bound': design.ppv_upper(K, alpha, n, mean_x, sxx, sigma2, one_sided, distances, charges,
+                                                gamma, beta),
+            }
+        except Exception as e:
+            log_error(f"❌ Error in interval prediction: {e}")
+            return None
+
+    def predict_interval(self, distance, charge, lithology, confidence=0.95, variant=DEFAULT_VARIANT):
+        """Mean prediction with confidence and prediction intervals for a single blast"""
+        predicted = self.predict_ppv(distance, charge, lithology, variant)
+        if predicted is None:
+            return None
+        k, alpha, n, mean_x, sxx, sigma2, law = self.get_fit_statistics([lithology], variant)[lithology]
+        result = dict.fromkeys(['confidence_lower', 'confidence_upper', 'prediction_lower', 'prediction_upper',
+                                'upper_bound'])
+        result.update(ppv=predicted, confidence=confidence)
+        if n is None or mean_x is None or sxx is None or sigma2 is None or residual_dof(n, sxx) <= 0:
+            return result
+
+        gamma, beta = LAWS[law]
+        x = gamma * log10(float(distance)) - beta * log10(float(charge))
+        leverage = (x - mean_x) ** 2 / sxx if sxx > 1e-12 else 0.0
+        two_sided = t_quantile((1 + confidence) / 2, residual_dof(n, sxx))
+        mean_width = 10 ** (two_sided * sqrt(sigma2 * (1 / n + leverage)))
+        new_width = 10 ** (two_sided * sqrt(sigma2 * (1 + 1 / n + leverage)))
+        result.update(
+            confidence_lower=predicted / mean_width,
+            confidence_upper=predicted * mean_width,
+            prediction_lower=predicted / new_width,
+            prediction_upper=predicted * new_width,
+            upper_bound=predicted * 10 ** (t_quantile(confidence, residual_dof(n, sxx))
+                                           * sqrt(sigma2 * (1 + 1 / n + leverage))),
+        )
+        return result
+
+    @instrumented
+    def max_charge_batch(self, distances, ppv_limits, lithologies, confidence=None):
+        """Vectorized max_charge; NaN where the lithology has no usable model"""
+        # With confidence the charge is 0 where none keeps the upper prediction bound under the limit
+        import numpy as np
+        import design
+
+        try:
+            distances, ppv_limits = np.broadcast_arrays(np.asarray(distances, dtype=float),
+                                                        np.asarray(ppv_limits, dtype=float))
+            lithologies = np.broadcast_to(np.asarray(lithologies, dtype=str), distances.shape)
+            _, models, inverse = self.model_arrays(lithologies)
+            K, alpha, n, mean_x, sxx, sigma2, gamma, beta = np.moveaxis(models[inverse], -1, 0)
+            if confidence is None:
+                return design.max_charge(K, alpha, distances, ppv_limits, gamma, beta)
+            t = self.t_values(models, confidence)[inverse]
+            return design.max_charge_upper(K, alpha, n, mean_x, sxx, sigma2, t, distances, ppv_limits,
+                                           gamma, beta)
+        except Exception as e:
+            log_error(f"❌ Error in maximum charge calculation: {e}")
+            return None
+
+    @instrumented
+    def design_grid(self, distances, charges=None, ppv_limits=None, lithologies=None, confidence=None):
+        """PPV or allowable charge over a lithology × distance × value mesh"""
+        # values has shape (lithologies, distances, values); see design.grid_table and design.export_grid
+        import numpy as np
+        import design
+
+        try:
+            if (charges is None) == (ppv_limits is None):
+                raise ValueError("Informe charges ou ppv_limits")
+            if lithologies is None:
+                lithologies = [model['litologia'] for model in self.get_models()]
+            lithologies = list(lithologies)
+            unique, models, inverse = self.model_arrays(lithologies)
+            models = models[inverse]
+            t = None if confidence is None else self.t_values(models, confidence)
+            distances = np.asarray(distances, dtype=float).ravel()
+
+            if charges is not None:
+                values = np.asarray(charges, dtype=float).ravel()
+                grid = {'quantity': 'ppv', 'carga_espera': values}
+            else:
+                values = np.asarray(ppv_limits, dtype=float).ravel()
+                grid = {'quantity': 'max_charge', 'vibracao_limite': values}
+            grid.update({
+                'litologia': lithologies,
+                'distancia': distances,
+                'confidence': confidence,
+                'values': design.evaluate_grid(models, distances, values, grid['quantity'], t),
+            })
+            return grid
+        except Exception as e:
+            log_error(f"❌ Error evaluating design grid: {e}")
+            return None
+
+    @instrumented
+    def simulate_blast(self, holes, charges, delays, receptors, lithologies, rule='max', delay_window=8.0,
+                       confidence=None, variant=DEFAULT_VARIANT, chunk_elements=1_000_000):
+        """Peak PPV at many receptors from a multi-hole blast"""
+        # The law of the ground at each receptor is used for every hole
+        import numpy as np
+        import blast
+
+        try:
+            receptors = blast.as_points(receptors)
+            lithologies = np.broadcast_to(np.asarray(lithologies, dtype=str), (len(receptors),))
+            _, models, inverse = self.model_arrays(lithologies, variant)
+            t = None if confidence is None else self.t_values(models, confidence)[inverse]
+            peak, hole, delay = blast.simulate(models[inverse], holes, charges, delays, receptors, rule,
+                                               delay_window, t, chunk_elements)
+            return {'ppv': peak, 'hole': hole, 'delay': delay, 'rule': rule, 'delay_window': delay_window,
+                    'confidence': confidence, 'variant': variant}
+        except Exception as e:
+            log_error(f"❌ Error simulating blast: {e}")
+            return None
+
+    @instrumented
+    def predict_vibration(self, distance, charge, lithology, variant=DEFAULT_VARIANT):
+        try:
+            predicted_vibration = self.predict_ppv(distance, charge, lithology, variant)
+            if predicted_vibration is None:
+                return "Sem dados para esta litologia"
+            
+            # Lazy %-formatting: nothing is formatted unless debug logging is enabled
+            logger.debug("📊 Prediction details: lithology=%s, predicted vibration=%.2f mm/s",
+                         lithology, predicted_vibration)
             
             return f"{predicted_vibration:.2f} mm/s"
             
             
         except Exception as e:
-            print(f"❌ Error in vibration prediction: {e}")
+            log_error(f"❌ Error in vibration prediction: {e}")
             return "Erro na previsão"
-    
+
+    @instrumented
+    def save_receptors(self, receptors):
+        """Insert or update receptors by name"""
+        import pandas as pd
+
+        try:
+            df = pd.DataFrame(receptors)
+            missing = [col for col in ('nome', 'x', 'y') if col not in df.columns]
+            if missing:
+                raise ValueError(f"Colunas ausentes: {', '.join(missing)}")
+            df = df.reindex(columns=['nome', 'kind', 'x', 'y', 'z', 'litologia', 'ppv_limit'])
+            df['nome'] = df['nome'].astype(str).str.strip()
+            df['kind'] = df['kind'].fillna('station').astype(str).str.strip().str.lower()
+            for col in ('x', 'y', 'z', 'ppv_limit'):
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+            df['z'] = df['z'].fillna(0.0)
+            if df[['x', 'y']].isna().any().any():
+                raise ValueError("Coordenadas não numéricas")
+            if (df['nome'] == '').any() or df['nome'].str.lower().isin(['nan', 'none']).any():
+                raise ValueError("Nome vazio")
+            unknown = sorted(set(df['kind']) - set(RECEPTOR_KINDS))
+            if unknown:
+                raise ValueError(f"Tipo de receptor desconhecido: {', '.join(unknown)}")
+            df = df.astype(object).where(df.notna(), None)
+
+            with self.db.transaction() as conn:
+                conn.executemany('''
+                    INSERT INTO receptors (nome, kind, x, y, z, litologia, ppv_limit)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(nome) DO UPDATE SET
+                        kind = excluded.kind, x = excluded.x, y = excluded.y, z = excluded.z,
+                        litologia = excluded.litologia, ppv_limit = excluded.ppv_limit
+                ''', df.itertuples(index=False, name=None))
+                conn.execute("UPDATE backend_metadata SET value = value + 1 WHERE key = 'receptors_version'")
+            logger.info(f"✅ Saved {len(df)} receptors")
+            return len(df)
+        except Exception as e:
+            log_error(f"❌ Error saving receptors: {e}")
+            return None
+
+    @instrumented
+    def delete_receptors(self, names):
+        """Delete receptors by name; returns the number deleted, or None on error"""
+        try:
+            names = [str(name).strip() for name in names]
+            with self.db.transaction() as conn:
+                deleted = conn.executemany("DELETE FROM receptors WHERE nome = ?",
+                                           [(name,) for name in names]).rowcount
+                conn.execute("UPDATE backend_metadata SET value = value + 1 WHERE key = 'receptors_version'")
+            logger.info(f"✅ Deleted {deleted} receptors")
+            return deleted
+        except Exception as e:
+            log_error(f"❌ Error deleting receptors: {e}")
+            return None
+
+    @instrumented
+    def get_receptors(self, kind=None):
+        """Stored receptors (optionally of one kind) as a list of dicts, by name"""
+        try:
+            cursor = self.db.connection().execute('''
+                SELECT id, nome, kind, x, y, z, litologia, ppv_limit
+                FROM receptors
+                WHERE ? IS NULL OR kind = ?
+                ORDER BY nome
+            ''', (kind, kind))
+            columns = [description[0] for description in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        except Exception as e:
+            log_error(f"❌ Error retrieving receptors: {e}")
+            return []
+
+    def receptor_index(self, kind=None):
+        """Spatial index and rows of the stored receptors, rebuilt only when they change"""
+        # Built once per process and kind and rebuilt only when receptors_version changed, so a query costs
+        # one metadata read plus the grid lookup
+        import spatial
+
+        conn = self.db.connection()
+        row = conn.execute("SELECT value FROM backend_metadata WHERE key = 'receptors_version'").fetchone()
+        version = row[0] if row else 0
+        with self._receptor_lock:
+            if self._receptor_index is None or self._receptor_index[0] != version:
+                self._receptor_index = (version, {})
+            indexes = self._receptor_index[1]
+            if kind not in indexes:
+                receptors = self.get_receptors(kind)
+                indexes[kind] = (spatial.GridIndex([(r['x'], r['y'], r['z']) for r in receptors]), receptors)
+            return indexes[kind]
+
+    @instrumented
+    def receptors_near(self, x, y, z=0.0, radius=None, nearest=None, kind=None):
+        """Receptors within radius (m) of a blast and/or the nearest ones, nearest first"""
+        try:
+            if radius is None and nearest is None:
+                raise ValueError("Informe radius ou nearest")
+            index, receptors = self.receptor_index(kind)
+            point = (float(x), float(y), float(z))
+            if nearest is None:
+                indices, distances = index.within(point, float(radius))
+            else:
+                indices, distances = index.nearest(point, int(nearest), None if radius is None else float(radius))
+            return [dict(receptors[i], distancia=d) for i, d in zip(indices.tolist(), distances.tolist())]
+        except Exception as e:
+            log_error(f"❌ Error searching receptors: {e}")
+            return None
+
+    def receptor_distances(self, names, x, y, z=0.0):
+        """Distance (m) from each blast position to the named receptor; NaN for unknown names"""
+        import numpy as np
+
+        _, receptors = self.receptor_index()
+        positions = {r['nome'].casefold(): (r['x'], r['y'], r['z']) for r in receptors}
+        names = np.asarray(names, dtype=object)
+        located = np.array([positions.get(str(name).strip().casefold(), (np.nan,) * 3) for name in names],
+                           dtype=float).reshape(-1, 3)
+        blasts = np.stack(np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float),
+                                              np.asarray(z, dtype=float)), axis=-1).reshape(-1, 3)
+        return np.sqrt(((located - blasts) ** 2).sum(axis=1))
+
+    def complete_distances(self, df):
+        """Fill missing distances from a receptor column and the blast coordinates"""
+        # Rows without a numeric distancia get the distance from the blast to the stored receptor
+        import pandas as pd
+
+        receptor, coordinates = find_location_columns(df.columns)
+        if receptor is None or 'x' not in coordinates or 'y' not in coordinates:
+            return df
+        z = pd.to_numeric(df[coordinates['z']], errors='coerce').fillna(0.0) if 'z' in coordinates else 0.0
+        computed = pd.Series(self.receptor_distances(df[receptor],
+                                                     pd.to_numeric(df[coordinates['x']], errors='coerce'),
+                                                     pd.to_numeric(df[coordinates['y']], errors='coerce'), z),
+                             index=df.index)
+        mapping, missing = map_columns(df.columns, ['distancia'])
+        if missing:
+            return df.assign(distancia=computed)
+        column = mapping['distancia']
+        typed = pd.to_numeric(df[column], errors='coerce')
+        return df.assign(**{column: df[column].where(typed.notna() | computed.isna(), computed)})
@@ -0,0 +1,215 @@
+"""Benchmark suite for VibrationBackend on synthetic blast datasets
+
+Usage:
+    python benchmark.py --sizes 1k 10k 100k 1M --output benchmark_results.json
+
+Every size runs against a fresh SQLite file. Results are written as JSON so
+runs from different versions can be compared, and the fitted K/alpha are
+checked against the parameters the data was generated from.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from backend import VibrationBackend
+
+SIZE_SUFFIXES = {'k': 1_000, 'm': 1_000_000}
+
+
+def parse_size(text):
+    """Parse sizes such as 1000, 10k or 10M"""
+    text = text.strip().lower()
+    if text[-1] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
+
+
+def generate_dataset(n_rows, n_lithologies=8, noise=0.15, seed=0):
+    """Synthetic blast records following V = K / (D/√Q)^alpha with log-normal noise
+
+    Distances and charges per delay are log-normal; noise is the standard
+    deviation of log10(PPV). Returns the DataFrame and {lithology: (K, alpha)}.
+    """
+    rng = np.random.default_rng(seed)
+    lithologies = np.array([f"Litologia {i + 1:02d}" for i in range(n_lithologies)])
+    params = {
+        lithology: (float(rng.uniform(100, 2000)), float(rng.uniform(1.2, 1.9)))
+        for lithology in lithologies
+    }
+    K = np.array([params[lithology][0] for lithology in lithologies])
+    alpha = np.array([params[lithology][1] for lithology in lithologies])
+
+    codes = rng.integers(0, n_lithologies, n_rows)
+    distances = rng.lognormal(mean=np.log(400), sigma=0.6, size=n_rows)
+    charges = rng.lognormal(mean=np.log(50), sigma=0.7, size=n_rows)
+    scaled_distance = distances / np.sqrt(charges)
+    log_ppv = np.log10(K[codes]) - alpha[codes] * np.log10(scaled_distance) + rng.normal(0, noise, n_rows)
+
+    df = pd.DataFrame({
+        'distancia': distances,
+        'carga_espera': charges,
+        'vibracao': 10 ** log_ppv,
+        'litologia': lithologies[codes],
+    })
+    return df, params
+
+
+def check_coefficients(backend, df, params, noise, tolerance=5.0):
+    """Compare fitted K/alpha with the generating ones, in units of their standard error
+
+    The data follows the square-root law, so its fit is checked whichever law
+    the model selection picked.
+    """
+    x = np.log10(df['distancia'] / np.sqrt(df['carga_espera']))
+    coefficients = {score['litologia']: (score['k'], score['alpha'])
+                    for score in backend.get_law_scores() if score['law'] == 'usbm'}
+    selected = {model['litologia']: model['law'] for model in backend.get_models()}
+    checks = []
+    for lithology, (K, alpha) in params.items():
+        group = x[df['litologia'] == lithology]
+        n = len(group)
+        sxx = float(((group - group.mean()) ** 2).sum())
+        if lithology not in coefficients or n < 3 or sxx <= 0:
+            checks.append({'litologia': lithology, 'ok': False, 'reason': 'no model'})
+            continue
+        k_fit, alpha_fit = coefficients[lithology]
+        se_alpha = noise / np.sqrt(sxx)
+        se_log_k = noise * np.sqrt(1 / n + group.mean() ** 2 / sxx)
+        alpha_error = abs(alpha_fit - alpha) / se_alpha
+        log_k_error = abs(np.log10(k_fit) - np.log10(K)) / se_log_k
+        checks.append({
+            'litologia': lithology,
+            'k': [K, k_fit],
+            'alpha': [alpha, alpha_fit],
+            'alpha_error_se': float(alpha_error),
+            'log_k_error_se': float(log_k_error),
+            'selected_law': selected.get(lithology),
+            'ok': bool(alpha_error < tolerance and log_k_error < tolerance),
+        })
+    return checks
+
+
+def timed(results, size, operation, func, rows=None, repeat=1):
+    """Run func repeat times and record the mean wall time"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        value = func()
+    seconds = (time.perf_counter() - start) / repeat
+    entry = {'size': size, 'operation': operation, 'seconds': seconds}
+    if rows is not None:
+        entry['rows'] = rows
+        entry['rows_per_second'] = rows / seconds if seconds > 0 else None
+    results.append(entry)
+    return value
+
+
+def run_size(size, workdir, args):
+    """Benchmark every core path on a dataset of the given size"""
+    print(f"== {size} rows")
+    results = []
+    df, params = generate_dataset(size, args.lithologies, args.noise, args.seed)
+    db_path = os.path.join(workdir, f"bench_{size}.db")
+    csv_path = os.path.join(workdir, f"bench_{size}.csv")
+    df.to_csv(csv_path, index=False)
+
+    backend = VibrationBackend(db_path)
+
+    saves = min(size, args.single_ops)
+    rows = df.head(saves).itertuples(index=False, name=None)
+    timed(results, size, 'save_data', lambda: [backend.save_data(*row) for row in rows], rows=saves)
+    backend.delete_data(range(1, saves + 1))
+
+    timed(results, size, 'import_file (csv)', lambda: backend.import_file(csv_path), rows=size)
+    if size <= args.max_excel_size:
+        xlsx_path = os.path.join(workdir, f"bench_{size}.xlsx")
+        df.to_excel(xlsx_path, index=False)
+        excel_db = VibrationBackend(os.path.join(workdir, f"bench_{size}_xlsx.db"))
+        timed(results, size, 'import_file (xlsx)', lambda: excel_db.import_file(xlsx_path), rows=size)
+        excel_db.close()
+
+    if size <= args.max_full_scan_size:
+        timed(results, size, 'get_all_data', backend.get_all_data, rows=size)
+    timed(results, size, 'get_lithologies', backend.get_lithologies, repeat=10)
+    timed(results, size, 'calculate_k_factor', backend.calculate_k_factor, rows=size)
+
+    lithology = next(iter(params))
+    timed(results, size, 'predict_vibration', lambda: backend.predict_vibration(400, 50, lithology),
+          repeat=args.single_ops)
+    timed(results, size, 'predict_vibration_batch',
+          lambda: backend.predict_vibration_batch(df['distancia'], df['carga_espera'], df['litologia']),
+          rows=size)
+
+    for entry in results:
+        rows = f"  ({entry['rows']} rows)" if 'rows' in entry else ""
+        print(f"  {entry['operation']:<28} {entry['seconds'] * 1000:10.2f} ms{rows}")
+
+    checks = check_coefficients(backend, df, params, args.noise)
+    failed = [check['litologia'] for check in checks if not check['ok']]
+    print(f"  coefficient check: {'ok' if not failed else 'FAILED for ' + ', '.join(failed)}")
+    backend.close()
+    return results, {'size': size, 'ok': not failed, 'lithologies': checks}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark VibrationBackend on synthetic data")
+    parser.add_argument('--sizes', nargs='+', default=['1k', '10k', '100k'],
+                        help="dataset sizes, e.g. 1k 10k 100k 1M 10M")
+    parser.add_argument('--lithologies', type=int, default=8)
+    parser.add_argument('--noise', type=float, default=0.15, help="standard deviation of log10(PPV)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--single-ops', type=int, default=1000,
+                        help="calls timed for per-call operations (save_data, predict_vibration)")
+    parser.add_argument('--max-excel-size', type=parse_size, default=100_000,
+                        help="largest size also imported from Excel")
+    parser.add_argument('--max-full-scan-size', type=parse_size, default=2_000_000,
+                        help="largest size for get_all_data, which loads every row in memory")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--workdir', help="directory for the temporary databases (default: a temp dir)")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='vibration_bench_')
+    os.makedirs(workdir, exist_ok=True)
+    report = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'results': [],
+        'coefficient_checks': [],
+    }
+    try:
+        for size in map(parse_size, args.sizes):
+            results, checks = run_size(size, workdir, args)
+            report['results'].extend(results)
+            report['coefficient_checks'].append(checks)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 0 if all(check['ok'] for check in report['coefficient_checks']) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,91 @@
+"""Multi-hole blast simulation: PPV of every hole at every receptor, combined per delay window
+
+Holes are sorted by delay once; for every chunk of receptors the hole ×
+receptor distance and PPV matrices are built by broadcasting, and the
+combination rules reduce them along the hole axis with cumulative sums, so
+every delay window of every receptor is evaluated in one vectorized pass.
+"""
+import numpy as np
+
+import design
+
+# 'max': largest single-hole PPV; holes are assumed to arrive separately.
+# 'window_sum': PPVs of the holes firing within one delay window add up (in phase, worst case).
+# 'window_srss': square root of the sum of squares within one delay window (random phase).
+RULES = ('max', 'window_sum', 'window_srss')
+
+
+def as_points(coordinates):
+    """(n, 3) float array from (n, 2) or (n, 3) coordinates; z defaults to 0"""
+    points = np.atleast_2d(np.asarray(coordinates, dtype=float))
+    if points.shape[1] not in (2, 3):
+        raise ValueError("Coordenadas devem ter 2 (x, y) ou 3 (x, y, z) colunas")
+    return np.pad(points, ((0, 0), (0, 3 - points.shape[1])))
+
+
+def hole_distances(holes, receptors):
+    """Euclidean distance of every hole to every receptor, shape (holes, receptors)"""
+    return np.sqrt(((holes[:, None, :] - receptors[None, :, :]) ** 2).sum(axis=-1))
+
+
+def combine(ppv, delays, rule='max', delay_window=8.0):
+    """Peak PPV per receptor from a (holes sorted by delay) × receptors PPV matrix
+
+    The window rules evaluate every window [t, t + delay_window) starting at a
+    hole's delay t, using cumulative sums along the hole axis. Returns the
+    peak and, per receptor, the row of the peak hole or of the first hole of
+    the peak window.
+    """
+    if rule not in RULES:
+        raise ValueError(f"Regra de superposição desconhecida: {rule}")
+    if rule == 'max':
+        index = np.argmax(ppv, axis=0)
+    else:
+        values = ppv if rule == 'window_sum' else ppv * ppv
+        cumulative = np.concatenate([np.zeros((1, ppv.shape[1])), np.cumsum(values, axis=0)])
+        ends = np.searchsorted(delays, delays + delay_window, side='left')
+        ppv = cumulative[ends] - cumulative[:-1]
+        if rule == 'window_srss':
+            ppv = np.sqrt(np.maximum(ppv, 0.0))
+        index = np.argmax(ppv, axis=0)
+    return ppv[index, np.arange(ppv.shape[1])], index
+
+
+def simulate(models, holes, charges, delays, receptors, rule='max', delay_window=8.0, t=None,
+             chunk_elements=1_000_000):
+    """Peak PPV at every receptor of a multi-hole blast
+
+    models has one design.MODEL_COLUMNS row per receptor (the law of the
+    ground at that receptor). With t (one entry per receptor) every hole uses
+    its one-sided upper prediction bound instead of the mean law. Receptors
+    are processed in chunks so that no hole × receptor matrix exceeds
+    chunk_elements values. Returns (peak, hole, delay) arrays per receptor:
+    hole is the original index of the peak hole (or of the first hole of the
+    peak window) and delay its delay. NaN where the receptor has no model or
+    coincides with a hole.
+    """
+    holes = as_points(holes)
+    receptors = as_points(receptors)
+    charges = np.broadcast_to(np.asarray(charges, dtype=float), len(holes))
+    delays = np.broadcast_to(np.asarray(delays, dtype=float), len(holes))
+    models = np.asarray(models, dtype=float).reshape(len(receptors), len(design.MODEL_COLUMNS))
+
+    order = np.argsort(delays, kind='stable')
+    hole_delays = delays
+    holes, charges, delays = holes[order], charges[order, None], delays[order]
+
+    peak = np.full(len(receptors), np.nan)
+    hole = np.zeros(len(receptors), dtype=np.int64)
+    step = max(1, chunk_elements // max(len(holes), 1))
+    for start in range(0, len(receptors), step):
+        chunk = slice(start, start + step)
+        distances = hole_distances(holes, receptors[chunk])
+        K, alpha, n, mean_x, sxx, sigma2, gamma, beta = models[chunk].T
+        if t is None:
+            ppv = design.ppv(K, alpha, distances, charges, gamma, beta)
+        else:
+            ppv = design.ppv_upper(K, alpha, n, mean_x, sxx, sigma2, np.asarray(t, dtype=float)[chunk],
+                                   distances, charges, gamma, beta)
+        peak[chunk], index = combine(ppv, delays, rule, delay_window)
+        hole[chunk] = order[index]
+    return peak, hole, hole_delays[hole]
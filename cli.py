@@ -0,0 +1,387 @@
+"""Command-line interface for bulk operations on the vibration database
+
+Usage:
+    python cli.py import amostras.csv
+    python cli.py refit --processes 4 --window-days 730
+    python cli.py predict --distance 300 --charge 50 --lithology Granito --variant decayed
+    python cli.py predict --file planejado.csv --output previsto.csv
+    python cli.py max-charge --distance 300 --limit 10 --lithology Granito
+    python cli.py design --distances 50 1000 200 --limits 5 10 20 --output carta.csv
+    python cli.py blast --holes furos.csv --receptors receptores.csv --lithology Granito --rule window_sum
+    python cli.py export amostras.csv --lithology Granito
+    python cli.py receptors --import receptores.csv
+    python cli.py near --x 512300 --y 7801200 --radius 2000 --kind structure
+    python cli.py compact
+    python cli.py screen --threshold 4
+    python cli.py exclude 17 42 --include
+    python cli.py stats
+    python cli.py --snapshot snapshot/ snapshot --export amostras.parquet
+
+Every command prints one JSON object on stdout; log messages go to stderr.
+The exit code is 0 on success and 1 on failure. Only the backend is
+imported (never tkinter), so the CLI runs on headless servers and from cron.
+"""
+import argparse
+import json
+import logging
+import math
+import sys
+
+from backend import MODEL_VARIANTS, OUTLIER_THRESHOLD, RECEPTOR_KINDS, VibrationBackend
+from instrumentation import logger
+
+
+def clean(value):
+    """Make a result JSON-safe: tuples become lists and NaN/inf become null"""
+    if isinstance(value, dict):
+        return {str(key): clean(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [clean(item) for item in value]
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def cmd_import(backend, args):
+    result = backend.import_file(args.file, chunksize=args.chunksize,
+                                 max_rejected_details=args.max_rejected_details,
+                                 outlier_threshold=None if args.no_screening else args.outlier_threshold)
+    ok = not result['missing_columns'] and 'error' not in result
+    return ok, result
+
+
+def cmd_refit(backend, args):
+    report = backend.calculate_k_factor(processes=args.processes, folds=args.folds,
+                                        window_days=args.window_days, window_samples=args.window_samples,
+                                        robust=args.robust)
+    if report is None:
+        return False, {'error': "refit failed"}
+    result = {'drift': report, 'models': backend.get_models(), 'law_scores': backend.get_law_scores()}
+    if args.window_days is not None or args.window_samples is not None:
+        result['window_models'] = backend.get_models('window')
+    if args.robust:
+        result['robust_models'] = backend.get_models('robust')
+    return True, result
+
+
+def cmd_predict(backend, args):
+    if args.file:
+        output_path = backend.predict_file(args.file, args.output)
+        return output_path is not None, {'output': output_path}
+    if args.distance is None or args.charge is None or args.lithology is None:
+        return False, {'error': "--distance, --charge and --lithology are required without --file"}
+    try:
+        ppv = backend.predict_ppv(args.distance, args.charge, args.lithology, args.variant)
+    except ValueError as e:
+        return False, {'error': str(e)}
+    if ppv is None:
+        return False, {'error': f"Sem modelo {args.variant} para a litologia {args.lithology}"}
+    result = {'litologia': args.lithology, 'distancia': args.distance, 'carga_espera': args.charge,
+              'variant': args.variant, 'ppv': ppv}
+    if args.confidence is not None:
+        result['intervals'] = backend.predict_interval(args.distance, args.charge, args.lithology,
+                                                       args.confidence, args.variant)
+    return True, result
+
+
+def cmd_max_charge(backend, args):
+    try:
+        charge = backend.max_charge(args.distance, args.limit, args.lithology, args.confidence)
+    except ValueError as e:
+        return False, {'error': str(e)}
+    if charge is None:
+        return False, {'error': f"Sem dados para a litologia {args.lithology}"}
+    return True, {'litologia': args.lithology, 'distancia': args.distance, 'vibracao_limite': args.limit,
+                  'confidence': args.confidence, 'carga_maxima': charge}
+
+
+def cmd_design(backend, args):
+    import numpy as np
+    import design
+
+    start, stop, count = args.distances
+    grid = backend.design_grid(np.linspace(start, stop, int(count)), charges=args.charges,
+                               ppv_limits=args.limits, lithologies=args.lithology, confidence=args.confidence)
+    if grid is None:
+        return False, {'error': "design grid failed"}
+    design.export_grid(grid, args.output)
+    return True, {'output': args.output, 'quantity': grid['quantity'], 'confidence': args.confidence,
+                  'shape': list(grid['values'].shape), 'litologia': grid['litologia']}
+
+
+def cmd_blast(backend, args):
+    import numpy as np
+    import pandas as pd
+    import blast
+    from backend import read_table
+
+    if args.rule not in blast.RULES:
+        return False, {'error': f"--rule must be one of {', '.join(blast.RULES)}"}
+
+    holes = read_table(args.holes)
+    if args.receptors:
+        receptors = read_table(args.receptors)
+    elif args.radius is not None:
+        # Stored receptors within the radius of the centre of the pattern
+        centre = holes[[axis for axis in ('x', 'y', 'z') if axis in holes.columns]].mean()
+        receptors = pd.DataFrame(backend.receptors_near(*centre.tolist(), radius=args.radius) or [],
+                                 columns=['nome', 'kind', 'x', 'y', 'z', 'litologia', 'ppv_limit', 'distancia'])
+    else:
+        receptors = pd.DataFrame(backend.get_receptors(), columns=['nome', 'kind', 'x', 'y', 'z', 'litologia',
+                                                                   'ppv_limit'])
+    axes = [axis for axis in ('x', 'y', 'z') if axis in holes.columns and axis in receptors.columns]
+    if axes[:2] != ['x', 'y']:
+        return False, {'error': "holes and receptors need x and y columns (z optional)"}
+    delay_column = 'retardo' if 'retardo' in holes.columns else 'delay'
+    if 'carga_espera' not in holes.columns or delay_column not in holes.columns:
+        return False, {'error': "holes need carga_espera and retardo (ms) columns"}
+    if 'litologia' in receptors.columns and (args.lithology is None or receptors['litologia'].notna().all()):
+        lithologies = receptors['litologia'].astype(str).to_numpy()
+    elif 'litologia' in receptors.columns:
+        lithologies = receptors['litologia'].fillna(args.lithology).astype(str).to_numpy()
+    elif args.lithology is not None:
+        lithologies = args.lithology
+    else:
+        return False, {'error': "--lithology is required when the receptors have no litologia column"}
+
+    result = backend.simulate_blast(holes[axes].to_numpy(), holes['carga_espera'].to_numpy(),
+                                    holes[delay_column].to_numpy(), receptors[axes].to_numpy(), lithologies,
+                                    args.rule, args.window, args.confidence, args.variant)
+    if result is None:
+        return False, {'error': "blast simulation failed"}
+    receptors['ppv_pico'] = result['ppv']
+    receptors['furo'] = np.where(np.isfinite(result['ppv']), result['hole'], -1)
+    receptors['retardo'] = np.where(np.isfinite(result['ppv']), result['delay'], np.nan)
+    summary = {'holes': len(holes), 'receptors': len(receptors), 'rule': args.rule, 'delay_window': args.window,
+               'confidence': args.confidence, 'variant': args.variant,
+               'max_ppv': float(np.nanmax(result['ppv'])) if np.isfinite(result['ppv']).any() else None}
+    if args.output:
+        if args.output.lower().endswith(('.xlsx', '.xls')):
+            receptors.to_excel(args.output, index=False)
+        else:
+            receptors.to_csv(args.output, index=False)
+        summary['output'] = args.output
+    else:
+        summary['ppv'] = result['ppv'].tolist()
+    return True, summary
+
+
+def cmd_receptors(backend, args):
+    from backend import read_table
+
+    result = {}
+    if args.import_file:
+        saved = backend.save_receptors(read_table(args.import_file))
+        if saved is None:
+            return False, {'error': "receptor import failed"}
+        result['saved'] = saved
+    if args.delete:
+        deleted = backend.delete_receptors(args.delete)
+        if deleted is None:
+            return False, {'error': "receptor deletion failed"}
+        result['deleted'] = deleted
+    result['receptors'] = backend.get_receptors(args.kind)
+    return True, result
+
+
+def cmd_near(backend, args):
+    if args.radius is None and args.nearest is None:
+        return False, {'error': "--radius and/or --nearest is required"}
+    found = backend.receptors_near(args.x, args.y, args.z, args.radius, args.nearest, args.kind)
+    if found is None:
+        return False, {'error': "receptor search failed"}
+    return True, {'x': args.x, 'y': args.y, 'z': args.z, 'radius': args.radius, 'nearest': args.nearest,
+                  'receptors': found}
+
+
+def cmd_export(backend, args):
+    written = backend.export_data(args.output, lithology=args.lithology, chunksize=args.chunksize)
+    return written is not None, {'output': args.output, 'rows': written}
+
+
+def cmd_snapshot(backend, args):
+    snapshot = backend.refresh_snapshot()
+    if snapshot is None:
+        return False, {'error': "snapshot failed (is --snapshot set?)"}
+    result = {'directory': snapshot.directory, 'rows': snapshot.rows, 'last_id': snapshot.meta['last_id'],
+              'data_version': snapshot.meta['data_version'], 'litologia': snapshot.lithologies}
+    if args.export:
+        result['output'] = snapshot.export(args.export)
+    return True, result
+
+
+def cmd_compact(backend, args):
+    result = backend.compact_duplicates()
+    if result is None:
+        return False, {'error': "compaction failed"}
+    return True, result
+
+
+def cmd_screen(backend, args):
+    flagged = backend.screen_outliers(args.threshold)
+    if flagged is None:
+        return False, {'error': "screening failed"}
+    return True, {'threshold': args.threshold, 'excluded': flagged, 'robust_models': backend.get_models('robust')}
+
+
+def cmd_exclude(backend, args):
+    changed = backend.set_excluded(args.ids, not args.include)
+    if changed is None:
+        return False, {'error': "update failed"}
+    return True, {'changed': changed, 'excluded': not args.include}
+
+
+def cmd_stats(backend, args):
+    samples = backend.count_samples()
+    return True, {
+        'data_version': backend.get_data_version(),
+        'samples': sum(samples.values()),
+        'samples_per_lithology': samples,
+        'excluded_samples': len(backend.get_excluded_samples()),
+        'models': backend.get_models(),
+        'variant_models': {variant: backend.get_models(variant) for variant in MODEL_VARIANTS[1:]},
+        'decay_half_life_days': backend.decay_half_life(),
+        'receptors': {kind: len(backend.get_receptors(kind)) for kind in RECEPTOR_KINDS},
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Bulk operations on the vibration database")
+    parser.add_argument('--db', default='vibration_data.db', help="SQLite database file")
+    parser.add_argument('--verbose', '-v', action='store_true', help="log progress to stderr")
+    parser.add_argument('--metrics', action='store_true', help="include backend metrics in the output")
+    parser.add_argument('--snapshot', metavar='DIR',
+                        help="columnar snapshot directory used by refit instead of reading SQLite")
+    parser.add_argument('--half-life', type=float, metavar='DAYS',
+                        help="half-life of the decayed models (stored; changing it rebuilds the decayed sums)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('import', help="import samples from a CSV/Excel file")
+    command.add_argument('file')
+    command.add_argument('--chunksize', type=int, default=50000, help="rows per transaction")
+    command.add_argument('--max-rejected-details', type=int, default=1000)
+    command.add_argument('--outlier-threshold', type=float, default=OUTLIER_THRESHOLD,
+                         help="flag rows whose log residual exceeds this many standard deviations")
+    command.add_argument('--no-screening', action='store_true', help="import every valid row as included")
+    command.set_defaults(handler=cmd_import)
+
+    command = commands.add_parser('refit', help="refit every lithology from the stored samples")
+    command.add_argument('--processes', type=int, help="worker processes for very large datasets")
+    command.add_argument('--folds', type=int, default=5,
+                         help="cross-validation folds for the attenuation law selection (0 keeps the current laws)")
+    window = command.add_mutually_exclusive_group()
+    window.add_argument('--window-days', type=float, help="also fit the window variant on the samples of the last N days")
+    window.add_argument('--window-samples', type=int,
+                        help="also fit the window variant on the latest N samples of each lithology")
+    command.add_argument('--robust', action='store_true', help="also fit the robust (Huber) variant")
+    command.set_defaults(handler=cmd_refit)
+
+    command = commands.add_parser('predict', help="predict one blast or score a file of planned blasts")
+    command.add_argument('--distance', type=float)
+    command.add_argument('--charge', type=float)
+    command.add_argument('--lithology')
+    command.add_argument('--file', help="CSV/Excel file with distancia, carga_espera and litologia columns")
+    command.add_argument('--output', help="output file (default: <file>_previsao.<ext>)")
+    command.add_argument('--confidence', type=float, help="also report confidence/prediction intervals at this level, e.g. 0.95")
+    command.add_argument('--variant', choices=MODEL_VARIANTS, default='all',
+                         help="model fitted on every sample, on the last window or with decayed weights")
+    command.set_defaults(handler=cmd_predict)
+
+    command = commands.add_parser('max-charge', help="largest charge per delay under a PPV limit")
+    command.add_argument('--distance', type=float, required=True)
+    command.add_argument('--limit', type=float, required=True, help="PPV limit in mm/s")
+    command.add_argument('--lithology', required=True)
+    command.add_argument('--confidence', type=float, help="design against the one-sided upper prediction bound at this level")
+    command.set_defaults(handler=cmd_max_charge)
+
+    command = commands.add_parser('design', help="PPV or allowable charge over a distance grid")
+    command.add_argument('--distances', type=float, nargs=3, required=True, metavar=('START', 'STOP', 'COUNT'))
+    values = command.add_mutually_exclusive_group(required=True)
+    values.add_argument('--charges', type=float, nargs='+', help="charges per delay (kg): PPV chart")
+    values.add_argument('--limits', type=float, nargs='+', help="PPV limits (mm/s): allowable charge chart")
+    command.add_argument('--lithology', action='append', help="repeat for several (default: every model)")
+    command.add_argument('--output', required=True, help=".csv/.xlsx table or .npz arrays")
+    command.add_argument('--confidence', type=float, help="use the one-sided upper prediction bound at this level")
+    command.set_defaults(handler=cmd_design)
+
+    command = commands.add_parser('blast', help="peak PPV at many receptors from a multi-hole blast")
+    command.add_argument('--holes', required=True, help="CSV/Excel with x, y, [z], carga_espera and retardo (ms)")
+    command.add_argument('--receptors', help="CSV/Excel with x, y, [z] and optionally litologia "
+                                             "(default: the stored receptors)")
+    command.add_argument('--radius', type=float,
+                         help="without --receptors, only the stored receptors within this distance (m) of the pattern")
+    command.add_argument('--lithology', help="ground of every receptor without a litologia")
+    command.add_argument('--rule', default='max',
+                         help="max (single hole), window_sum (in phase) or window_srss of the holes within one delay window")
+    command.add_argument('--window', type=float, default=8.0, help="delay window in ms for the window rules")
+    command.add_argument('--confidence', type=float, help="use the one-sided upper prediction bound at this level")
+    command.add_argument('--variant', choices=MODEL_VARIANTS, default='all')
+    command.add_argument('--output', help="receptors with ppv_pico, furo and retardo (.csv/.xlsx)")
+    command.set_defaults(handler=cmd_blast)
+
+    command = commands.add_parser('receptors', help="import, delete and list monitoring stations and structures")
+    command.add_argument('--import', dest='import_file', metavar='FILE',
+                         help="CSV/Excel with nome, x, y and optionally z, kind, litologia and ppv_limit")
+    command.add_argument('--delete', nargs='+', metavar='NAME')
+    command.add_argument('--kind', choices=RECEPTOR_KINDS, help="list only stations or structures")
+    command.set_defaults(handler=cmd_receptors)
+
+    command = commands.add_parser('near', help="receptors within a radius of a blast and/or the nearest ones")
+    command.add_argument('--x', type=float, required=True)
+    command.add_argument('--y', type=float, required=True)
+    command.add_argument('--z', type=float, default=0.0)
+    command.add_argument('--radius', type=float, help="search radius in metres")
+    command.add_argument('--nearest', type=int, help="number of nearest receptors")
+    command.add_argument('--kind', choices=RECEPTOR_KINDS)
+    command.set_defaults(handler=cmd_near)
+
+    command = commands.add_parser('export', help="export the stored samples to CSV/Excel")
+    command.add_argument('output')
+    command.add_argument('--lithology')
+    command.add_argument('--chunksize', type=int, default=50000)
+    command.set_defaults(handler=cmd_export)
+
+    command = commands.add_parser('snapshot', help="update the columnar snapshot (requires --snapshot)")
+    command.add_argument('--export', help="also write it to .parquet (needs pyarrow) or .npz")
+    command.set_defaults(handler=cmd_snapshot)
+
+    command = commands.add_parser('compact', help="key samples stored before deduplication and remove duplicates")
+    command.set_defaults(handler=cmd_compact)
+
+    command = commands.add_parser('screen', help="refit the robust models and exclude the stored outliers")
+    command.add_argument('--threshold', type=float, default=OUTLIER_THRESHOLD,
+                         help="robust standard deviations of log10(PPV) beyond which a sample is excluded")
+    command.set_defaults(handler=cmd_screen)
+
+    command = commands.add_parser('exclude', help="exclude samples from the fits by id (kept in the database)")
+    command.add_argument('ids', type=int, nargs='+')
+    command.add_argument('--include', action='store_true', help="include the samples again")
+    command.set_defaults(handler=cmd_exclude)
+
+    command = commands.add_parser('stats', help="sample counts and fitted models")
+    command.set_defaults(handler=cmd_stats)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(message)s", stream=sys.stderr)
+
+    backend = VibrationBackend(args.db, snapshot_dir=args.snapshot, half_life_days=args.half_life)
+    try:
+        ok, result = args.handler(backend, args)
+    except Exception as e:
+        logger.error(f"❌ {args.command} failed: {e}")
+        ok, result = False, {'error': str(e)}
+    if args.metrics:
+        result['metrics'] = backend.get_metrics()
+    backend.close()
+
+    json.dump(clean(result), sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write('\n')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
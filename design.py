@@ -0,0 +1,151 @@
+import numpy as np
+
+
+# Columns of the model rows built by VibrationBackend.model_arrays; gamma and
+# beta are the exponents of the law's scaled distance D^gamma / Q^beta
+MODEL_COLUMNS = ('k', 'alpha', 'n', 'mean_x', 'sxx', 'sigma2', 'gamma', 'beta')
+
+
+def log_scaled_distance(distances, charges, gamma=1.0, beta=0.5):
+    """x = log10(D^gamma / Q^beta); NaN where the inputs are not positive"""
+    distances = np.asarray(distances, dtype=float)
+    charges = np.asarray(charges, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = gamma * np.log10(distances) - beta * np.log10(charges)
+    return np.where((distances > 0) & (charges > 0), x, np.nan)
+
+
+def charge_for(distances, x, gamma=1.0, beta=0.5):
+    """Charge per delay Q giving log10(D^gamma / Q^beta) = x"""
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        return (np.asarray(distances, dtype=float) ** gamma / 10 ** x) ** (1 / beta)
+
+
+def max_charge(K, alpha, distances, ppv_limits, gamma=1.0, beta=0.5):
+    """Largest charge per delay keeping V = K / (D^gamma/Q^beta)^alpha at or below the limit
+
+    Inverts the site law: D^gamma/Q^beta = (K/V)^(1/alpha); for the square-root
+    law Q = (D / (K/V)^(1/alpha))². Inputs broadcast against each other; NaN
+    where the inputs are not positive.
+    """
+    K, alpha, distances, ppv_limits, gamma, beta = np.broadcast_arrays(
+        *(np.asarray(value, dtype=float) for value in (K, alpha, distances, ppv_limits, gamma, beta)))
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        charges = charge_for(distances, np.log10(K / ppv_limits) / alpha, gamma, beta)
+    return np.where((distances > 0) & (ppv_limits > 0) & (K > 0) & (alpha > 0), charges, np.nan)
+
+
+def ppv(K, alpha, distances, charges, gamma=1.0, beta=0.5):
+    """V = K / (D^gamma/Q^beta)^alpha with broadcasting; NaN where the inputs are not positive"""
+    with np.errstate(over='ignore'):
+        return np.asarray(K, dtype=float) * 10 ** (-np.asarray(alpha, dtype=float) *
+                                                   log_scaled_distance(distances, charges, gamma, beta))
+
+
+def log_half_width(n, mean_x, sxx, sigma2, t, x, prediction=True):
+    """t times the standard error of log10(PPV) at x = log10(D^gamma/Q^beta) of the selected law
+
+    prediction=False gives the half-width for the mean response (confidence
+    interval), prediction=True the one for a new blast (prediction interval).
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        leverage = np.where(sxx > 1e-12, (x - mean_x) ** 2 / sxx, 0.0)
+        return t * np.sqrt(sigma2 * (float(prediction) + 1 / n + leverage))
+
+
+def ppv_upper(K, alpha, n, mean_x, sxx, sigma2, t, distances, charges, gamma=1.0, beta=0.5):
+    """Upper prediction bound of V at t (one-sided), with broadcasting"""
+    x = log_scaled_distance(distances, charges, gamma, beta)
+    return ppv(K, alpha, distances, charges, gamma, beta) * 10 ** log_half_width(n, mean_x, sxx, sigma2, t, x)
+
+
+def max_charge_upper(K, alpha, n, mean_x, sxx, sigma2, t, distances, ppv_limits, gamma=1.0, beta=0.5):
+    """Largest charge per delay whose upper prediction bound stays at or below the limit
+
+    With x = log10(D^gamma/Q^beta) and u = x - mean_x, the bound reaches the limit L when
+    log10(K) - alpha·x + T·√(1 + 1/n + u²/Sxx) = log10(L), T = t·σ. Squaring
+    gives a quadratic in u; its smallest root that satisfies the unsquared
+    equation is the largest charge. 0 where no charge keeps the bound under
+    the limit, NaN where the inputs or the model are unusable.
+    """
+    K, alpha, n, mean_x, sxx, sigma2, t, distances, ppv_limits, gamma, beta = np.broadcast_arrays(
+        *(np.asarray(value, dtype=float)
+          for value in (K, alpha, n, mean_x, sxx, sigma2, t, distances, ppv_limits, gamma, beta)))
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        T2 = t * t * sigma2
+        inv_sxx = np.where(sxx > 1e-12, 1 / sxx, 0.0)
+        r0 = np.log10(ppv_limits) - np.log10(K) + alpha * mean_x
+        a2 = alpha * alpha - T2 * inv_sxx
+        a1 = 2 * r0 * alpha
+        a0 = r0 * r0 - T2 * (1 + 1 / n)
+        root = np.sqrt(a1 * a1 - 4 * a2 * a0)
+        linear = np.abs(a2) < 1e-12
+        u1 = np.where(linear, -a0 / a1, (-a1 - root) / (2 * a2))
+        u2 = np.where(linear, np.nan, (-a1 + root) / (2 * a2))
+        # Squaring adds roots where log10(L) - mean line is negative
+        u1 = np.where(r0 + alpha * u1 >= -1e-12, u1, np.nan)
+        u2 = np.where(r0 + alpha * u2 >= -1e-12, u2, np.nan)
+        u = np.fmin(u1, u2)
+        charges = charge_for(distances, mean_x + u, gamma, beta)
+    usable = (distances > 0) & (ppv_limits > 0) & (K > 0) & (alpha > 0) & np.isfinite(sigma2) & np.isfinite(t)
+    return np.where(usable, np.where(np.isnan(u), 0.0, charges), np.nan)
+
+
+def evaluate_grid(models, distances, values, quantity='ppv', t=None):
+    """Evaluate one law per lithology over a lithology × distance × value mesh in one pass
+
+    models has one MODEL_COLUMNS row per lithology. values are
+    charges per delay for quantity='ppv' and PPV limits for quantity='max_charge'.
+    With t (one entry per lithology) the upper prediction bound is used instead
+    of the mean law. Returns an array of shape (len(models), len(distances), len(values)).
+    """
+    columns = [column[:, None, None]
+               for column in np.asarray(models, dtype=float).reshape(-1, len(MODEL_COLUMNS)).T]
+    K, alpha, n, mean_x, sxx, sigma2, gamma, beta = columns
+    distances = np.asarray(distances, dtype=float)[None, :, None]
+    values = np.asarray(values, dtype=float)[None, None, :]
+    if t is not None:
+        t = np.asarray(t, dtype=float)[:, None, None]
+    if quantity == 'ppv':
+        if t is None:
+            return ppv(K, alpha, distances, values, gamma, beta)
+        return ppv_upper(K, alpha, n, mean_x, sxx, sigma2, t, distances, values, gamma, beta)
+    if quantity == 'max_charge':
+        if t is None:
+            return max_charge(K, alpha, distances, values, gamma, beta)
+        return max_charge_upper(K, alpha, n, mean_x, sxx, sigma2, t, distances, values, gamma, beta)
+    raise ValueError(f"Unknown grid quantity: {quantity}")
+
+
+def grid_table(grid):
+    """Long table (one row per mesh point) of a grid returned by VibrationBackend.design_grid"""
+    import pandas as pd
+
+    values = grid['values']
+    value_axis = 'carga_espera' if grid['quantity'] == 'ppv' else 'vibracao_limite'
+    lithology, distance, value = np.meshgrid(
+        np.arange(values.shape[0]), np.arange(values.shape[1]), np.arange(values.shape[2]), indexing='ij')
+    return pd.DataFrame({
+        'litologia': np.asarray(grid['litologia'], dtype=object)[lithology.ravel()],
+        'distancia': np.asarray(grid['distancia'])[distance.ravel()],
+        value_axis: np.asarray(grid[value_axis])[value.ravel()],
+        grid['quantity']: values.ravel(),
+    })
+
+
+def export_grid(grid, output_path):
+    """Write a grid as arrays (.npz) or as a long table (.csv/.xlsx)"""
+    if output_path.lower().endswith('.npz'):
+        value_axis = 'carga_espera' if grid['quantity'] == 'ppv' else 'vibracao_limite'
+        np.savez_compressed(output_path,
+                            values=grid['values'],
+                            litologia=np.asarray(grid['litologia'], dtype=str),
+                            distancia=np.asarray(grid['distancia'], dtype=float),
+                            **{value_axis: np.asarray(grid[value_axis], dtype=float)},
+                            quantity=np.asarray(grid['quantity']),
+                            confidence=np.asarray(np.nan if grid.get('confidence') is None else grid['confidence']))
+    elif output_path.lower().endswith(('.xlsx', '.xls')):
+        grid_table(grid).to_excel(output_path, index=False)
+    else:
+        grid_table(grid).to_csv(output_path, index=False)
+    return output_path
@@ -0,0 +1,178 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Regression terms summed per group: n, Σx, Σy, Σx², Σxy, Σy²
+N_TERMS = 6
+
+
+def segment_sums(x, y, starts, weights=None):
+    """Sums of the (optionally weighted) regression terms over the segments of sorted
+    arrays beginning at starts"""
+    w = np.ones_like(x) if weights is None else weights
+    terms = np.stack([w, w * x, w * y, w * x * x, w * x * y, w * y * y])
+    return np.add.reduceat(terms, starts, axis=1).T
+
+
+def grouped_sums(codes, x, y, n_groups, processes=None, weights=None):
+    """Per-group sums of the regression terms, shape (n_groups, 6)
+
+    Rows are sorted by group code once and every group is reduced with a
+    single np.add.reduceat. With processes > 1 the sorted rows are split at
+    group boundaries into contiguous partitions of similar size that are
+    reduced in a process pool. With weights every term is multiplied by the
+    row's weight, so n becomes the sum of the weights.
+    """
+    sums = np.zeros((n_groups, N_TERMS))
+    if len(codes) == 0:
+        return sums
+
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+    x = x[order]
+    y = y[order]
+    if weights is not None:
+        weights = weights[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+
+    if processes is None or processes <= 1 or len(starts) < 2:
+        sums[codes[starts]] = segment_sums(x, y, starts, weights)
+        return sums
+
+    # Cut at the group starts closest to equal row counts
+    targets = np.linspace(0, len(codes), processes + 1)[1:-1]
+    cuts = np.unique(starts[np.clip(np.searchsorted(starts, targets), 0, len(starts) - 1)])
+    bounds = [0] + [int(cut) for cut in cuts if cut > 0] + [len(codes)]
+    partitions = []
+    for begin, end in zip(bounds[:-1], bounds[1:]):
+        local = starts[(starts >= begin) & (starts < end)]
+        partitions.append((x[begin:end], y[begin:end], local - begin,
+                           None if weights is None else weights[begin:end]))
+
+    with ProcessPoolExecutor(min(processes, len(partitions))) as pool:
+        results = list(pool.map(segment_sums, *zip(*partitions)))
+    sums[codes[starts]] = np.concatenate(results)
+    return sums
+
+
+def fit_sums(sums):
+    """Vectorized closed-form fit of log10(PPV) = log10(K) - alpha * x for every row of sums
+
+    Returns arrays (k, alpha, r2); r2 is NaN where it is undefined and every
+    value is NaN for groups without samples.
+    """
+    sums = np.asarray(sums, dtype=float)
+    n, sum_x, sum_y, sum_xx, sum_xy, sum_yy = sums.T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sxx = sum_xx - sum_x * sum_x / n
+        sxy = sum_xy - sum_x * sum_y / n
+        syy = sum_yy - sum_y * sum_y / n
+        # Same conventions as backend.fit_from_sums; tests/test_fitting.py pins the two together
+        slope = np.where(sxx > 1e-12, sxy / sxx, 0.0)
+        intercept = (sum_y - slope * sum_x) / n
+        r2 = np.where((n > 1) & (syy > 1e-12), 1 - (syy - slope * sxy) / syy, np.nan)
+    k = np.where(n > 0, 10 ** intercept, np.nan)
+    alpha = np.where(n > 0, -slope, np.nan)
+    return k, alpha, r2
+
+
+def fit_statistics(sums):
+    """Vectorized mean of x, Sxx and residual variance for every row of sums
+
+    The residual variance has n - 2 degrees of freedom (n - 1 where the fit is
+    flat) and is NaN where there are too few samples.
+    """
+    sums = np.asarray(sums, dtype=float)
+    n, sum_x, sum_y, sum_xx, sum_xy, sum_yy = sums.T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sxx = sum_xx - sum_x * sum_x / n
+        sxy = sum_xy - sum_x * sum_y / n
+        syy = sum_yy - sum_y * sum_y / n
+        flat = ~(sxx > 1e-12)
+        slope = np.where(flat, 0.0, sxy / sxx)
+        dof = np.where(flat, n - 1, n - 2)
+        sigma2 = np.where(dof > 0, np.maximum(syy - slope * sxy, 0.0) / dof, np.nan)
+        mean_x = sum_x / n
+    return mean_x, sxx, sigma2
+
+
+def fold_ids(codes, folds, seed=0):
+    """Random fold of every row, balanced within each group"""
+    rng = np.random.default_rng(seed)
+    order = np.lexsort((rng.random(len(codes)), codes))
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    position = np.arange(len(codes)) - np.repeat(starts, np.diff(np.r_[starts, len(codes)]))
+    ids = np.empty(len(codes), dtype=np.int64)
+    ids[order] = position % folds
+    return ids
+
+
+def cross_validated_rmse(codes, x, y, n_groups, fold, folds, processes=None):
+    """k-fold cross-validated RMSE of log10(PPV) for every group at once
+
+    One grouped reduction gives the sums of every (group, fold) cell. The
+    training sums of a fold are the group total minus the fold, so every
+    fold of every group is fitted in one vectorized fit_sums call, and the
+    held-out squared error is expanded from the fold sums:
+    Σ(y - a - b·x)² = Syy - 2a·Sy - 2b·Sxy + n·a² + 2ab·Sx + b²·Sxx.
+    NaN for groups with a fold whose training part has fewer than 3 samples.
+    """
+    sums = grouped_sums(codes * folds + fold, x, y, n_groups * folds, processes)
+    sums = sums.reshape(n_groups, folds, N_TERMS)
+    train = sums.sum(axis=1, keepdims=True) - sums
+    k, alpha, _ = fit_sums(train.reshape(-1, N_TERMS))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a = np.log10(k).reshape(n_groups, folds)
+    b = -alpha.reshape(n_groups, folds)
+    n, sum_x, sum_y, sum_xx, sum_xy, sum_yy = np.moveaxis(sums, -1, 0)
+    sse = sum_yy - 2 * a * sum_y - 2 * b * sum_xy + n * a * a + 2 * a * b * sum_x + b * b * sum_xx
+
+    scored = (n == 0) | (train[..., 0] >= 3)
+    total = n.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rmse = np.sqrt(np.maximum(np.where(n > 0, sse, 0.0).sum(axis=1), 0.0) / total)
+    return np.where(scored.all(axis=1) & (total > 0), rmse, np.nan)
+
+
+def group_medians(codes, values, n_groups):
+    """Median of values within every group, NaN for empty groups"""
+    order = np.lexsort((values, codes))
+    values = values[order]
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.r_[0, np.cumsum(counts)[:-1]]
+    medians = np.full(n_groups, np.nan)
+    present = counts > 0
+    lower = (starts + (counts - 1) // 2)[present]
+    upper = (starts + counts // 2)[present]
+    medians[present] = (values[lower] + values[upper]) / 2
+    return medians
+
+
+def huber_fit(codes, x, y, n_groups, c=1.345, max_iter=50, tol=1e-9):
+    """Huber M-estimate of log10(PPV) = log10(K) - alpha * x for every group at once by IRLS
+
+    Starts from the least-squares fit. Every iteration computes the residual
+    scale of each group as median|r| / 0.6745, weights the rows by
+    min(1, c / |r/scale|) and refits all groups with one weighted grouped_sums
+    call, until K and alpha stop changing. Returns arrays (k, alpha, scale)
+    per group and the final weight of every row.
+    """
+    k, alpha, _ = fit_sums(grouped_sums(codes, x, y, n_groups))
+    weights = np.ones(len(x))
+    for _ in range(max_iter):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            residuals = y - np.log10(k)[codes] + alpha[codes] * x
+            scale = group_medians(codes, np.abs(residuals), n_groups) / 0.6745
+            u = np.abs(residuals) / scale[codes]
+        weights = np.where(u > c, c / u, 1.0)
+        new_k, new_alpha, _ = fit_sums(grouped_sums(codes, x, y, n_groups, weights=weights))
+        with np.errstate(invalid='ignore'):
+            change = np.nanmax(np.abs(np.r_[np.log10(new_k) - np.log10(k), new_alpha - alpha]), initial=0.0)
+        k, alpha = new_k, new_alpha
+        if change < tol:
+            break
+    with np.errstate(divide='ignore', invalid='ignore'):
+        residuals = y - np.log10(k)[codes] + alpha[codes] * x
+    scale = group_medians(codes, np.abs(residuals), n_groups) / 0.6745
+    return k, alpha, scale, weights
@@ -0,0 +1,194 @@
+import functools
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger('vibration')
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'),
+)
+
+# Per-thread accumulators fed by TimedCursor and read by @instrumented
+_state = threading.local()
+
+
+def _counters():
+    if not hasattr(_state, 'sqlite_seconds'):
+        _state.sqlite_seconds = 0.0
+        _state.rows = 0
+        _state.errors = 0
+    return _state
+
+
+def log_error(message):
+    """Log an error handled inside a backend method and count it for the running operation"""
+    _counters().errors += 1
+    logger.error(message)
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that adds its SQLite time and row counts to the per-thread counters"""
+
+    def execute(self, *args):
+        state = _counters()
+        start = time.perf_counter()
+        try:
+            return super().execute(*args)
+        finally:
+            state.sqlite_seconds += time.perf_counter() - start
+            state.rows += max(self.rowcount, 0)
+
+    def executemany(self, *args):
+        state = _counters()
+        start = time.perf_counter()
+        try:
+            return super().executemany(*args)
+        finally:
+            state.sqlite_seconds += time.perf_counter() - start
+            state.rows += max(self.rowcount, 0)
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone, single=True)
+
+    def fetchmany(self, *args):
+        return self._timed_fetch(lambda: super(TimedCursor, self).fetchmany(*args))
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+    def _timed_fetch(self, fetch, single=False):
+        state = _counters()
+        start = time.perf_counter()
+        try:
+            result = fetch()
+        finally:
+            state.sqlite_seconds += time.perf_counter() - start
+        state.rows += (result is not None) if single else len(result)
+        return result
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose shortcut execute methods go through TimedCursor"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+
+class Metrics:
+    """Latency histograms, SQLite vs Python time, row counts and errors per operation
+
+    When jsonl_path is given every recorded call is also appended to that file
+    as one JSON object per line.
+    """
+
+    def __init__(self, jsonl_path=None):
+        self.jsonl_path = jsonl_path
+        self._operations = {}
+        self._lock = threading.Lock()
+        self._jsonl = open(jsonl_path, 'a', buffering=1) if jsonl_path else None
+
+    def record(self, operation, seconds, sqlite_seconds, rows, errors):
+        with self._lock:
+            stats = self._operations.get(operation)
+            if stats is None:
+                stats = self._operations[operation] = {
+                    'count': 0,
+                    'errors': 0,
+                    'rows': 0,
+                    'seconds': 0.0,
+                    'sqlite_seconds': 0.0,
+                    'max_seconds': 0.0,
+                    'histogram': [0] * len(LATENCY_BUCKETS),
+                }
+            stats['count'] += 1
+            stats['errors'] += errors
+            stats['rows'] += rows
+            stats['seconds'] += seconds
+            stats['sqlite_seconds'] += sqlite_seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    stats['histogram'][i] += 1
+                    break
+            if self._jsonl is not None:
+                self._jsonl.write(json.dumps({
+                    'ts': time.time(),
+                    'op': operation,
+                    'seconds': seconds,
+                    'sqlite_seconds': sqlite_seconds,
+                    'python_seconds': seconds - sqlite_seconds,
+                    'rows': rows,
+                    'errors': errors,
+                }) + '\n')
+
+    def snapshot(self):
+        """Return a copy of the metrics with means and bucket-based percentiles"""
+        with self._lock:
+            snapshot = {}
+            for operation, stats in self._operations.items():
+                entry = dict(stats, histogram=dict(zip(map(str, LATENCY_BUCKETS), stats['histogram'])))
+                entry['python_seconds'] = stats['seconds'] - stats['sqlite_seconds']
+                entry['mean_seconds'] = stats['seconds'] / stats['count']
+                for name, quantile in (('p50_seconds', 0.5), ('p95_seconds', 0.95), ('p99_seconds', 0.99)):
+                    entry[name] = self._percentile(stats['histogram'], stats['count'], quantile)
+                snapshot[operation] = entry
+            return snapshot
+
+    @staticmethod
+    def _percentile(histogram, count, quantile):
+        """Upper bound of the bucket holding the given quantile"""
+        seen = 0
+        for bound, bucket in zip(LATENCY_BUCKETS, histogram):
+            seen += bucket
+            if seen >= quantile * count:
+                return bound
+        return LATENCY_BUCKETS[-1]
+
+    def reset(self):
+        with self._lock:
+            self._operations.clear()
+
+    def close(self):
+        if self._jsonl is not None:
+            self._jsonl.close()
+            self._jsonl = None
+
+
+def instrumented(method):
+    """Record latency, SQLite time, rows touched and handled errors of a backend method
+
+    Nested instrumented calls are recorded on their own and also count towards
+    the enclosing operation.
+    """
+    operation = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        state = _counters()
+        sqlite_start, rows_start, errors_start = state.sqlite_seconds, state.rows, state.errors
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        except Exception:
+            state.errors += 1
+            raise
+        finally:
+            self.metrics.record(operation,
+                                time.perf_counter() - start,
+                                state.sqlite_seconds - sqlite_start,
+                                state.rows - rows_start,
+                                state.errors - errors_start)
+
+    return wrapper
@@ -1,7 +1,92 @@
+import time
+STARTUP_T0 = time.perf_counter()  # before any other import, for the startup-time measurement
+
+import json
+import logging
+import queue
+import sys
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from backend import VibrationBackend
-import pandas as pd
+from backend import DUPLICATE, VibrationBackend, preload_modules
+from instrumentation import logger
+
+class BackgroundTask:
+    """Handle passed to a background job to report progress and check for cancellation"""
+    def __init__(self, runner, callbacks):
+        self.runner = runner
+        self.callbacks = callbacks
+        self.cancel_event = threading.Event()
+    
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+    
+    def cancel(self):
+        """Ask the job to stop at its next checkpoint"""
+        self.cancel_event.set()
+    
+    def progress(self, *args):
+        """Report progress; delivered to on_progress on the Tk main thread"""
+        self.runner.results.put((self, 'progress', args))
+
+class TaskRunner:
+    """Run long jobs on a worker thread and deliver their results on the Tk main thread"""
+    def __init__(self, root, poll_interval=100):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        
+        # A single worker keeps database writes serialized
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+        self.root.after(self.poll_interval, self.poll)
+    
+    def submit(self, job, on_done=None, on_progress=None, on_error=None, on_cancelled=None):
+        """Queue job(task) for the worker thread and return its BackgroundTask
+
+        on_cancelled() runs instead of on_done when the task is cancelled before it starts.
+        """
+        task = BackgroundTask(self, {'done': on_done, 'progress': on_progress, 'error': on_error,
+                                     'cancelled': on_cancelled})
+        self.jobs.put((task, job))
+        return task
+    
+    def run(self):
+        """Worker loop: never touches Tk, only the result queue"""
+        while True:
+            item = self.jobs.get()
+            if item is None:
+                break
+            task, job = item
+            if task.cancelled:
+                self.results.put((task, 'cancelled', ()))
+                continue
+            try:
+                self.results.put((task, 'done', (job(task),)))
+            except Exception as e:
+                self.results.put((task, 'error', (e,)))
+    
+    def poll(self):
+        """Dispatch finished jobs and progress reports, then reschedule"""
+        try:
+            while True:
+                task, kind, args = self.results.get_nowait()
+                callback = task.callbacks[kind]
+                if callback is not None:
+                    callback(*args)
+                elif kind == 'error':
+                    messagebox.showerror("❌ Erro", f"Ocorreu um erro: {str(args[0])}")
+        except queue.Empty:
+            pass
+        finally:
+            # A failing callback must not stop the delivery of later results
+            self.root.after(self.poll_interval, self.poll)
+    
+    def stop(self):
+        """Stop the worker after the jobs already queued"""
+        self.jobs.put(None)
 
 class ModernVibrationApp(tk.Tk):
     def __init__(self):
@@ -13,6 +98,9 @@ class ModernVibrationApp(tk.Tk):
         # Initialize backend
         self.backend = VibrationBackend()
         
+        # Background worker for imports, refits and table loads
+        self.tasks = TaskRunner(self)
+        
         # Configure style
         self.setup_styles()
         
@@ -35,6 +123,29 @@ class ModernVibrationApp(tk.Tk):
         
         # Show initial frame
         self.show_frame(ModernPredictionPage)
+        
+        # Release database connections on exit
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        # Once the first frame is drawn: record the startup time and load
+        # pandas/NumPy in the background for imports and refits
+        self.startup_time = None
+        self.startup_modules = []
+        self.after_idle(self.on_first_frame)
+    
+    def on_first_frame(self):
+        """Measure the time to the first drawn frame and start preloading heavy modules"""
+        self.update_idletasks()
+        self.startup_time = time.perf_counter() - STARTUP_T0
+        self.startup_modules = [name for name in ('pandas', 'numpy') if name in sys.modules]
+        logger.info(f"⏱️ Startup time: {self.startup_time * 1000:.0f} ms")
+        threading.Thread(target=preload_modules, daemon=True).start()
+    
+    def on_close(self):
+        """Close the backend and destroy the window"""
+        self.tasks.stop()
+        self.backend.close()
+        self.destroy()
     
     def setup_styles(self):
         """Setup modern styling for the application"""
@@ -249,16 +360,29 @@ class ModernPredictionPage(tk.Frame):
             if "Erro" in result or "Sem dados" in result:
                 self.result_label.config(text=f"⚠️ {result}", fg='#e74c3c')
             else:
-                self.result_label.config(text=f"✅ Vibração prevista: {result}", fg='#27ae60')
+                text = f"✅ Vibração prevista: {result}"
+                intervals = self.controller.backend.predict_interval(distance, charge, lithology)
+                if intervals and intervals['upper_bound'] is not None:
+                    text += f"\nLimite superior (95%): {intervals['upper_bound']:.2f} mm/s"
+                self.result_label.config(text=text, fg='#27ae60')
             
         except Exception as e:
             messagebox.showerror("❌ Erro", f"Ocorreu um erro: {str(e)}")
 
 class ModernDatabasePage(tk.Frame):
+    PAGE_SIZE = 200
+    
     def __init__(self, parent, controller):
         tk.Frame.__init__(self, parent, bg='#f0f2f5')
         self.controller = controller
         
+        # Keyset pagination state of the data table
+        self.page_generation = 0
+        self.page_loading = False
+        self.has_more_pages = True
+        self.oldest_id = None
+        self.newest_id = None
+        
         # Main container
         main_container = tk.Frame(self, bg='#f0f2f5')
         main_container.pack(fill="both", expand=True, padx=40, pady=30)
@@ -411,13 +535,13 @@ class ModernDatabasePage(tk.Frame):
             self.tree.column(col, width=column_widths[i], anchor='center')
         
         # Add scrollbars
-        v_scrollbar = ttk.Scrollbar(display_frame, orient="vertical", command=self.tree.yview)
+        self.v_scrollbar = ttk.Scrollbar(display_frame, orient="vertical", command=self.tree.yview)
         h_scrollbar = ttk.Scrollbar(display_frame, orient="horizontal", command=self.tree.xview)
-        self.tree.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
+        self.tree.configure(yscrollcommand=self.on_tree_scroll, xscrollcommand=h_scrollbar.set)
         
         # Pack elements
         self.tree.grid(row=0, column=0, sticky="nsew")
-        v_scrollbar.grid(row=0, column=1, sticky="ns")
+        self.v_scrollbar.grid(row=0, column=1, sticky="ns")
         h_scrollbar.grid(row=1, column=0, sticky="ew")
         
         # Configure grid weights
@@ -452,30 +576,119 @@ class ModernDatabasePage(tk.Frame):
                             command=self.clear_fields)
         clear_btn.pack(side="left", padx=5)
         
+        refit_btn = tk.Button(button_frame,
+                            text="🧮 Recalcular Modelos",
+                            font=("Arial", 10, "bold"),
+                            bg='#9b59b6',
+                            fg='white',
+                            relief='flat',
+                            padx=15,
+                            pady=8,
+                            cursor='hand2',
+                            command=self.refit_models)
+        refit_btn.pack(side="left", padx=5)
+        
         # Load initial data
         self.load_data()
     
     def load_data(self):
-        """Load data from database into treeview"""
-        # Clear existing data
+        """Reload the treeview from the newest rows; older pages load on demand while scrolling"""
+        self.page_generation += 1
         for item in self.tree.get_children():
             self.tree.delete(item)
+        self.page_loading = False
+        self.has_more_pages = True
+        self.oldest_id = None
+        self.newest_id = None
+        self.load_next_page()
+    
+    def load_next_page(self):
+        """Fetch the page of rows older than the last one shown (on the worker thread)"""
+        if self.page_loading or not self.has_more_pages:
+            return
+        self.page_loading = True
+        generation = self.page_generation
+        after_id = self.oldest_id
+        self.controller.tasks.submit(
+            lambda task: self.controller.backend.get_data_page(after_id, self.PAGE_SIZE),
+            on_done=lambda rows: self.append_page(rows, generation),
+            on_error=lambda e: messagebox.showerror("❌ Erro", f"Erro ao carregar dados: {str(e)}"))
+    
+    def append_page(self, rows, generation):
+        """Add a page of rows at the bottom of the treeview"""
+        if generation != self.page_generation:
+            return  # The table was reloaded meanwhile
+        self.page_loading = False
+        self.has_more_pages = len(rows) == self.PAGE_SIZE
+        
+        for row in rows:
+            self.tree.insert('', 'end', values=self.format_row(row))
+        if rows:
+            self.oldest_id = rows[-1][0]
+            if self.newest_id is None:
+                self.newest_id = rows[0][0]
+        
+        # Keep loading until the visible area is filled
+        if self.tree.yview()[1] >= 0.9:
+            self.load_next_page()
+    
+    def on_tree_scroll(self, first, last):
+        """Update the scrollbar and load the next page when the end comes into view"""
+        self.v_scrollbar.set(first, last)
+        if float(last) >= 0.9:
+            self.load_next_page()
+    
+    def load_new_rows(self):
+        """Insert the rows saved since the table was loaded at the top of the treeview"""
+        if self.newest_id is None:
+            self.load_data()
+            return
+        generation = self.page_generation
+        newest_id = self.newest_id
+        self.controller.tasks.submit(
+            lambda task: self.controller.backend.get_data_page(limit=self.PAGE_SIZE,
+                                                               filters={'min_id': newest_id}),
+            on_done=lambda rows: self.prepend_rows(rows, generation),
+            on_error=lambda e: messagebox.showerror("❌ Erro", f"Erro ao carregar dados: {str(e)}"))
+    
+    def prepend_rows(self, rows, generation):
+        """Add new rows at the top of the treeview"""
+        if generation != self.page_generation:
+            return
+        if len(rows) == self.PAGE_SIZE:
+            # More new rows than a page (e.g. a large import): start over from the newest
+            self.load_data()
+            return
+        for index, row in enumerate(rows):
+            self.tree.insert('', index, values=self.format_row(row))
+        if rows:
+            self.newest_id = rows[0][0]
+    
+    @staticmethod
+    def format_row(row):
+        """Format a database row for display"""
+        return (
+            row[0],  # ID
+            f"{row[1]:.2f}",  # Distance
+            f"{row[2]:.2f}",  # Charge
+            f"{row[3]:.2f}",  # Vibration
+            row[4]  # Lithology
+        )
+    
+    def refit_models(self):
+        """Run a full refit of the lithology models in the background"""
+        def on_done(report):
+            self.controller.frames[ModernPredictionPage].update_lithology_options()
+            if report is None:
+                messagebox.showerror("❌ Erro", "Erro ao recalcular os modelos")
+            elif report:
+                messagebox.showwarning("⚠️ Modelos recalculados",
+                                       "Estatísticas corrigidas para: " + ", ".join(map(str, report)))
+            else:
+                messagebox.showinfo("✅ Sucesso", "Modelos recalculados com sucesso!")
         
-        try:
-            data = self.controller.backend.get_all_data()
-            for row in data:
-                # Format the data for display
-                formatted_row = (
-                    row[0],  # ID
-                    f"{row[1]:.2f}",  # Distance
-                    f"{row[2]:.2f}",  # Charge
-                    f"{row[3]:.2f}",  # Vibration
-                    row[4]  # Lithology
-                )
-                self.tree.insert('', 'end', values=formatted_row)
-                
-        except Exception as e:
-            messagebox.showerror("❌ Erro", f"Erro ao carregar dados: {str(e)}")
+        self.controller.tasks.submit(lambda task: self.controller.backend.calculate_k_factor(),
+                                     on_done=on_done)
     
     def clear_fields(self):
         """Clear all input fields"""
@@ -510,11 +723,12 @@ class ModernDatabasePage(tk.Frame):
             # Save to database using backend
             success = self.controller.backend.save_data(distance, charge, vibration, lithology)
             
-            if success:
+            if success == DUPLICATE:
+                messagebox.showwarning("⚠️ Aviso", "Esta amostra já está cadastrada; nada foi salvo.")
+            elif success:
                 messagebox.showinfo("✅ Sucesso", "Dados salvos com sucesso!")
-                self.controller.backend.calculate_k_factor() # salva os dados e recalcula todos as constantes
                 self.clear_fields()
-                self.load_data()
+                self.load_new_rows()
                 # Update lithology options in prediction page
                 self.controller.frames[ModernPredictionPage].update_lithology_options()
             else:
@@ -539,10 +753,10 @@ class ModernDatabasePage(tk.Frame):
             if not file_path:
                 return  # User cancelled file selection
             
-            # Show loading message
+            # Show loading window with progress and cancel button
             loading_window = tk.Toplevel(self)
             loading_window.title("Importando dados...")
-            loading_window.geometry("300x100")
+            loading_window.geometry("320x150")
             loading_window.configure(bg='#f0f2f5')
             loading_window.transient(self)
             loading_window.grab_set()
@@ -556,152 +770,136 @@ class ModernDatabasePage(tk.Frame):
                                    bg='#f0f2f5')
             loading_label.pack(expand=True)
             
-            # Update the window to show loading message
-            loading_window.update()
+            progress_bar = ttk.Progressbar(loading_window, mode='determinate', maximum=100, length=260)
+            progress_bar.pack(pady=(0, 10))
             
-            # Read the file based on extension
-            file_extension = file_path.lower().split('.')[-1]
+            def show_progress(rows_read, fraction):
+                loading_label.config(text=f"💾 Salvando no banco de dados... {fraction:.0%}\n"
+                                          f"{rows_read} linhas lidas")
+                progress_bar['value'] = fraction * 100
             
-            if file_extension == 'csv':
-                # Try different encodings for CSV files
-                encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
-                df = None
-                
-                for encoding in encodings:
-                    try:
-                        df = pd.read_csv(file_path, encoding=encoding)
-                        break
-                    except UnicodeDecodeError:
-                        continue
-                
-                if df is None:
-                    raise Exception("Não foi possível ler o arquivo CSV. Verifique a codificação.")
-                    
-            elif file_extension in ['xlsx', 'xls']:
-                df = pd.read_excel(file_path)
-            else:
-                raise Exception("Formato de arquivo não suportado. Use CSV ou Excel.")
-            
-            loading_label.config(text="📊 Processando dados...")
-            loading_window.update()
-            
-            # Validate required columns
-            required_columns = ['distancia', 'carga_espera', 'vibracao', 'litologia']
-            df_columns_lower = [col.lower().strip() for col in df.columns]
-            
-            # Create column mapping (case insensitive)
-            column_mapping = {}
-            missing_columns = []
+            def on_done(result):
+                loading_window.destroy()
+                self.show_import_result(result)
             
-            for req_col in required_columns:
-                found = False
-                for i, col in enumerate(df_columns_lower):
-                    # Check for exact match or common variations
-                    if (req_col in col or 
-                        col in req_col or
-                        (req_col == 'distancia' and ('dist' in col or 'distance' in col)) or
-                        (req_col == 'carga_espera' and ('carga' in col or 'charge' in col or 'peso' in col)) or
-                        (req_col == 'vibracao' and ('vibr' in col or 'vibration' in col)) or
-                        (req_col == 'litologia' and ('lito' in col or 'lithology' in col or 'rock' in col))):
-                        column_mapping[req_col] = df.columns[i]
-                        found = True
-                        break
-                
-                if not found:
-                    missing_columns.append(req_col)
+            def on_cancelled():
+                # Cancelled while still queued behind another job: nothing was imported
+                loading_window.destroy()
+                messagebox.showinfo("Importação de Dados", "⚠️ Importação cancelada. Nenhum registro foi importado.")
             
-            if missing_columns:
+            def on_error(error):
                 loading_window.destroy()
-                messagebox.showerror("❌ Erro", 
-                                   f"Colunas obrigatórias não encontradas: {', '.join(missing_columns)}\n\n"
-                                   f"Colunas disponíveis: {', '.join(df.columns)}\n\n"
-                                   f"Certifique-se de que o arquivo contém as colunas:\n"
-                                   f"- distancia (ou distance, dist)\n"
-                                   f"- carga_espera (ou carga, charge, peso)\n"
-                                   f"- vibracao (ou vibration, vibr)\n"
-                                   f"- litologia (ou lithology, lito, rock)")
-                return
+                if isinstance(error, FileNotFoundError):
+                    messagebox.showerror("❌ Erro", "Arquivo não encontrado!")
+                elif type(error).__name__ == 'EmptyDataError':  # pandas.errors, loaded lazily
+                    messagebox.showerror("❌ Erro", "O arquivo está vazio!")
+                else:
+                    messagebox.showerror("❌ Erro", f"Erro ao processar arquivo:\n{str(error)}")
             
-            # Rename columns to match database schema
-            df_renamed = df.rename(columns=column_mapping)
+            # Stream the file in chunks on the worker thread, validating and saving each one
+            task = self.controller.tasks.submit(
+                lambda task: self.controller.backend.import_file(file_path,
+                                                                 progress=task.progress,
+                                                                 cancel=task.cancel_event),
+                on_done=on_done, on_progress=show_progress, on_error=on_error, on_cancelled=on_cancelled)
             
-            loading_label.config(text="💾 Salvando no banco de dados...")
-            loading_window.update()
+            def cancel_import():
+                task.cancel()
+                cancel_btn.config(state='disabled', text="Cancelando...")
             
-            # Process and save data
-            successful_imports = 0
-            failed_imports = 0
-            error_details = []
+            cancel_btn = tk.Button(loading_window,
+                                 text="✖ Cancelar",
+                                 font=("Arial", 10, "bold"),
+                                 bg='#95a5a6',
+                                 fg='white',
+                                 relief='flat',
+                                 cursor='hand2',
+                                 command=cancel_import)
+            cancel_btn.pack(pady=(0, 10))
+            loading_window.protocol("WM_DELETE_WINDOW", cancel_import)
+                
+        except Exception as e:
+            messagebox.showerror("❌ Erro", f"Erro ao processar arquivo:\n{str(e)}")
+    
+    def show_import_result(self, result):
+        """Report the import summary and refresh the views"""
+        if result['missing_columns']:
+            messagebox.showerror("❌ Erro", 
+                               f"Colunas obrigatórias não encontradas: {', '.join(result['missing_columns'])}\n\n"
+                               f"Colunas disponíveis: {', '.join(result['columns'])}\n\n"
+                               f"Certifique-se de que o arquivo contém as colunas:\n"
+                               f"- distancia (ou distance, dist)\n"
+                               f"- carga_espera (ou carga, charge, peso)\n"
+                               f"- vibracao (ou vibration, vibr)\n"
+                               f"- litologia (ou lithology, lito, rock)")
+            return
+        
+        successful_imports = result['imported']
+        failed_imports = result['rejected_count']
+        duplicate_imports = result.get('duplicates', 0)
+        excluded_imports = result.get('excluded', 0)
+        error_details = [f"Linha {line}: {reason}" for line, reason in result['rejected']]
+        
+        if 'error' in result:
+            error_details.insert(0, f"Erro no banco de dados: {result['error']}")
+        
+        # Show results
+        if successful_imports > 0:
+            if result.get('cancelled'):
+                result_message = f"⚠️ Importação cancelada!\n\n"
+            else:
+                result_message = f"✅ Importação concluída!\n\n"
+            result_message += f"📊 Registros importados com sucesso: {successful_imports}\n"
+            if duplicate_imports > 0:
+                result_message += f"🔁 Duplicados ignorados: {duplicate_imports}\n"
+            if excluded_imports > 0:
+                result_message += f"🚩 Marcados como outliers (fora dos ajustes): {excluded_imports}\n"
             
-            for index, row in df_renamed.iterrows():
-                try:
-                    # Extract and validate data
-                    distance = float(row[column_mapping['distancia']])
-                    charge = float(row[column_mapping['carga_espera']])
-                    vibration = float(row[column_mapping['vibracao']])
-                    lithology = str(row[column_mapping['litologia']]).strip()
-                    
-                    # Validate values
-                    if distance <= 0 or charge <= 0 or vibration < 0:
-                        raise ValueError("Valores inválidos (negativos ou zero)")
-                    
-                    if not lithology or lithology.lower() in ['nan', 'null', '']:
-                        raise ValueError("Litologia vazia")
-                    
-                    # Save to database
-                    if self.controller.backend.save_data(distance, charge, vibration, lithology):
-                        successful_imports += 1
-                    else:
-                        failed_imports += 1
-                        error_details.append(f"Linha {index + 2}: Erro ao salvar no banco")
-                        
-                except Exception as e:
-                    failed_imports += 1
-                    error_details.append(f"Linha {index + 2}: {str(e)}")
+            if failed_imports > 0 or 'error' in result:
+                result_message += f"❌ Registros com erro: {failed_imports}\n\n"
+                result_message += "Detalhes dos erros:\n"
+                result_message += "\n".join(error_details[:10])  # Show first 10 errors
+                if failed_imports > 10:
+                    result_message += f"\n... e mais {failed_imports - 10} erros"
             
-            # Close loading window
-            loading_window.destroy()
+            messagebox.showinfo("Importação de Dados", result_message)
             
-            # Show results
-            if successful_imports > 0:
-                result_message = f"✅ Importação concluída!\n\n"
-                result_message += f"📊 Registros importados com sucesso: {successful_imports}\n"
-                self.controller.backend.calculate_k_factor()
-                
-                if failed_imports > 0:
-                    result_message += f"❌ Registros com erro: {failed_imports}\n\n"
-                    result_message += "Detalhes dos erros:\n"
-                    result_message += "\n".join(error_details[:10])  # Show first 10 errors
-                    if len(error_details) > 10:
-                        result_message += f"\n... e mais {len(error_details) - 10} erros"
-                
-                messagebox.showinfo("Importação de Dados", result_message)
-                
-                # Refresh data display if we're on the database page
-                if hasattr(self.controller.frames[ModernDatabasePage], 'load_data'):
-                    self.controller.frames[ModernDatabasePage].load_data()
-                
-                # Update lithology options in prediction page
-                if hasattr(self.controller.frames[ModernPredictionPage], 'update_lithology_options'):
-                    self.controller.frames[ModernPredictionPage].update_lithology_options()
-                    
-            else:
-                error_message = f"❌ Nenhum registro foi importado!\n\n"
-                error_message += f"Total de erros: {failed_imports}\n\n"
-                error_message += "Primeiros erros:\n"
-                error_message += "\n".join(error_details[:5])
-                messagebox.showerror("Erro na Importação", error_message)
+            # Refresh data display and lithology options in prediction page
+            self.load_new_rows()
+            self.controller.frames[ModernPredictionPage].update_lithology_options()
                 
-        except FileNotFoundError:
-            messagebox.showerror("❌ Erro", "Arquivo não encontrado!")
-        except pd.errors.EmptyDataError:
-            messagebox.showerror("❌ Erro", "O arquivo está vazio!")
-        except Exception as e:
-            if 'loading_window' in locals():
-                loading_window.destroy()
-            messagebox.showerror("❌ Erro", f"Erro ao processar arquivo:\n{str(e)}")
+        elif result.get('cancelled'):
+            messagebox.showinfo("Importação de Dados", "⚠️ Importação cancelada. Nenhum registro foi importado.")
+        elif duplicate_imports > 0 and failed_imports == 0 and 'error' not in result:
+            messagebox.showinfo("Importação de Dados",
+                                f"ℹ️ Nenhum registro novo: os {duplicate_imports} registros já estavam no banco de dados.")
+        else:
+            error_message = f"❌ Nenhum registro foi importado!\n\n"
+            error_message += f"Total de erros: {failed_imports}\n\n"
+            error_message += "Primeiros erros:\n"
+            error_message += "\n".join(error_details[:5])
+            messagebox.showerror("Erro na Importação", error_message)
     
 
-if __name__ == "__main__":
+def measure_startup():
+    """Print the time to the first drawn frame as JSON and exit (python main.py --startup-time)"""
     app = ModernVibrationApp()
-    app.mainloop()
\ No newline at end of file
+    
+    def report():
+        print(json.dumps({
+            'startup_ms': round(app.startup_time * 1000, 1),
+            'heavy_modules_loaded': app.startup_modules,
+        }))
+        app.on_close()
+    
+    # Runs after on_first_frame, which was scheduled first
+    app.after_idle(report)
+    app.mainloop()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if "--startup-time" in sys.argv:
+        measure_startup()
+    else:
+        app = ModernVibrationApp()
+        app.mainloop()
\ No newline at end of file
@@ -0,0 +1,313 @@
+"""Headless HTTP prediction service on top of VibrationBackend
+
+Usage:
+    python service.py --db vibration_data.db --port 8080
+
+Endpoints (JSON in and out):
+    GET  /health
+    GET  /coefficients                 fitted model of every lithology
+    GET  /coefficients/<lithology>
+    GET  /metrics                      backend metrics and coefficient cache counters
+    GET  /receptors                    stored monitoring stations and structures (?kind=station|structure)
+    GET  /receptors/near?x=..&y=..     receptors within &radius= metres and/or the &nearest= N,
+                                       optionally &z= and &kind=
+    POST /predict                      {"distancia": 300, "carga_espera": 50, "litologia": "Granito",
+                                        "confidence": 0.95 (optional, adds the intervals),
+                                        "variant": "all" | "window" | "decayed" | "robust" (optional)}
+    POST /predict/batch                {"distancia": [...], "carga_espera": [...], "litologia": [...] or "Granito"}
+    POST /samples                      {"samples": [{"distancia", "carga_espera", "vibracao", "litologia",
+                                                     "event_time" (optional)}, ...]}
+    POST /blast                        {"holes": [[x, y, z?], ...], "carga_espera": [...], "retardo": [...] (ms),
+                                        "receptors": [[x, y, z?], ...], "litologia": "Granito" or [...],
+                                        "rule": "max" | "window_sum" | "window_srss", "delay_window": 8,
+                                        "confidence" and "variant" (optional)}
+
+Coefficients are served from the backend's in-memory cache. Requests are
+handled by a fixed pool of threads, and ingested samples from concurrent
+requests are grouped into shared transactions by a single writer thread.
+"""
+import argparse
+import json
+import logging
+import math
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from backend import DEFAULT_VARIANT, REQUIRED_COLUMNS, VibrationBackend
+from instrumentation import logger
+
+
+class IngestBatcher:
+    """Collects samples from concurrent requests and imports them in grouped transactions"""
+
+    def __init__(self, backend, max_rows=5000, max_delay=0.05):
+        self.backend = backend
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.requests = queue.Queue()
+        self.writer = threading.Thread(target=self.run, daemon=True)
+        self.writer.start()
+
+    def submit(self, samples):
+        """Queue a list of sample dicts; the Future resolves to this request's import summary"""
+        future = Future()
+        self.requests.put((samples, future))
+        return future
+
+    def run(self):
+        while True:
+            item = self.requests.get()
+            if item is None:
+                break
+            batch = [item]
+            rows = len(item[0])
+            deadline = time.monotonic() + self.max_delay
+            # Keep collecting until the batch is full or the delay has passed
+            while rows < self.max_rows:
+                try:
+                    item = self.requests.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self.requests.put(None)
+                    break
+                batch.append(item)
+                rows += len(item[0])
+            self.flush(batch)
+
+    def flush(self, batch):
+        """Import every queued request in one transaction and split the summary per request"""
+        import pandas as pd
+
+        samples = [sample for request_samples, _ in batch for sample in request_samples]
+        try:
+            df = pd.DataFrame(samples, columns=REQUIRED_COLUMNS + ['event_time'])
+            result = self.backend.import_dataframe(df)
+        except Exception as e:
+            result = {'imported': 0, 'rejected': [], 'duplicate_lines': [], 'excluded_lines': [], 'missing_columns': [],
+                      'error': str(e)}
+
+        offset = 0
+        for request_samples, future in batch:
+            # import_dataframe numbers rows from line 2; map them back to request positions
+            rejected = [(line - 2 - offset, reason) for line, reason in result['rejected']
+                        if offset <= line - 2 < offset + len(request_samples)]
+            duplicates = sum(offset <= line - 2 < offset + len(request_samples) for line in result['duplicate_lines'])
+            excluded = [line - 2 - offset for line in result['excluded_lines']
+                        if offset <= line - 2 < offset + len(request_samples)]
+            summary = {'received': len(request_samples), 'rejected': rejected, 'duplicates': duplicates,
+                       'excluded': excluded}
+            if 'error' in result:
+                summary['imported'] = 0
+                summary['error'] = result['error']
+            else:
+                summary['imported'] = len(request_samples) - len(rejected) - duplicates
+            future.set_result(summary)
+            offset += len(request_samples)
+
+    def stop(self):
+        self.requests.put(None)
+        self.writer.join()
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTP server that handles requests on a fixed thread pool
+
+    A bounded pool also bounds the number of per-thread SQLite connections.
+    """
+
+    def __init__(self, address, handler, backend, workers=8, batch_rows=5000, batch_delay=0.05):
+        super().__init__(address, handler)
+        self.backend = backend
+        self.batcher = IngestBatcher(backend, batch_rows, batch_delay)
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix='vibration-http')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+        self.batcher.stop()
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'VibrationService/1.0'
+    timeout = 30  # idle keep-alive connections release their pool thread
+
+    @property
+    def backend(self):
+        return self.server.backend
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = url.path.rstrip('/')
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        if path == '/health':
+            self.send_json(200, {'status': 'ok'})
+        elif path == '/coefficients':
+            self.send_json(200, {'models': self.backend.get_models()})
+        elif path.startswith('/coefficients/'):
+            lithology = unquote(path[len('/coefficients/'):])
+            model = self.backend.get_fit_statistics([lithology]).get(lithology)
+            if model is None:
+                self.send_json(404, {'error': f"Sem dados para a litologia {lithology}"})
+            else:
+                self.send_json(200, {'litologia': lithology, 'law': model[-1], 'k': model[0], 'alpha': model[1]})
+        elif path == '/metrics':
+            self.send_json(200, {'operations': self.backend.get_metrics(), 'cache': self.backend.cache_info()})
+        elif path == '/receptors':
+            self.send_json(200, {'receptors': self.backend.get_receptors(query.get('kind'))})
+        elif path == '/receptors/near':
+            self.receptors_near(query)
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def receptors_near(self, query):
+        try:
+            radius = float(query['radius']) if 'radius' in query else None
+            nearest = int(query['nearest']) if 'nearest' in query else None
+            if radius is None and nearest is None:
+                raise ValueError("radius or nearest is required")
+            found = self.backend.receptors_near(float(query['x']), float(query['y']), float(query.get('z', 0.0)),
+                                                radius, nearest, query.get('kind'))
+        except (KeyError, ValueError) as e:
+            self.send_json(400, {'error': f"invalid request: {e}"})
+            return
+        if found is None:
+            self.send_json(500, {'error': "receptor search failed"})
+        else:
+            self.send_json(200, {'receptors': found})
+
+    def do_POST(self):
+        path = urlsplit(self.path).path.rstrip('/')
+        try:
+            payload = self.read_json()
+        except (ValueError, UnicodeDecodeError) as e:
+            self.send_json(400, {'error': f"invalid JSON: {e}"})
+            return
+
+        try:
+            if path == '/predict':
+                self.predict(payload)
+            elif path == '/predict/batch':
+                self.predict_batch(payload)
+            elif path == '/samples':
+                self.ingest(payload)
+            elif path == '/blast':
+                self.blast(payload)
+            else:
+                self.send_json(404, {'error': 'not found'})
+        except (KeyError, TypeError, ValueError) as e:
+            self.send_json(400, {'error': f"invalid request: {e}"})
+
+    def predict(self, payload):
+        lithology = payload['litologia']
+        variant = payload.get('variant', DEFAULT_VARIANT)
+        ppv = self.backend.predict_ppv(payload['distancia'], payload['carga_espera'], lithology, variant)
+        if ppv is None:
+            self.send_json(404, {'error': f"Sem dados para a litologia {lithology}"})
+        else:
+            result = {'litologia': lithology, 'variant': variant, 'ppv': ppv}
+            if payload.get('confidence') is not None:
+                result['intervals'] = self.backend.predict_interval(payload['distancia'], payload['carga_espera'],
+                                                                    lithology, float(payload['confidence']), variant)
+            self.send_json(200, result)
+
+    def predict_batch(self, payload):
+        predicted = self.backend.predict_vibration_batch(payload['distancia'], payload['carga_espera'],
+                                                         payload['litologia'])
+        if predicted is None:
+            raise ValueError("batch prediction failed")
+        # NaN (no model or invalid input) is not valid JSON
+        self.send_json(200, {'ppv': [value if math.isfinite(value) else None for value in predicted.tolist()]})
+
+    def blast(self, payload):
+        confidence = payload.get('confidence')
+        result = self.backend.simulate_blast(payload['holes'], payload['carga_espera'], payload['retardo'],
+                                             payload['receptors'], payload['litologia'], payload.get('rule', 'max'),
+                                             float(payload.get('delay_window', 8.0)),
+                                             None if confidence is None else float(confidence),
+                                             payload.get('variant', DEFAULT_VARIANT))
+        if result is None:
+            raise ValueError("blast simulation failed")
+        finite = [math.isfinite(value) for value in result['ppv'].tolist()]
+        self.send_json(200, {
+            'ppv': [value if ok else None for value, ok in zip(result['ppv'].tolist(), finite)],
+            'hole': [value if ok else None for value, ok in zip(result['hole'].tolist(), finite)],
+            'delay': [value if ok else None for value, ok in zip(result['delay'].tolist(), finite)],
+            'rule': result['rule'], 'delay_window': result['delay_window'], 'confidence': confidence,
+            'variant': result['variant'],
+        })
+
+    def ingest(self, payload):
+        samples = payload['samples'] if isinstance(payload, dict) and 'samples' in payload else payload
+        if isinstance(samples, dict):
+            samples = [samples]
+        if not isinstance(samples, list) or not all(isinstance(sample, dict) for sample in samples):
+            raise ValueError("samples must be a list of objects")
+        summary = self.server.batcher.submit(samples).result()
+        self.send_json(500 if 'error' in summary else 200, summary)
+
+
+def create_server(db_path, host='127.0.0.1', port=8080, workers=8, batch_rows=5000, batch_delay=0.05):
+    """Build the service for a local SQLite file; call serve_forever() to run it"""
+    backend = VibrationBackend(db_path)
+    # Load every model into the coefficient cache up front
+    backend.get_coefficients([model['litologia'] for model in backend.get_models()])
+    return PooledHTTPServer((host, port), PredictionHandler, backend, workers, batch_rows, batch_delay)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP prediction service for VibrationBackend")
+    parser.add_argument('--db', default='vibration_data.db')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=8, help="request handler threads")
+    parser.add_argument('--batch-rows', type=int, default=5000, help="samples per ingestion transaction")
+    parser.add_argument('--batch-delay', type=float, default=0.05,
+                        help="seconds to wait for more samples before committing a batch")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    server = create_server(args.db, args.host, args.port, args.workers, args.batch_rows, args.batch_delay)
+    logger.info(f"🌐 Serving predictions on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.backend.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""Columnar, memory-mapped snapshot of the sample table for read-only analysis
+
+Each column is a raw little-endian array file next to a meta.json holding the
+row count, the last sample id, the data version it reflects, the dictionary
+of the encoded litologia column and an opaque fingerprint the writer uses to
+detect source changes that keep the ids. Appending only writes the new
+rows and then replaces meta.json, so readers that memory-mapped an older
+snapshot keep a consistent view. Full rebuilds write new files and swap them
+in with os.replace.
+"""
+import json
+import os
+
+import numpy as np
+
+COLUMNS = {
+    'id': '<i8',
+    'distancia': '<f8',
+    'carga_espera': '<f8',
+    'vibracao': '<f8',
+    'litologia': '<i4',   # code into meta['lithologies']
+}
+META_FILE = 'meta.json'
+
+
+class ColumnarSnapshot:
+    """Directory of memory-mappable sample columns"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.meta = self.read_meta()
+
+    def path(self, name):
+        return os.path.join(self.directory, f"{name}.bin")
+
+    def read_meta(self):
+        try:
+            with open(os.path.join(self.directory, META_FILE)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {'rows': 0, 'last_id': 0, 'data_version': None, 'lithologies': [], 'fingerprint': None}
+
+    def write_meta(self, meta):
+        path = os.path.join(self.directory, META_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(path + '.tmp', path)
+        self.meta = meta
+
+    @property
+    def rows(self):
+        return self.meta['rows']
+
+    @property
+    def lithologies(self):
+        return self.meta['lithologies']
+
+    def encode(self, lithologies, dictionary):
+        """Codes of the lithology names, adding unseen names to dictionary in place"""
+        import pandas as pd
+
+        inverse, unique = pd.factorize(np.asarray(lithologies, dtype=object))
+        index = {name: code for code, name in enumerate(dictionary)}
+        for name in unique:
+            if name not in index:
+                index[name] = len(dictionary)
+                dictionary.append(name)
+        return np.array([index[name] for name in unique], dtype=COLUMNS['litologia'])[inverse]
+
+    def append(self, columns, data_version, fingerprint=None, last_id=None):
+        """Append rows given as {column: array} (litologia as names) sorted by id
+
+        last_id records that the source was read up to that id even when its
+        last rows were filtered out (default: the id of the last row).
+        """
+        meta = dict(self.meta, lithologies=list(self.lithologies))
+        if fingerprint is not None:
+            meta['fingerprint'] = fingerprint
+        count = len(columns['id'])
+        if count:
+            encoded = dict(columns, litologia=self.encode(columns['litologia'], meta['lithologies']))
+            for name, dtype in COLUMNS.items():
+                with open(self.path(name), 'ab') as f:
+                    # Drop any tail left by an append that failed before meta.json was written
+                    f.truncate(meta['rows'] * np.dtype(dtype).itemsize)
+                    np.ascontiguousarray(encoded[name], dtype=dtype).tofile(f)
+            meta['rows'] += count
+            meta['last_id'] = int(columns['id'][-1])
+        if last_id is not None:
+            meta['last_id'] = max(meta['last_id'], int(last_id))
+        meta['data_version'] = data_version
+        self.write_meta(meta)
+
+    def rebuild(self, chunks, data_version, fingerprint=None, last_id=None):
+        """Replace the snapshot with the rows of an iterable of {column: array} chunks"""
+        meta = {'rows': 0, 'last_id': 0, 'data_version': data_version, 'lithologies': [],
+                'fingerprint': fingerprint}
+        files = {name: open(self.path(name) + '.tmp', 'wb') for name in COLUMNS}
+        try:
+            for columns in chunks:
+                encoded = dict(columns, litologia=self.encode(columns['litologia'], meta['lithologies']))
+                for name, dtype in COLUMNS.items():
+                    np.ascontiguousarray(encoded[name], dtype=dtype).tofile(files[name])
+                if len(columns['id']):
+                    meta['rows'] += len(columns['id'])
+                    meta['last_id'] = int(columns['id'][-1])
+        finally:
+            for f in files.values():
+                f.close()
+        if last_id is not None:
+            meta['last_id'] = max(meta['last_id'], int(last_id))
+        for name in COLUMNS:
+            os.replace(self.path(name) + '.tmp', self.path(name))
+        self.write_meta(meta)
+
+    def columns(self):
+        """Read-only memory maps of every column, as of the current meta.json"""
+        rows = self.rows
+        return {
+            name: (np.memmap(self.path(name), dtype=dtype, mode='r', shape=(rows,)) if rows
+                   else np.empty(0, dtype=dtype))
+            for name, dtype in COLUMNS.items()
+        }
+
+    def frame(self, categorical=False):
+        """The snapshot as a DataFrame; numeric columns are backed by the memory maps"""
+        import pandas as pd
+
+        columns = self.columns()
+        codes = columns.pop('litologia')
+        if categorical:
+            columns['litologia'] = pd.Categorical.from_codes(codes, categories=self.lithologies)
+        else:
+            columns['litologia'] = np.asarray(self.lithologies, dtype=object)[codes]
+        return pd.DataFrame(columns, copy=False)
+
+    def export(self, output_path):
+        """Write the snapshot to Parquet (requires pyarrow) or to a compressed .npz"""
+        if output_path.lower().endswith('.parquet'):
+            # Dictionary-encoded litologia maps to a Parquet dictionary column
+            self.frame(categorical=True).to_parquet(output_path, index=False)
+        else:
+            np.savez_compressed(output_path, lithologies=np.asarray(self.lithologies, dtype=str),
+                                **self.columns())
+        return output_path
@@ -0,0 +1,109 @@
+"""In-memory uniform grid index of receptor coordinates for radius and nearest queries
+
+Points are bucketed by their (x, y) cell and sorted by cell key, where the
+key is column * rows + row. The cells of one grid column that overlap a
+query square form one contiguous key range, so a query is one searchsorted
+per column instead of a scan of every point. Distances are 3D (z included);
+the 2D cells only prune candidates, since the 3D distance is never shorter
+than the horizontal one.
+"""
+import numpy as np
+
+
+class GridIndex:
+    """Static grid over a set of (x, y[, z]) points; cells are at least min_cell_size wide"""
+
+    def __init__(self, points, cell_size=None, points_per_cell=2, min_cell_size=1.0):
+        points = np.asarray(points, dtype=float)
+        points = np.atleast_2d(points) if points.size else np.empty((0, 3))
+        if points.shape[1] not in (2, 3):
+            raise ValueError("Coordenadas devem ter 2 (x, y) ou 3 (x, y, z) colunas")
+        self.points = np.pad(points, ((0, 0), (0, 3 - points.shape[1])))
+        count = len(self.points)
+        self.low = self.points.min(axis=0) if count else np.zeros(3)
+        self.high = self.points.max(axis=0) if count else np.zeros(3)
+        self.origin = self.low[:2]
+        extent = self.high[:2] - self.origin
+        if cell_size is None:
+            # About points_per_cell points per cell for an even spread; degenerate extents use one cell
+            area = max(extent[0], 1e-9) * max(extent[1], 1e-9)
+            cell_size = np.sqrt(area * points_per_cell / max(count, 1))
+            cell_size = max(cell_size, extent.max() / max(count, 1), min_cell_size)
+        self.cell_size = float(cell_size)
+        self.shape = (np.floor(extent / self.cell_size).astype(np.int64) + 1) if count else np.ones(2, dtype=np.int64)
+
+        keys = self.cell_keys(self.points[:, :2])
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+        self.sorted_points = self.points[self.order]
+
+    def __len__(self):
+        return len(self.points)
+
+    def cells(self, xy):
+        return np.floor((np.asarray(xy, dtype=float) - self.origin) / self.cell_size).astype(np.int64)
+
+    def cell_keys(self, xy):
+        cells = np.clip(self.cells(xy), 0, self.shape - 1)
+        return cells[..., 0] * self.shape[1] + cells[..., 1]
+
+    def candidates(self, point, radius):
+        """Positions (into the sorted arrays) of the points in the cells overlapping the query square"""
+        low = np.maximum(self.cells(point[:2] - radius), 0)
+        high = np.minimum(self.cells(point[:2] + radius), self.shape - 1)
+        if (high < low).any():
+            return np.empty(0, dtype=np.int64)
+        columns = np.arange(low[0], high[0] + 1)
+        if len(columns) * (high[1] - low[1] + 1) >= len(self.points):
+            return np.arange(len(self.points))  # the square covers about every point anyway
+        starts = np.searchsorted(self.keys, columns * self.shape[1] + low[1], side='left')
+        ends = np.searchsorted(self.keys, columns * self.shape[1] + high[1], side='right')
+        lengths = ends - starts
+        if not lengths.sum():
+            return np.empty(0, dtype=np.int64)
+        # Concatenated aranges of every [start, end) range
+        offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+        return np.arange(lengths.sum()) + offsets
+
+    @staticmethod
+    def as_point(point):
+        point = np.asarray(point, dtype=float).ravel()
+        if len(point) not in (2, 3):
+            raise ValueError("Coordenadas devem ter 2 (x, y) ou 3 (x, y, z) colunas")
+        return np.pad(point, (0, 3 - len(point)))
+
+    def within(self, point, radius):
+        """(indices, distances) of the points within radius of point, nearest first"""
+        point = self.as_point(point)
+        if not len(self.points) or radius < 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        positions = self.candidates(point, radius)
+        distances = np.sqrt(((self.sorted_points[positions] - point) ** 2).sum(axis=1))
+        inside = distances <= radius
+        positions, distances = positions[inside], distances[inside]
+        nearest_first = np.argsort(distances, kind='stable')
+        return self.order[positions[nearest_first]], distances[nearest_first]
+
+    def nearest(self, point, k=1, max_distance=None):
+        """(indices, distances) of the k points nearest to point, nearest first
+
+        The search radius starts at the distance to the bounding box (or one
+        cell inside it) and doubles until k points are inside it; once k
+        points lie within the radius, the k nearest are among them.
+        max_distance caps the search.
+        """
+        point = self.as_point(point)
+        if not len(self.points) or k < 1:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        # No point is farther than the farthest corner of the bounding box
+        reach = np.sqrt((np.maximum(np.abs(self.low - point), np.abs(self.high - point)) ** 2).sum())
+        # No point is nearer than the bounding box
+        gap = np.sqrt((np.maximum(np.maximum(self.low - point, point - self.high), 0.0) ** 2).sum())
+        radius = max(gap, self.cell_size)
+        while True:
+            if max_distance is not None:
+                radius = min(radius, max_distance)
+            indices, distances = self.within(point, radius)
+            if len(indices) >= k or radius >= reach or (max_distance is not None and radius >= max_distance):
+                return indices[:k], distances[:k]
+            radius *= 2
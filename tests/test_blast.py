@@ -0,0 +1,88 @@
+"""Pin the vectorized blast superposition to a hole-by-hole reference"""
+import numpy as np
+import pytest
+
+import blast
+import design
+from backend import VibrationBackend
+
+
+def random_blast(rng, holes=25, receptors=40):
+    return (rng.uniform(0, 60, (holes, 3)), rng.uniform(5, 50, holes), rng.uniform(0, 200, holes),
+            rng.uniform(-800, 800, (receptors, 2)))
+
+
+def models(rng, receptors):
+    rows = np.zeros((receptors, len(design.MODEL_COLUMNS)))
+    rows[:, 0] = rng.uniform(300, 1500, receptors)
+    rows[:, 1] = rng.uniform(1.2, 1.8, receptors)
+    rows[:, 6:] = [1.0, 0.5]
+    return rows
+
+
+def reference(models, holes, charges, delays, receptors, rule, delay_window):
+    """Peak PPV and peak hole of every receptor, one hole and one window at a time"""
+    peaks, peak_holes = [], []
+    for receptor, (K, alpha, *_, gamma, beta) in zip(blast.as_points(receptors), models):
+        ppv = [design.ppv(K, alpha, np.linalg.norm(hole - receptor), charge, gamma, beta)
+               for hole, charge in zip(holes, charges)]
+        if rule == 'max':
+            values = ppv
+        else:
+            values = []
+            for start in delays:
+                window = [v for v, delay in zip(ppv, delays) if start <= delay < start + delay_window]
+                values.append(sum(window) if rule == 'window_sum' else np.sqrt(sum(v * v for v in window)))
+        peaks.append(max(values))
+        peak_holes.append(int(np.argmax(values)))
+    return np.array(peaks), np.array(peak_holes)
+
+
+@pytest.mark.parametrize('rule', blast.RULES)
+def test_simulate_matches_reference(rule):
+    rng = np.random.default_rng(4)
+    holes, charges, delays, receptors = random_blast(rng)
+    rows = models(rng, len(receptors))
+    peak, hole, delay = blast.simulate(rows, holes, charges, delays, receptors, rule, delay_window=17.0)
+    expected_peak, expected_hole = reference(rows, holes, charges, delays, receptors, rule, 17.0)
+    np.testing.assert_allclose(peak, expected_peak, rtol=1e-12)
+    np.testing.assert_array_equal(hole, expected_hole)
+    np.testing.assert_array_equal(delay, delays[expected_hole])
+
+
+def test_chunking_does_not_change_the_result():
+    rng = np.random.default_rng(5)
+    holes, charges, delays, receptors = random_blast(rng)
+    rows = models(rng, len(receptors))
+    whole = blast.simulate(rows, holes, charges, delays, receptors, 'window_srss')
+    chunked = blast.simulate(rows, holes, charges, delays, receptors, 'window_srss', chunk_elements=60)
+    for a, b in zip(whole, chunked):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_window_sum_of_simultaneous_holes():
+    # Two equal holes at the same distance fired together double the PPV; apart they do not add up
+    holes, receptor = [[-10, 0], [10, 0]], [[0, 100]]
+    rows = models(np.random.default_rng(6), 1)
+    single, _, _ = blast.simulate(rows, holes[:1], 20, 0, receptor)
+    together, _, _ = blast.simulate(rows, holes, 20, [0, 0], receptor, 'window_sum')
+    apart, _, _ = blast.simulate(rows, holes, 20, [0, 25], receptor, 'window_sum', delay_window=8.0)
+    assert together[0] == pytest.approx(2 * single[0], rel=1e-12)
+    assert apart[0] == pytest.approx(single[0], rel=1e-12)
+
+
+def test_simulate_blast_uses_the_lithology_models(tmp_path):
+    rng = np.random.default_rng(7)
+    distances, charges = rng.uniform(50, 900, 60), rng.uniform(5, 100, 60)
+    vibrations = 800 * (distances / np.sqrt(charges)) ** -1.4 * 10 ** rng.normal(0, 0.1, 60)
+    backend = VibrationBackend(str(tmp_path / 'vibration.db'))
+    try:
+        for row in zip(distances, charges, vibrations):
+            backend.save_data(*row, 'Granito')
+        result = backend.simulate_blast([[0, 0, 0]], 30, 0, [[300, 400, 0], [0, 100, 0]], ['Granito', 'Xisto'],
+                                        confidence=0.95)
+        interval = backend.predict_interval(500, 30, 'Granito', confidence=0.95)
+        assert result['ppv'][0] == pytest.approx(interval['upper_bound'], rel=1e-9)
+        assert np.isnan(result['ppv'][1])
+    finally:
+        backend.close()
@@ -0,0 +1,56 @@
+"""Keep the coefficient cache consistent with writes from this and other processes"""
+import numpy as np
+import pytest
+
+from backend import VibrationBackend
+
+
+def save_samples(backend, count=30, seed=0, lithology='Granito'):
+    rng = np.random.default_rng(seed)
+    for distance, charge in zip(rng.uniform(50, 900, count), rng.uniform(5, 100, count)):
+        backend.save_data(distance, charge, 800 * (distance / np.sqrt(charge)) ** -1.4 * 10 ** rng.normal(0, 0.1),
+                          lithology)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'vibration.db')
+
+
+def test_own_writes_invalidate_without_a_version_check(path):
+    backend = VibrationBackend(path, cache_check_interval=0)
+    try:
+        save_samples(backend, 10)
+        before = backend.get_coefficients(['Granito'])
+        save_samples(backend, 10, seed=1)
+        assert backend.get_coefficients(['Granito']) != before
+        info = backend.cache_info()
+        assert info['version_checks'] >= 2
+        assert info['external_invalidations'] == 0
+    finally:
+        backend.close()
+
+
+def test_writes_of_another_backend_are_seen(path):
+    reader = VibrationBackend(path, cache_check_interval=0)
+    writer = VibrationBackend(path)
+    try:
+        save_samples(writer, 10)
+        assert set(reader.get_coefficients(['Granito', 'Basalto'])) == {'Granito'}
+        save_samples(writer, 10, lithology='Basalto')
+        assert set(reader.get_coefficients(['Granito', 'Basalto'])) == {'Granito', 'Basalto'}
+        assert reader.cache_info()['external_invalidations'] == 1
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_version_checks_are_throttled(path):
+    backend = VibrationBackend(path, cache_check_interval=60)
+    try:
+        save_samples(backend, 5)
+        for _ in range(100):
+            backend.get_coefficients(['Granito'])
+        assert backend.cache_info()['version_checks'] == 1
+    finally:
+        backend.close()
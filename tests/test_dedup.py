@@ -0,0 +1,78 @@
+"""Skip samples already stored, identified by their content key"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend import DUPLICATE, VibrationBackend, content_key, normalize_event_time
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = VibrationBackend(str(tmp_path / 'vibration.db'))
+    yield backend
+    backend.close()
+
+
+def samples(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'distancia': rng.uniform(50, 900, count),
+        'carga_espera': rng.uniform(5, 100, count),
+        'vibracao': rng.uniform(0.5, 20, count),
+        'litologia': rng.choice(['Granito', 'Basalto'], count),
+    })
+
+
+def stored_sums(backend):
+    return backend.db.connection().execute(
+        "SELECT * FROM lithology_stats ORDER BY litologia, law").fetchall()
+
+
+def test_content_key_normalizes_equal_samples():
+    assert content_key(100, 20, 5.5, 'Granito') == content_key(100.0, 20.0, 5.5000000000001, '  granito ')
+    assert content_key(100, 20, 5.5, 'Granito') != content_key(100, 20, 5.6, 'Granito')
+    time = normalize_event_time('25/03/2024 10:30')
+    assert time == normalize_event_time('2024-03-25T10:30:00') == '2024-03-25 10:30:00'
+    assert content_key(100, 20, 5.5, 'Granito', time) != content_key(100, 20, 5.5, 'Granito')
+
+
+def test_import_skips_stored_and_repeated_rows(backend):
+    df = samples(20)
+    assert backend.import_dataframe(df, outlier_threshold=None)['imported'] == 20
+    sums = stored_sums(backend)
+
+    again = pd.concat([df.iloc[:5], samples(3, seed=1), samples(3, seed=1)], ignore_index=True)
+    result = backend.import_dataframe(again, outlier_threshold=None)
+    assert result['imported'] == 3
+    assert result['duplicates'] == 8
+    assert result['duplicate_lines'] == [2, 3, 4, 5, 6, 10, 11, 12]
+    assert backend.db.connection().execute("SELECT COUNT(*) FROM vibration_data").fetchone()[0] == 23
+    assert len(stored_sums(backend)) == len(sums)
+
+
+def test_compact_duplicates_keeps_the_oldest_copy(backend):
+    df = samples(10)
+    backend.import_dataframe(df, outlier_threshold=None)
+    with backend.db.transaction() as conn:
+        # Rows stored before content keys existed, two of them copies of keyed samples
+        rows = [tuple(row) for row in df.iloc[:2].itertuples(index=False)] + [(120.0, 15.0, 3.0, 'Granito')] * 3
+        conn.executemany("INSERT INTO vibration_data (distancia, carga_espera, vibracao, litologia) "
+                         "VALUES (?, ?, ?, ?)", rows)
+    backend.rebuild_statistics()
+
+    assert backend.compact_duplicates() == {'keyed': 1, 'removed': 4}
+    conn = backend.db.connection()
+    assert conn.execute("SELECT COUNT(*) FROM vibration_data").fetchone()[0] == 11
+    assert conn.execute("SELECT COUNT(*) FROM vibration_data WHERE content_key IS NULL").fetchone()[0] == 0
+    assert conn.execute("SELECT id FROM vibration_data WHERE distancia = 120").fetchall() == [(13,)]
+
+    # The sums were updated for the removed rows: a rebuild finds nothing to repair
+    assert backend.rebuild_statistics() == {}
+
+
+def test_save_data_reports_duplicates(backend):
+    assert backend.save_data(100.0, 20.0, 5.5, 'Granito') is True
+    sums = stored_sums(backend)
+    assert backend.save_data(100.0, 20.0, 5.5, ' granito ') == DUPLICATE
+    assert stored_sums(backend) == sums
+    assert backend.db.connection().execute("SELECT COUNT(*) FROM vibration_data").fetchone()[0] == 1
@@ -0,0 +1,67 @@
+"""Pin the closed-form fits to each other and to an ordinary least-squares reference"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import fitting
+from backend import VibrationBackend, fit_from_sums, residual_statistics
+
+
+def random_sums(rng, groups=50):
+    """Regression sums of random groups, including flat (single distance) and tiny ones"""
+    rows = []
+    for i in range(groups):
+        n = [1, 2, 3, 30][i % 4]
+        x = np.full(n, 1.5) if i % 5 == 0 else rng.uniform(0.5, 3.0, n)
+        y = 3.0 - 1.4 * x + rng.normal(0, 0.1, n)
+        rows.append([n, x.sum(), y.sum(), (x * x).sum(), (x * y).sum(), (y * y).sum()])
+    return np.array(rows)
+
+
+def test_scalar_fit_matches_vectorized():
+    sums = random_sums(np.random.default_rng(0))
+    k, alpha, r2 = fitting.fit_sums(sums)
+    mean_x, sxx, sigma2 = fitting.fit_statistics(sums)
+    for i, row in enumerate(sums):
+        scalar = fit_from_sums(*row) + residual_statistics(*row)
+        vectorized = (k[i], alpha[i], r2[i], mean_x[i], sxx[i], sigma2[i])
+        for a, b in zip(scalar, vectorized):
+            if a is None:
+                assert np.isnan(b)
+            else:
+                assert a == pytest.approx(b, rel=1e-9, abs=1e-12)
+
+
+def test_fit_matches_least_squares():
+    rng = np.random.default_rng(1)
+    x = rng.uniform(0.5, 3.0, 200)
+    y = 3.0 - 1.4 * x + rng.normal(0, 0.1, 200)
+    k, alpha, _ = fit_from_sums(len(x), x.sum(), y.sum(), (x * x).sum(), (x * y).sum(), (y * y).sum())
+    slope, intercept = np.polyfit(x, y, 1)
+    assert alpha == pytest.approx(-slope, rel=1e-9)
+    assert k == pytest.approx(10 ** intercept, rel=1e-9)
+
+
+def test_refit_matches_linear_regression(tmp_path):
+    """K and alpha of the square-root law equal the original LinearRegression fit"""
+    linear_model = pytest.importorskip('sklearn.linear_model')
+    rng = np.random.default_rng(2)
+    df = pd.DataFrame({
+        'distancia': rng.uniform(50, 900, 120),
+        'carga_espera': rng.uniform(5, 100, 120),
+        'litologia': np.repeat(['Granito', 'Basalto'], 60),
+    })
+    df['vibracao'] = 800 * (df['distancia'] / np.sqrt(df['carga_espera'])) ** -1.4 * 10 ** rng.normal(0, 0.1, 120)
+
+    backend = VibrationBackend(str(tmp_path / 'vibration.db'))
+    try:
+        backend.import_dataframe(df, outlier_threshold=None)
+        backend.calculate_k_factor(folds=0)
+        for lithology, group in df.groupby('litologia'):
+            X = np.log10(group['distancia'] / np.sqrt(group['carga_espera'])).to_frame()
+            model = linear_model.LinearRegression().fit(X, np.log10(group['vibracao']))
+            k, alpha = backend.get_coefficients([lithology])[lithology][:2]
+            assert alpha == pytest.approx(-model.coef_[0], rel=1e-9)
+            assert k == pytest.approx(10 ** model.intercept_, rel=1e-9)
+    finally:
+        backend.close()
@@ -0,0 +1,32 @@
+"""Validate imported and saved samples before they reach the sums"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend import VibrationBackend
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = VibrationBackend(str(tmp_path / 'vibration.db'))
+    yield backend
+    backend.close()
+
+
+def test_import_rejects_infinite_values(backend):
+    df = pd.DataFrame({
+        'distancia': [100.0, np.inf, 200.0, 150.0],
+        'carga_espera': [20.0, 20.0, -np.inf, 30.0],
+        'vibracao': [5.0, 5.0, 5.0, 'inf'],
+        'litologia': ['Granito'] * 4,
+    })
+    result = backend.import_dataframe(df, outlier_threshold=None)
+    assert result['imported'] == 1
+    assert [line for line, _ in result['rejected']] == [3, 4, 5]
+    assert all('infinitos' in reason for _, reason in result['rejected'])
+
+
+def test_save_data_rejects_infinite_values(backend):
+    assert backend.save_data(float('inf'), 20.0, 5.0, 'Granito') is False
+    assert backend.save_data(100.0, 20.0, float('nan'), 'Granito') is False
+    assert backend.db.connection().execute("SELECT COUNT(*) FROM vibration_data").fetchone()[0] == 0
@@ -0,0 +1,91 @@
+"""Upgrade databases written by the original application in place"""
+import sqlite3
+
+import numpy as np
+import pytest
+
+from backend import DUPLICATE, LAWS, VibrationBackend
+
+
+def baseline_database(path, count=40, seed=0):
+    """Database with the schema and rows of the original application, before any migration"""
+    rng = np.random.default_rng(seed)
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS vibration_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            distancia REAL NOT NULL,
+            carga_espera REAL NOT NULL,
+            vibracao REAL NOT NULL  ,
+            litologia TEXT NOT NULL,
+            k REAL,
+            alpha REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    rows = [(float(rng.uniform(50, 900)), float(rng.uniform(5, 100)), float(rng.uniform(0.5, 20)),
+             ['Granito', 'Basalto'][i % 2]) for i in range(count)]
+    conn.executemany("INSERT INTO vibration_data (distancia, carga_espera, vibracao, litologia) VALUES (?, ?, ?, ?)",
+                     rows)
+    # The original stored its last fit on the rows of each lithology
+    conn.execute("UPDATE vibration_data SET k = 900, alpha = 1.5 WHERE litologia = 'Granito'")
+    conn.commit()
+    conn.close()
+    return rows
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'vibration.db')
+
+
+def test_baseline_database_is_upgraded(path):
+    rows = baseline_database(path)
+    backend = VibrationBackend(path)
+    try:
+        conn = backend.db.connection()
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(VibrationBackend.MIGRATIONS)
+        assert conn.execute("SELECT distancia, carga_espera, vibracao, litologia FROM vibration_data "
+                            "ORDER BY id").fetchall() == rows
+        assert conn.execute("SELECT COUNT(*) FROM vibration_data WHERE excluded = 1").fetchone()[0] == 0
+        assert {row[0] for row in conn.execute("SELECT DISTINCT law FROM lithology_stats")} == set(LAWS)
+        assert conn.execute("SELECT COUNT(*) FROM lithology_decayed_stats").fetchone()[0] == 2 * len(LAWS)
+        assert set(backend.get_coefficients(['Granito', 'Basalto'])) == {'Granito', 'Basalto'}
+        # The sums built by the upgrade match a full recomputation
+        assert backend.rebuild_statistics() == {}
+    finally:
+        backend.close()
+
+
+def test_upgraded_database_reopens_without_changes(path):
+    baseline_database(path)
+    VibrationBackend(path).close()
+    conn = sqlite3.connect(path)
+    before = conn.execute("SELECT * FROM lithology_stats ORDER BY litologia, law").fetchall()
+    data_version = conn.execute("SELECT value FROM backend_metadata WHERE key = 'data_version'").fetchone()
+    conn.close()
+
+    backend = VibrationBackend(path)
+    try:
+        conn = backend.db.connection()
+        assert conn.execute("SELECT * FROM lithology_stats ORDER BY litologia, law").fetchall() == before
+        assert conn.execute("SELECT value FROM backend_metadata WHERE key = 'data_version'").fetchone() == data_version
+    finally:
+        backend.close()
+
+
+def test_legacy_rows_are_compacted_after_upgrade(path):
+    rows = baseline_database(path, count=6)
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO vibration_data (distancia, carga_espera, vibracao, litologia) VALUES (?, ?, ?, ?)",
+                     rows[:2])
+    conn.commit()
+    conn.close()
+
+    backend = VibrationBackend(path)
+    try:
+        assert backend.compact_duplicates() == {'keyed': 6, 'removed': 2}
+        assert backend.save_data(*rows[0]) == DUPLICATE
+        assert backend.db.connection().execute("SELECT COUNT(*) FROM vibration_data").fetchone()[0] == 6
+    finally:
+        backend.close()
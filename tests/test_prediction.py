@@ -0,0 +1,91 @@
+"""Pin the batch predictions to the single-blast ones and the intervals to an OLS reference"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import design
+from backend import VibrationBackend, t_quantile
+
+
+def samples():
+    rng = np.random.default_rng(3)
+    df = pd.DataFrame({
+        'distancia': rng.uniform(50, 900, 120),
+        'carga_espera': rng.uniform(5, 100, 120),
+        'litologia': np.repeat(['Granito', 'Basalto'], 60),
+    })
+    df['vibracao'] = 800 * (df['distancia'] / np.sqrt(df['carga_espera'])) ** -1.4 * 10 ** rng.normal(0, 0.1, 120)
+    return df
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = VibrationBackend(str(tmp_path / 'vibration.db'))
+    backend.import_dataframe(samples(), outlier_threshold=None)
+    yield backend
+    backend.close()
+
+
+def test_batch_prediction_returns_nan_for_bad_rows(backend):
+    planned = pd.DataFrame({
+        'distancia': [300, 'abc', 250, None, 400],
+        'carga_espera': [40, 40, 'x', 30, 50],
+        'litologia': ['Granito', 'Granito', 'Basalto', 'Basalto', 'Xisto'],
+    })
+    predicted = backend.predict_vibration_batch(planned)
+    assert predicted is not None
+    assert predicted[0] == pytest.approx(backend.predict_ppv(300, 40, 'Granito'), rel=1e-12)
+    assert np.isnan(predicted[1:]).all()
+
+
+def test_t_quantile_matches_scipy():
+    stats = pytest.importorskip('scipy.stats')
+    for dof in (1, 2, 3, 5, 30, 200):
+        for p in (0.6, 0.9, 0.975, 0.995):
+            assert t_quantile(p, dof) == pytest.approx(stats.t.ppf(p, dof), rel=1e-9)
+
+
+def test_interval_matches_least_squares_reference(backend):
+    stats = pytest.importorskip('scipy.stats')
+    group = samples()[lambda df: df['litologia'] == 'Granito']
+    x = np.log10(group['distancia'] / np.sqrt(group['carga_espera'])).to_numpy()
+    y = np.log10(group['vibracao']).to_numpy()
+    slope, intercept = np.polyfit(x, y, 1)
+    sigma = np.sqrt(((y - intercept - slope * x) ** 2).sum() / (len(x) - 2))
+    x0 = np.log10(300 / np.sqrt(40))
+    leverage = 1 / len(x) + (x0 - x.mean()) ** 2 / ((x - x.mean()) ** 2).sum()
+    t = stats.t.ppf(0.975, len(x) - 2)
+    y0 = intercept + slope * x0
+
+    interval = backend.predict_interval(300, 40, 'Granito', confidence=0.95)
+    assert interval['ppv'] == pytest.approx(10 ** y0, rel=1e-9)
+    assert interval['confidence_upper'] == pytest.approx(10 ** (y0 + t * sigma * np.sqrt(leverage)), rel=1e-9)
+    assert interval['prediction_lower'] == pytest.approx(10 ** (y0 - t * sigma * np.sqrt(1 + leverage)), rel=1e-9)
+    upper = 10 ** (y0 + stats.t.ppf(0.95, len(x) - 2) * sigma * np.sqrt(1 + leverage))
+    assert interval['upper_bound'] == pytest.approx(upper, rel=1e-9)
+
+
+def test_single_interval_matches_batch(backend):
+    distances = np.array([80.0, 300.0, 850.0])
+    charges = np.array([10.0, 40.0, 90.0])
+    batch = backend.predict_interval_batch(distances, charges, 'Basalto', confidence=0.9)
+    for i in range(len(distances)):
+        single = backend.predict_interval(distances[i], charges[i], 'Basalto', confidence=0.9)
+        for key, values in batch.items():
+            assert single[key] == pytest.approx(values[i], rel=1e-9)
+
+
+def test_upper_bound_charge_reaches_the_limit(backend):
+    distances = np.array([100.0, 400.0, 800.0])
+    charge = backend.max_charge_batch(distances, 5.0, 'Granito', confidence=0.95)
+    upper = backend.predict_interval_batch(distances, charge, 'Granito', confidence=0.95)['upper_bound']
+    np.testing.assert_allclose(upper, 5.0, rtol=1e-9)
+    assert backend.max_charge(400, 5.0, 'Granito', confidence=0.95) == pytest.approx(charge[1], rel=1e-9)
+    # Designing against the upper bound allows less charge than the mean law
+    assert (charge < backend.max_charge_batch(distances, 5.0, 'Granito')).all()
+
+
+def test_max_charge_upper_is_zero_when_no_charge_fits():
+    # With t·σ/√Sxx above alpha the bound grows again far from the data and never falls to the limit
+    charge = design.max_charge_upper(100.0, 1.5, 5, 1.0, 0.01, 1.0, 3.0, 50.0, 1.0)
+    assert charge == 0
@@ -0,0 +1,86 @@
+"""Keep the columnar snapshot equal to the included samples in SQLite"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend import VibrationBackend
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = VibrationBackend(str(tmp_path / 'vibration.db'), snapshot_dir=str(tmp_path / 'snapshot'))
+    yield backend
+    backend.close()
+
+
+def samples(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'distancia': rng.uniform(50, 900, count),
+        'carga_espera': rng.uniform(5, 100, count),
+        'vibracao': rng.uniform(0.5, 20, count),
+        'litologia': rng.choice(['Granito', 'Basalto'], count),
+    })
+
+
+def included_ids(backend):
+    return sorted(row[0] for row in backend.db.connection().execute(
+        "SELECT id FROM vibration_data WHERE excluded = 0"))
+
+
+def snapshot_ids(backend):
+    return sorted(backend.refresh_snapshot().columns()['id'].tolist())
+
+
+def test_exclusion_swap_with_same_count_and_id_sum_rebuilds(backend):
+    backend.import_dataframe(samples(20), outlier_threshold=None)
+    backend.set_excluded([10, 13])
+    assert snapshot_ids(backend) == included_ids(backend)
+
+    # Same number of excluded rows and the same id sum as before
+    backend.set_excluded([10, 13], False)
+    backend.set_excluded([11, 12])
+    assert snapshot_ids(backend) == included_ids(backend)
+    assert 11 not in snapshot_ids(backend) and 10 in snapshot_ids(backend)
+
+
+def test_inserts_are_appended(backend):
+    backend.import_dataframe(samples(30), outlier_threshold=None)
+    first = backend.refresh_snapshot()
+    assert first.rows == 30
+    backend.import_dataframe(samples(10, seed=1), outlier_threshold=None)
+    snapshot = backend.refresh_snapshot()
+    assert snapshot.rows == 40
+    assert snapshot.meta['data_version'] == backend.get_data_version()
+    frame = snapshot.frame()
+    stored = pd.read_sql_query("SELECT id, distancia, carga_espera, vibracao, litologia FROM vibration_data "
+                               "ORDER BY id", backend.db.connection())
+    for column in stored.columns:
+        np.testing.assert_array_equal(np.asarray(frame[column]), stored[column].to_numpy())
+
+
+def test_deletions_rebuild(backend):
+    backend.import_dataframe(samples(30), outlier_threshold=None)
+    fingerprint = backend.refresh_snapshot().meta['fingerprint']
+    backend.delete_data([3, 30])
+    snapshot = backend.refresh_snapshot()
+    assert snapshot.meta['fingerprint'] != fingerprint
+    assert snapshot_ids(backend) == included_ids(backend)
+    assert len(backend.load_samples()) == 28
+
+
+def test_unchanged_data_version_keeps_the_snapshot(backend):
+    backend.import_dataframe(samples(5), outlier_threshold=None)
+    snapshot = backend.refresh_snapshot()
+    meta = dict(snapshot.meta)
+    assert backend.refresh_snapshot().meta == meta
+
+
+def test_scores_match_single_predictions(backend):
+    backend.import_dataframe(samples(40), outlier_threshold=None)
+    scores = backend.score_samples()
+    conn = backend.db.connection()
+    for sample_id, predicted in zip(scores['id'][:5], scores['predicted'][:5]):
+        distance, charge, lithology = conn.execute(
+            "SELECT distancia, carga_espera, litologia FROM vibration_data WHERE id = ?", (int(sample_id),)).fetchone()
+        assert predicted == pytest.approx(backend.predict_ppv(distance, charge, lithology), rel=1e-12)
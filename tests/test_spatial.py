@@ -0,0 +1,60 @@
+"""Pin the grid index queries to a brute-force search over every point"""
+import numpy as np
+import pytest
+
+from backend import VibrationBackend
+from spatial import GridIndex
+
+
+def brute_force(points, point):
+    points = np.pad(points, ((0, 0), (0, 3 - points.shape[1])))
+    return np.sqrt(((points - np.pad(point, (0, 3 - len(point)))) ** 2).sum(axis=1))
+
+
+@pytest.mark.parametrize('points', [
+    np.random.default_rng(8).uniform(-1000, 1000, (500, 3)),
+    # Clustered around a few sites, with a far outlier
+    np.vstack([np.random.default_rng(9).normal(center, 5, (100, 2)) for center in ([0, 0], [400, 50])]
+              + [[[20000, -20000]]]),
+    np.zeros((3, 2)),
+])
+def test_queries_match_brute_force(points):
+    index = GridIndex(points)
+    rng = np.random.default_rng(10)
+    for point in rng.uniform(-1500, 1500, (25, points.shape[1])):
+        distances = brute_force(points, point)
+        for radius in (0, 50, 300, 5000):
+            found, found_distances = index.within(point, radius)
+            assert sorted(found) == sorted(np.flatnonzero(distances <= radius))
+            assert (np.diff(found_distances) >= 0).all()
+        for k in (1, 5, 1000):
+            found, found_distances = index.nearest(point, k)
+            np.testing.assert_allclose(found_distances, np.sort(distances)[:k])
+            np.testing.assert_allclose(distances[found], found_distances)
+        found, found_distances = index.nearest(point, 5, max_distance=200)
+        np.testing.assert_allclose(found_distances, np.sort(distances[distances <= 200])[:5])
+
+
+def test_empty_index():
+    index = GridIndex([])
+    assert len(index.within([0, 0], 100)[0]) == 0
+    assert len(index.nearest([0, 0, 0], 3)[0]) == 0
+
+
+def test_receptors_near(tmp_path):
+    backend = VibrationBackend(str(tmp_path / 'vibration.db'))
+    try:
+        backend.save_receptors([
+            {'nome': 'Casa 1', 'x': 100, 'y': 0, 'kind': 'structure'},
+            {'nome': 'Sismógrafo A', 'x': 0, 'y': 250, 'z': 30},
+            {'nome': 'Casa 2', 'x': -600, 'y': 0, 'kind': 'structure'},
+        ])
+        assert [r['nome'] for r in backend.receptors_near(0, 0, 0, radius=300)] == ['Casa 1', 'Sismógrafo A']
+        assert [r['nome'] for r in backend.receptors_near(0, 0, 0, nearest=1, kind='station')] == ['Sismógrafo A']
+        assert backend.receptors_near(0, 0, 0, nearest=1)[0]['distancia'] == pytest.approx(100)
+
+        # A moved receptor is found at its new position
+        backend.save_receptors([{'nome': 'casa 2', 'x': 50, 'y': 0, 'kind': 'structure'}])
+        assert backend.receptors_near(0, 0, 0, nearest=1)[0]['nome'] == 'Casa 2'
+    finally:
+        backend.close()